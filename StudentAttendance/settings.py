@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -104,6 +105,21 @@ DATABASES = {
     }
 }
 
+# Cache shared by every worker process (pm2 runs several uvicorn workers). Rosters, advisor scopes,
+# dashboard snapshots and the generation counters that invalidate them (core/generations.py) live here,
+# so a per-process cache such as LocMemCache would let one worker keep serving data another has changed.
+# The default file cache is shared by the workers of one host; across hosts use
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache with CACHE_LOCATION=redis://host:6379/0
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / 'cache' / 'django')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '20000')),
+        },
+    }
+}
+
 
 
 # Password validation
@@ -166,3 +182,113 @@ LOGOUT_REDIRECT_URL = "auth:login"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Prediction backend
+# Recognition result cache: face boxes and embeddings keyed by image bytes + model/gallery versions
+PREDICTION_RESULT_CACHE_ENABLED = os.getenv('PREDICTION_RESULT_CACHE_ENABLED', 'True') == 'True'
+PREDICTION_RESULT_CACHE_DIR = os.getenv('PREDICTION_RESULT_CACHE_DIR', str(BASE_DIR / 'cache' / 'recognition'))
+PREDICTION_RESULT_CACHE_MAX_MB = int(os.getenv('PREDICTION_RESULT_CACHE_MAX_MB', '256'))
+
+# Video/burst capture: frames sampled per second of video, and the tracker used to embed each face once
+PREDICTION_VIDEO_SAMPLE_FPS = float(os.getenv('PREDICTION_VIDEO_SAMPLE_FPS', '4'))
+PREDICTION_VIDEO_MAX_FRAMES = int(os.getenv('PREDICTION_VIDEO_MAX_FRAMES', '240'))
+PREDICTION_TRACK_IOU_THRESHOLD = float(os.getenv('PREDICTION_TRACK_IOU_THRESHOLD', '0.3'))
+PREDICTION_TRACK_MAX_AGE = int(os.getenv('PREDICTION_TRACK_MAX_AGE', '3'))
+PREDICTION_TRACK_MIN_HITS = int(os.getenv('PREDICTION_TRACK_MIN_HITS', '1'))
+PREDICTION_TRACK_EMBEDDINGS = int(os.getenv('PREDICTION_TRACK_EMBEDDINGS', '2'))
+
+# Face quality gate: crops failing any threshold are not embedded (skipped per image, deferred in video)
+PREDICTION_QUALITY_GATE_ENABLED = os.getenv('PREDICTION_QUALITY_GATE_ENABLED', 'True') == 'True'
+PREDICTION_QUALITY_MIN_FACE_SIZE = int(os.getenv('PREDICTION_QUALITY_MIN_FACE_SIZE', '24'))
+PREDICTION_QUALITY_MIN_SHARPNESS = float(os.getenv('PREDICTION_QUALITY_MIN_SHARPNESS', '30'))
+PREDICTION_QUALITY_MIN_ASPECT_RATIO = float(os.getenv('PREDICTION_QUALITY_MIN_ASPECT_RATIO', '0.45'))
+PREDICTION_QUALITY_MAX_ASPECT_RATIO = float(os.getenv('PREDICTION_QUALITY_MAX_ASPECT_RATIO', '1.6'))
+PREDICTION_QUALITY_MIN_CONFIDENCE = float(os.getenv('PREDICTION_QUALITY_MIN_CONFIDENCE', '0.35'))
+
+# Tiled detection profiles per room, selected by the "room" request parameter ("default" applies when
+# no room matches). Example: {"hall-a": {"tile_size": 1280, "overlap": 0.25}, "default": null}
+PREDICTION_TILING_PROFILES = json.loads(os.getenv('PREDICTION_TILING_PROFILES', '{}'))
+
+# Gallery delta log: fold pending add/replace/remove records into the base .pth in the background
+# once this many have accumulated (0 disables automatic compaction)
+PREDICTION_GALLERY_COMPACT_THRESHOLD = int(os.getenv('PREDICTION_GALLERY_COMPACT_THRESHOLD', '50'))
+
+# Multi-template galleries: optionally add confidently matched live faces as extra templates per student
+PREDICTION_GALLERY_MAX_TEMPLATES = int(os.getenv('PREDICTION_GALLERY_MAX_TEMPLATES', '5'))
+PREDICTION_GALLERY_SELF_UPDATE = os.getenv('PREDICTION_GALLERY_SELF_UPDATE', 'False') == 'True'
+PREDICTION_GALLERY_SELF_UPDATE_MIN_SCORE = float(os.getenv('PREDICTION_GALLERY_SELF_UPDATE_MIN_SCORE', '0.75'))
+PREDICTION_GALLERY_SELF_UPDATE_MIN_MARGIN = float(os.getenv('PREDICTION_GALLERY_SELF_UPDATE_MIN_MARGIN', '0.1'))
+
+# Prefetch scheduler: warm galleries and section rosters a few minutes before each TimeBlock starts
+PREDICTION_PREFETCH_ENABLED = os.getenv('PREDICTION_PREFETCH_ENABLED', 'False') == 'True'
+PREDICTION_PREFETCH_LEAD_MINUTES = float(os.getenv('PREDICTION_PREFETCH_LEAD_MINUTES', '5'))
+PREDICTION_PREFETCH_INTERVAL_SECONDS = float(os.getenv('PREDICTION_PREFETCH_INTERVAL_SECONDS', '60'))
+
+# Per-session face embeddings (float16 .npy + JSON metadata) used by the session rematch endpoint
+PREDICTION_SESSION_EMBEDDINGS_ENABLED = os.getenv('PREDICTION_SESSION_EMBEDDINGS_ENABLED', 'True') == 'True'
+PREDICTION_SESSION_EMBEDDINGS_DIR = os.getenv('PREDICTION_SESSION_EMBEDDINGS_DIR', str(BASE_DIR / 'cache' / 'sessions'))
+PREDICTION_SESSION_EMBEDDINGS_MAX_AGE_HOURS = float(os.getenv('PREDICTION_SESSION_EMBEDDINGS_MAX_AGE_HOURS', '168'))
+
+# Gallery storage dtype: float32, float16 or bfloat16 (halves gallery memory; scores still accumulate in float32)
+PREDICTION_GALLERY_DTYPE = os.getenv('PREDICTION_GALLERY_DTYPE', 'float32')
+
+# Image decode pool: worker processes that base64-decode, imdecode and grayscale the next images of a
+# request while the current one runs through the models (0 decodes inline on the request thread)
+PREDICTION_DECODE_WORKERS = int(os.getenv('PREDICTION_DECODE_WORKERS', '2'))
+PREDICTION_DECODE_PREFETCH = int(os.getenv('PREDICTION_DECODE_PREFETCH', '2'))
+
+# Section rosters (core/rosters.py) live in the shared cache (CACHES) for this many seconds and are
+# invalidated sooner by Student/Section signals
+ROSTER_CACHE_TIMEOUT = int(os.getenv('ROSTER_CACHE_TIMEOUT', '3600'))
+
+# The in-process time block index (core/timeblocks.py) is rebuilt when a TimeBlock is saved or deleted,
+# and at least this often (seconds; 0 disables) to pick up changes made without model signals
+TIME_BLOCK_INDEX_TTL = int(os.getenv('TIME_BLOCK_INDEX_TTL', '300'))
+
+# Advisor dashboard snapshots (advisor_dashboard/snapshots.py): cached per advisor for this many seconds,
+# and rebuilt sooner when attendance, timetables or students of one of its sections change
+ADVISOR_DASHBOARD_CACHE_TIMEOUT = int(os.getenv('ADVISOR_DASHBOARD_CACHE_TIMEOUT', '60'))
+
+# Advisor scopes (advisor_dashboard/scope.py): resolved section/batch ids per advisor, kept in the shared cache
+# for this many seconds and invalidated sooner when assignments, sections or batches change. They decide
+# access, so keep this short: it bounds how long a change made without model signals goes unnoticed
+ADVISOR_SCOPE_CACHE_TIMEOUT = int(os.getenv('ADVISOR_SCOPE_CACHE_TIMEOUT', '300'))
+
+# Attendance percentage below which a student is listed by the low attendance API (core/attendance_stats.py)
+ATTENDANCE_ELIGIBILITY_THRESHOLD = float(os.getenv('ATTENDANCE_ELIGIBILITY_THRESHOLD', '75'))
+
+# Attendance CSV exports (advisor_dashboard/exports.py) stream rows read this many at a time,
+# gzip-compressed when the client accepts it
+ATTENDANCE_EXPORT_CHUNK_SIZE = int(os.getenv('ATTENDANCE_EXPORT_CHUNK_SIZE', '2000'))
+ATTENDANCE_EXPORT_GZIP = os.getenv('ATTENDANCE_EXPORT_GZIP', 'True') == 'True'
+
+# Attendance lists use keyset pagination (advisor_dashboard/pagination.py); their total is counted up to
+# this many rows and shown as "N+" beyond it (0 hides the total)
+ATTENDANCE_PAGE_COUNT_CAP = int(os.getenv('ATTENDANCE_PAGE_COUNT_CAP', '1000'))
+
+# Report jobs (advisor_dashboard/jobs.py): large custom reports are built on this many worker threads
+# (0 builds inline) into REPORT_JOB_DIR, and served again until attendance changes or they reach max age
+REPORT_JOB_WORKERS = int(os.getenv('REPORT_JOB_WORKERS', '2'))
+REPORT_JOB_DIR = os.getenv('REPORT_JOB_DIR', str(BASE_DIR / 'cache' / 'reports'))
+REPORT_JOB_MAX_AGE_HOURS = float(os.getenv('REPORT_JOB_MAX_AGE_HOURS', '24'))
+# A job still pending or running after this many minutes is marked failed and built again on the next request
+REPORT_JOB_TIMEOUT_MINUTES = float(os.getenv('REPORT_JOB_TIMEOUT_MINUTES', '30'))
+# The janitor deletes jobs created more than this many days ago with their files (0 keeps them forever)
+REPORT_JOB_RETENTION_DAYS = float(os.getenv('REPORT_JOB_RETENTION_DAYS', '7'))
+
+# Predictions are stored as one packed RecognitionSession row per session; also write the legacy
+# per-student attendance_predictions rows (read by the advisor dashboard) with one bulk insert
+PREDICTION_LEGACY_PREDICTION_ROWS = os.getenv('PREDICTION_LEGACY_PREDICTION_ROWS', 'True') == 'True'
+
+# Janitor (prediction_backend/janitor.py, or `manage.py janitor` from cron): sweeps session temp directories
+# and session embeddings, and purges prediction rows older than their retention (0 days keeps them forever).
+# PREDICTION_JANITOR_ENABLED runs it on a thread in each serving process; a lock file in the temp directory
+# makes one worker do each sweep. Disable it when cron runs `manage.py janitor` instead
+PREDICTION_JANITOR_ENABLED = os.getenv('PREDICTION_JANITOR_ENABLED', 'True') == 'True'
+PREDICTION_JANITOR_INTERVAL_MINUTES = float(os.getenv('PREDICTION_JANITOR_INTERVAL_MINUTES', '60'))
+PREDICTION_JANITOR_CHUNK_SIZE = int(os.getenv('PREDICTION_JANITOR_CHUNK_SIZE', '1000'))
+PREDICTION_JANITOR_CHUNK_PAUSE_SECONDS = float(os.getenv('PREDICTION_JANITOR_CHUNK_PAUSE_SECONDS', '0'))
+PREDICTION_TEMP_RETENTION_HOURS = float(os.getenv('PREDICTION_TEMP_RETENTION_HOURS', '24'))
+PREDICTION_RETENTION_DAYS = float(os.getenv('PREDICTION_RETENTION_DAYS', '0'))
+PREDICTION_SUBMISSION_RETENTION_DAYS = float(os.getenv('PREDICTION_SUBMISSION_RETENTION_DAYS', '0'))
+PREDICTION_PROCESSED_IMAGE_RETENTION_DAYS = float(os.getenv('PREDICTION_PROCESSED_IMAGE_RETENTION_DAYS', '0'))
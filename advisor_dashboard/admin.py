@@ -228,9 +228,9 @@ class AdvisorSectionAdmin(AdvisorFilteredAdminMixin, admin.ModelAdmin):
 class AdvisorAttendanceAdmin(AdvisorFilteredAdminMixin, admin.ModelAdmin):
     """Admin for attendance - filtered by advisor assignments"""
     list_display = ['student', 'timetable', 'is_present', 'created_at']
-    list_filter = ['is_present', 'timetable__date', 'timetable__subject']
+    list_filter = ['is_present', 'date', 'timetable__subject']
     search_fields = ['student__name', 'student__student_regno']
-    ordering = ['-timetable__date', 'student__name']
+    ordering = ['-date', 'student__name']
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
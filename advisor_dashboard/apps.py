@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AdvisorDashboardConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "advisor_dashboard"
+
+    def ready(self):
+        # Advisor scope invalidation
+        from . import signals  # noqa: F401
@@ -0,0 +1,269 @@
+"""
+Background report jobs.
+
+A request for a large custom report enqueues a ReportJob instead of building the
+report inline; a small thread pool writes the CSV or HTML artifact to
+REPORT_JOB_DIR and the page polls the job until it can download it. Jobs are keyed
+by a hash of the advisor's sections, the format and the filters. An identical
+request reuses the job in flight, or the finished artifact as long as the
+attendance generations (core.generations) of those sections are unchanged and it is
+younger than REPORT_JOB_MAX_AGE_HOURS. A job still pending or running after
+REPORT_JOB_TIMEOUT_MINUTES is marked failed (its process died, or exited before the
+on-commit hook queued it) and the next identical request enqueues a new one. The
+janitor (prediction_backend/janitor.py) deletes jobs and artifacts older than
+REPORT_JOB_RETENTION_DAYS.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+
+from core import generations
+
+from . import exports, reports
+from .models import ReportJob
+
+logger = logging.getLogger(__name__)
+
+PARAMETERS = ('student_regno', 'subject_id', 'date_from', 'date_to', 'status')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _artifact_dir() -> Path:
+    path = Path(getattr(settings, 'REPORT_JOB_DIR', Path(settings.BASE_DIR) / 'cache' / 'reports'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def clean_parameters(params) -> dict:
+    """Only the custom report filters, without empty values"""
+    return {name: str(params[name]) for name in PARAMETERS if params.get(name)}
+
+
+def cache_key(section_ids, report_format, params) -> str:
+    payload = json.dumps({'sections': sorted(section_ids), 'format': report_format, 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def is_fresh(job: ReportJob) -> bool:
+    """A finished artifact can be served while the advisor's sections and their attendance are unchanged"""
+    if job.status != ReportJob.DONE or not os.path.exists(job.artifact_path):
+        return False
+    max_age = getattr(settings, 'REPORT_JOB_MAX_AGE_HOURS', 24)
+    if max_age and job.finished_at < timezone.now() - timedelta(hours=max_age):
+        return False
+    # An advisor who lost a section must not download students they no longer see
+    if job.cache_key != cache_key(list(job.advisor.scope.section_ids), job.report_format, job.parameters):
+        return False
+    return not job.generations or generations.get_many(job.generations) == job.generations
+
+
+def expire_if_stale(job: ReportJob) -> bool:
+    """Mark a job pending or running for longer than REPORT_JOB_TIMEOUT_MINUTES as failed"""
+    timeout = getattr(settings, 'REPORT_JOB_TIMEOUT_MINUTES', 30)
+    if job.status not in (ReportJob.PENDING, ReportJob.RUNNING) or not timeout:
+        return False
+    if job.created_at >= timezone.now() - timedelta(minutes=timeout):
+        return False
+    job.status = ReportJob.FAILED
+    job.error = f'Not finished after {timeout:g} minutes'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    logger.warning(f"⏱️  Report job {job.job_id} timed out")
+    return True
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'REPORT_JOB_WORKERS', 2), thread_name_prefix='report-job'
+            )
+        return _executor
+
+
+def submit(advisor, params, report_format='csv') -> ReportJob:
+    """The job for this report: one in flight, a fresh finished one, or a newly enqueued one"""
+    params = clean_parameters(params)
+    section_ids = list(advisor.scope.section_ids)
+    key = cache_key(section_ids, report_format, params)
+
+    latest = (
+        ReportJob.objects.filter(advisor=advisor, cache_key=key).exclude(status=ReportJob.FAILED)
+        .select_related('advisor').order_by('-created_at').first()
+    )
+    if latest is not None and not expire_if_stale(latest) and (
+        latest.status in (ReportJob.PENDING, ReportJob.RUNNING) or is_fresh(latest)
+    ):
+        logger.debug(f"📄 Reusing report job {latest.job_id} ({latest.status})")
+        return latest
+
+    job = ReportJob.objects.create(advisor=advisor, cache_key=key, report_format=report_format, parameters=params)
+    if getattr(settings, 'REPORT_JOB_WORKERS', 2) <= 0:
+        run(job.pk)
+        job.refresh_from_db()
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(_work, job.pk))
+    logger.info(f"📄 Enqueued {report_format} report job {job.job_id} for advisor {advisor.pk}")
+    return job
+
+
+def _work(job_pk):
+    try:
+        run(job_pk)
+    finally:
+        close_old_connections()
+
+
+def _write_csv(path, attendance) -> int:
+    rows = 0
+
+    def counted(records):
+        nonlocal rows
+        for record in records:
+            rows += 1
+            yield record
+
+    with open(path, 'wb') as f:
+        for chunk in exports.csv_chunks(counted(exports.attendance_rows(attendance))):
+            f.write(chunk)
+    return rows - 1  # Less the header
+
+
+def _write_html(path, attendance, job) -> int:
+    rows = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(
+            '<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Attendance Report</title>'
+            '<style>table{border-collapse:collapse}td,th{border:1px solid #ccc;padding:4px 8px}</style></head><body>\n'
+            f'<h1>Attendance Report</h1>\n<p>Generated {timezone.localtime():%Y-%m-%d %H:%M}'
+            f'{"".join(f" | {escape(k)}: {escape(v)}" for k, v in job.parameters.items())}</p>\n<table>\n'
+        )
+        records = exports.attendance_rows(attendance)
+        f.write('<tr>' + ''.join(f'<th>{escape(h)}</th>' for h in next(records)) + '</tr>\n')
+        for record in records:
+            f.write('<tr>' + ''.join(f'<td>{escape(value)}</td>' for value in record) + '</tr>\n')
+            rows += 1
+        f.write('</table>\n</body></html>\n')
+    return rows
+
+
+def run(job_pk):
+    """Build a job's artifact (called on a worker thread, or inline with REPORT_JOB_WORKERS=0)"""
+    # Claim the job: one that timed out while queued is not built after all
+    claimed = ReportJob.objects.filter(pk=job_pk, status=ReportJob.PENDING).update(status=ReportJob.RUNNING)
+    job = ReportJob.objects.select_related('advisor').get(pk=job_pk)
+    if not claimed:
+        logger.info(f"📄 Skipping report job {job.job_id} ({job.status})")
+        return job
+    path = _artifact_dir() / f'{job.job_id}.{job.report_format}'
+    partial = path.with_suffix(path.suffix + '.part')
+    try:
+        advisor = job.advisor
+        section_ids = list(advisor.scope.section_ids)
+        # Read before the report: a write landing mid-build leaves the artifact stale, not wrongly fresh
+        stored = generations.get_many(generations.section_attendance_key(section_id) for section_id in section_ids)
+        attendance = reports.filter_attendance(advisor.get_assigned_students(), **job.parameters)
+
+        if job.report_format == 'html':
+            row_count = _write_html(partial, attendance, job)
+        else:
+            row_count = _write_csv(partial, attendance)
+        os.replace(partial, path)
+
+        job.generations = stored
+        job.artifact_path = str(path)
+        job.row_count = row_count
+        job.status = ReportJob.DONE
+        logger.info(f"✅ Report job {job.job_id} wrote {row_count} rows")
+    except Exception as e:
+        job.status = ReportJob.FAILED
+        job.error = str(e)
+        if partial.exists():
+            partial.unlink()
+        logger.error(f"❌ Report job {job.job_id} failed: {e}")
+    job.finished_at = timezone.now()
+    # Only a job still running is finished: one that timed out meanwhile stays failed (or was replaced)
+    finished = ReportJob.objects.filter(pk=job.pk, status=ReportJob.RUNNING).update(
+        generations=job.generations, artifact_path=job.artifact_path, row_count=job.row_count,
+        status=job.status, error=job.error, finished_at=job.finished_at,
+    )
+    if not finished:
+        logger.warning(f"⏱️  Report job {job.job_id} finished after timing out; discarding its artifact")
+        if job.status == ReportJob.DONE:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        job.refresh_from_db()
+        return job
+    if job.status == ReportJob.DONE:
+        _discard_superseded(job)
+    return job
+
+
+def _discard_superseded(job):
+    """Older artifacts of the same report are never served again"""
+    old_jobs = ReportJob.objects.filter(advisor_id=job.advisor_id, cache_key=job.cache_key, created_at__lt=job.created_at)
+    for old_path in old_jobs.exclude(artifact_path='').values_list('artifact_path', flat=True):
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+    old_jobs.delete()
+
+
+def sweep_artifacts(days, dry_run=False) -> int:
+    """Remove the artifacts of jobs created more than `days` ago, and files no job owns that are as old
+    (left by a crash mid-build); returns the file count. The janitor deletes the job rows afterwards"""
+    if not days:
+        return 0
+    cutoff = timezone.now() - timedelta(days=days)
+    expired = set(ReportJob.objects.filter(created_at__lt=cutoff).exclude(artifact_path='')
+                  .values_list('artifact_path', flat=True))
+    owned = set(ReportJob.objects.filter(created_at__gte=cutoff).exclude(artifact_path='')
+                .values_list('artifact_path', flat=True))
+    removed = 0
+    with os.scandir(_artifact_dir()) as entries:
+        for entry in entries:
+            try:
+                if not entry.is_file(follow_symlinks=False) or entry.path in owned:
+                    continue
+                if entry.path not in expired and entry.stat().st_mtime >= cutoff.timestamp():
+                    continue
+            except OSError:
+                continue
+            removed += 1
+            if not dry_run:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+    return removed
+
+
+def status(job: ReportJob) -> dict:
+    data = {
+        'job_id': str(job.job_id),
+        'status': job.status,
+        'format': job.report_format,
+        'row_count': job.row_count,
+        'error': job.error,
+        'status_url': reverse('advisor_dashboard:report_job_status', args=[job.job_id]),
+    }
+    if is_fresh(job):
+        data['download_url'] = reverse('advisor_dashboard:report_job_download', args=[job.job_id])
+    return data
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:16
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisor_dashboard', '0002_staffcreator'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('cache_key', models.CharField(db_index=True, max_length=64)),
+                ('report_format', models.CharField(choices=[('csv', 'CSV'), ('html', 'HTML')], default='csv', max_length=10)),
+                ('parameters', models.JSONField(default=dict)),
+                ('generations', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('artifact_path', models.CharField(blank=True, max_length=500)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('advisor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_jobs', to='advisor_dashboard.advisor')),
+            ],
+            options={
+                'verbose_name': 'Report Job',
+                'verbose_name_plural': 'Report Jobs',
+                'db_table': 'report_jobs',
+            },
+        ),
+    ]
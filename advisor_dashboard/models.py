@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from core.models import Department, Batch, Section
@@ -55,48 +57,46 @@ class Advisor(models.Model):
     def __str__(self):
         return f"{self.user.get_full_name() or self.user.username} - {self.employee_id}"
     
+    @property
+    def scope(self):
+        """This advisor's AdvisorScope (advisor_dashboard/scope.py): frozen sets of section/batch/department ids"""
+        from .scope import get_scope
+        return get_scope(self)
+    
     def get_assigned_students(self):
         """Get all students under this advisor's supervision"""
-        from core.models import Student
-        from django.db.models import Q
-        
-        # Prioritize more specific assignments over general ones
-        filter_conditions = Q(student_regno__isnull=True)  # Start with empty condition
-        
-        # 1. Direct section assignments (most specific)
-        if self.sections.exists():
-            filter_conditions |= Q(section__in=self.sections.all())
-        
-        # 2. If no direct sections, check batch assignments
-        elif self.batches.exists():
-            filter_conditions |= Q(section__batch__in=self.batches.all())
-            
-        # 3. If no batches, check department assignments (least specific)
-        elif self.departments.exists():
-            filter_conditions |= Q(section__batch__dept__in=self.departments.all())
-        
-        # Return distinct students matching the conditions
-        return Student.objects.filter(filter_conditions).distinct()
+        return self.scope.students()
     
     def get_assigned_sections(self):
-        """Get all sections under this advisor's supervision"""
-        from django.db.models import Q
-        from core.models import Section
-        
-        # Prioritize more specific assignments over general ones
-        filter_conditions = Q(section_id__isnull=True)  # Start with empty condition
-        
-        # 1. Direct section assignments (most specific)
-        if self.sections.exists():
-            filter_conditions |= Q(section_id__in=self.sections.all().values_list('section_id', flat=True))
-        
-        # 2. If no direct sections, check batch assignments
-        elif self.batches.exists():
-            filter_conditions |= Q(batch__in=self.batches.all())
-            
-        # 3. If no batches, check department assignments (least specific)
-        elif self.departments.exists():
-            filter_conditions |= Q(batch__dept__in=self.departments.all())
-        
-        # Return distinct sections matching the conditions
-        return Section.objects.filter(filter_conditions).distinct()
+        """Get all sections under this advisor's supervision (templates print batch and department)"""
+        return self.scope.sections()
+
+
+class ReportJob(models.Model):
+    """
+    A report built in the background and stored on disk (advisor_dashboard/jobs.py)
+    """
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+    FORMAT_CHOICES = [('csv', 'CSV'), ('html', 'HTML')]
+
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    advisor = models.ForeignKey(Advisor, on_delete=models.CASCADE, related_name='report_jobs')
+    cache_key = models.CharField(max_length=64, db_index=True)  # Hash of the advisor's sections, format and filters
+    report_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    parameters = models.JSONField(default=dict)
+    generations = models.JSONField(default=dict)  # Section attendance generations the artifact was built from
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    artifact_path = models.CharField(max_length=500, blank=True)
+    row_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'report_jobs'
+        verbose_name = 'Report Job'
+        verbose_name_plural = 'Report Jobs'
+
+    def __str__(self):
+        return f"{self.report_format.upper()} report {self.job_id} ({self.status})"
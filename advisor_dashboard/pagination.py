@@ -0,0 +1,144 @@
+"""
+Keyset (cursor) pagination for attendance lists.
+
+Pages are read newest class first, keyed on (class date, start time,
+attendance_id): the next page is "rows after the last key of this one", so every
+page is an index range read of per_page + 1 rows whatever its depth, with no
+OFFSET scan and no COUNT(*) over the whole filtered join. The cursors are opaque
+URL-safe tokens. A total is optional and capped: counting stops at
+ATTENDANCE_PAGE_COUNT_CAP rows and the page shows "1000+" beyond that.
+"""
+import base64
+import json
+from datetime import date, time
+
+from django.conf import settings
+from django.db.models import Q
+
+ORDERING = ('-date', '-timetable__start_time', '-attendance_id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(record, direction) -> str:
+    payload = [direction, record.date.isoformat(), record.timetable.start_time.isoformat(), record.pk]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """(direction, date, start_time, attendance_id) of a cursor token"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, day, start_time, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return direction, date.fromisoformat(day), time.fromisoformat(start_time), int(pk)
+    except (ValueError, TypeError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise InvalidCursor(f"Invalid page cursor: {e}")
+
+
+def _after(day, start_time, pk) -> Q:
+    """Rows that come after the key in newest-first order"""
+    return (
+        Q(date__lt=day)
+        | Q(date=day, timetable__start_time__lt=start_time)
+        | Q(date=day, timetable__start_time=start_time, attendance_id__lt=pk)
+    )
+
+
+def _before(day, start_time, pk) -> Q:
+    return (
+        Q(date__gt=day)
+        | Q(date=day, timetable__start_time__gt=start_time)
+        | Q(date=day, timetable__start_time=start_time, attendance_id__gt=pk)
+    )
+
+
+class KeysetPage:
+    """One page of records with next/previous cursors (iterable like a Paginator page)"""
+
+    def __init__(self, records, has_next, has_previous, query=None, total=None, total_capped=False):
+        self.object_list = records
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+        self.next_cursor = encode_cursor(records[-1], 'next') if has_next and records else None
+        self.previous_cursor = encode_cursor(records[0], 'prev') if has_previous and records else None
+        self.total = total
+        self.total_capped = total_capped
+        self._query = query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    def _querystring(self, cursor):
+        query = self._query.copy() if self._query is not None else None
+        if query is None:
+            return f'cursor={cursor}'
+        query['cursor'] = cursor
+        query.pop('page', None)
+        return query.urlencode()
+
+    @property
+    def next_query(self):
+        return self._querystring(self.next_cursor) if self.next_cursor else ''
+
+    @property
+    def previous_query(self):
+        return self._querystring(self.previous_cursor) if self.previous_cursor else ''
+
+    @property
+    def total_display(self):
+        if self.total is None:
+            return ''
+        return f"{self.total}+" if self.total_capped else str(self.total)
+
+
+def capped_count(queryset, cap):
+    """(count, capped): counts at most cap rows, so the cost is bounded however many match"""
+    count = queryset.order_by()[:cap + 1].count()
+    return (cap, True) if count > cap else (count, False)
+
+
+def paginate(queryset, cursor=None, per_page=50, query=None, with_total=True):
+    """A page of an Attendance queryset in newest-class-first order, after/before the cursor token"""
+    queryset = queryset.select_related('timetable')
+    try:
+        direction, *key = decode_cursor(cursor) if cursor else (None,)
+    except InvalidCursor:
+        direction, key = None, []
+
+    if direction == 'prev':
+        rows = list(queryset.filter(_before(*key)).order_by(*(field.lstrip('-') for field in ORDERING))[:per_page + 1])
+        has_previous = len(rows) > per_page
+        records, has_next = rows[:per_page][::-1], True
+    else:
+        if direction == 'next':
+            queryset_page = queryset.filter(_after(*key))
+        else:
+            queryset_page = queryset
+        rows = list(queryset_page.order_by(*ORDERING)[:per_page + 1])
+        has_next = len(rows) > per_page
+        records, has_previous = rows[:per_page], direction == 'next'
+
+    total, capped = None, False
+    cap = getattr(settings, 'ATTENDANCE_PAGE_COUNT_CAP', 1000)
+    if with_total and cap:
+        total, capped = capped_count(queryset, cap)
+    return KeysetPage(records, has_next, has_previous, query=query, total=total, total_capped=capped)
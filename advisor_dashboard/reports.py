@@ -0,0 +1,197 @@
+"""
+Report queries for the advisor dashboard.
+
+Grouping and counting happen in SQL (values().annotate()) and each function returns
+plain dict rows, so a report costs a fixed number of queries however many sections,
+students or classes it covers. Period totals read the daily rollups maintained by
+core.rollups; per-class figures come from Attendance grouped by timetable.
+"""
+from django.db.models import Case, Count, IntegerField, Sum, When
+from django.db.models.functions import Coalesce
+
+from core.models import Attendance, SectionAttendanceRollup, Student, StudentAttendanceRollup, Subject, Timetable
+
+ATTENDANCE_COUNTS = {
+    'total_count': Count('pk'),
+    'present_count': Coalesce(Sum(Case(When(is_present=True, then=1), default=0, output_field=IntegerField())), 0),
+}
+ROLLUP_COUNTS = {
+    'total_count': Coalesce(Sum('total'), 0),
+    'present_count': Coalesce(Sum('present'), 0),
+}
+
+
+def percentage(present, total):
+    return round(present / total * 100, 1) if total else 0
+
+
+def _in_range(queryset, field, date_from=None, date_to=None):
+    if date_from:
+        queryset = queryset.filter(**{f'{field}__gte': date_from})
+    if date_to:
+        queryset = queryset.filter(**{f'{field}__lte': date_to})
+    return queryset
+
+
+def filter_attendance(students, student_regno=None, subject_id=None, date_from=None, date_to=None, status=None):
+    """Attendance of the given students narrowed by the custom report filters, newest class first"""
+    attendance = Attendance.objects.filter(student__in=students)
+    if student_regno:
+        attendance = attendance.filter(student__student_regno=student_regno)
+    if subject_id:
+        attendance = attendance.filter(timetable__subject_id=subject_id)
+    attendance = _in_range(attendance, 'date', date_from, date_to)
+    if status == 'present':
+        attendance = attendance.filter(is_present=True)
+    elif status == 'absent':
+        attendance = attendance.filter(is_present=False)
+    return attendance.order_by('-date', 'student__name')
+
+
+def section_totals(sections, date_from=None, date_to=None):
+    """(present, total) over a set of sections from the per section per day rollups"""
+    sums = _in_range(
+        SectionAttendanceRollup.objects.filter(section__in=sections), 'date', date_from, date_to
+    ).aggregate(**ROLLUP_COUNTS)
+    return sums['present_count'], sums['total_count']
+
+
+def attendance_summary(attendance):
+    """Totals of an Attendance queryset in one query: total_records, present/absent count and percentage"""
+    sums = attendance.order_by().aggregate(**ATTENDANCE_COUNTS)
+    total, present = sums['total_count'], sums['present_count']
+    return {
+        'total_records': total,
+        'present_count': present,
+        'absent_count': total - present,
+        'attendance_percentage': percentage(present, total),
+    }
+
+
+def section_stats(sections, students, date_from=None, date_to=None):
+    """Per section student count and attendance of its students (three queries in all)"""
+    student_counts = dict(
+        students.order_by().values('section_id').annotate(n=Count('pk', distinct=True)).values_list('section_id', 'n')
+    )
+    totals = {
+        row['student__section_id']: row
+        for row in _in_range(
+            StudentAttendanceRollup.objects.filter(student__in=students), 'date', date_from, date_to
+        ).values('student__section_id').annotate(**ROLLUP_COUNTS).order_by()
+    }
+    stats = []
+    for section in sections.select_related('batch__dept'):
+        row = totals.get(section.section_id, {'total_count': 0, 'present_count': 0})
+        stats.append({
+            'section': section,
+            'student_count': student_counts.get(section.section_id, 0),
+            'total_classes': row['total_count'],
+            'present_count': row['present_count'],
+            'absent_count': row['total_count'] - row['present_count'],
+            'percentage': percentage(row['present_count'], row['total_count']),
+        })
+    return stats
+
+
+def class_stats(students, day):
+    """Per class (timetable) counts and records of a day, keyed by "subject - start time" (three queries)"""
+    attendance = Attendance.objects.filter(student__in=students, date=day)
+    counts = list(attendance.values('timetable_id').annotate(**ATTENDANCE_COUNTS).order_by())
+    timetables = Timetable.objects.select_related('subject', 'section').in_bulk([row['timetable_id'] for row in counts])
+    records = {}
+    for record in attendance.select_related('student').order_by('student__name'):
+        records.setdefault(record.timetable_id, []).append(record)
+
+    grouped = {}
+    for row in sorted(counts, key=lambda row: timetables[row['timetable_id']].start_time):
+        timetable = timetables[row['timetable_id']]
+        key = f"{timetable.subject.subject_name} - {timetable.start_time}"
+        group = grouped.setdefault(key, {
+            'subject': timetable.subject, 'time': timetable.start_time, 'section': timetable.section,
+            'total': 0, 'present': 0, 'absent': 0, 'records': [],
+        })
+        group['total'] += row['total_count']
+        group['present'] += row['present_count']
+        group['absent'] += row['total_count'] - row['present_count']
+        for record in records.get(timetable.pk, []):
+            record.timetable = timetable
+            group['records'].append(record)
+    return grouped
+
+
+def _students_by_regno(rows):
+    return Student.objects.in_bulk({row['student_id'] for row in rows})
+
+
+def student_day_stats(students, date_from, date_to):
+    """{regno: {student, days: {weekday: {present, total}}, total_classes, total_present, percentage}}"""
+    rows = list(_in_range(
+        StudentAttendanceRollup.objects.filter(student__in=students), 'date', date_from, date_to
+    ).values('student_id', 'date').annotate(**ROLLUP_COUNTS).order_by('student_id', 'date'))
+    students_by_regno = _students_by_regno(rows)
+
+    stats = {}
+    for row in rows:
+        data = stats.setdefault(row['student_id'], {
+            'student': students_by_regno[row['student_id']], 'days': {}, 'total_classes': 0, 'total_present': 0,
+        })
+        day = data['days'].setdefault(row['date'].strftime('%A'), {'present': 0, 'total': 0})
+        day['present'] += row['present_count']
+        day['total'] += row['total_count']
+        data['total_classes'] += row['total_count']
+        data['total_present'] += row['present_count']
+    for data in stats.values():
+        data['percentage'] = percentage(data['total_present'], data['total_classes'])
+    return stats
+
+
+def student_subject_stats(students, date_from, date_to):
+    """{regno: {student, subjects: {subject_name: {present, total, percentage}}, totals, percentage}}"""
+    rows = list(_in_range(
+        StudentAttendanceRollup.objects.filter(student__in=students), 'date', date_from, date_to
+    ).values('student_id', 'subject__subject_name').annotate(**ROLLUP_COUNTS).order_by('student_id', 'subject__subject_name'))
+    students_by_regno = _students_by_regno(rows)
+
+    stats = {}
+    for row in rows:
+        data = stats.setdefault(row['student_id'], {
+            'student': students_by_regno[row['student_id']], 'total_classes': 0, 'total_present': 0, 'subjects': {},
+        })
+        data['total_classes'] += row['total_count']
+        data['total_present'] += row['present_count']
+        data['subjects'][row['subject__subject_name']] = {
+            'present': row['present_count'],
+            'total': row['total_count'],
+            'percentage': percentage(row['present_count'], row['total_count']),
+        }
+    for data in stats.values():
+        data['percentage'] = percentage(data['total_present'], data['total_classes'])
+    return stats
+
+
+def subject_student_stats(students, date_from, date_to, subject_id=None):
+    """{subject_name: {subject, students: {regno: {student, present, total, percentage}}, totals, percentage}}"""
+    rollups = _in_range(StudentAttendanceRollup.objects.filter(student__in=students), 'date', date_from, date_to)
+    if subject_id:
+        rollups = rollups.filter(subject_id=subject_id)
+    rows = list(rollups.values('subject_id', 'student_id').annotate(**ROLLUP_COUNTS).order_by('subject_id', 'student_id'))
+    subjects = Subject.objects.in_bulk({row['subject_id'] for row in rows})
+    students_by_regno = _students_by_regno(rows)
+
+    stats = {}
+    for row in rows:
+        subject = subjects[row['subject_id']]
+        data = stats.setdefault(subject.subject_name, {
+            'subject': subject, 'students': {}, 'total_classes': 0, 'total_present': 0,
+        })
+        data['students'][row['student_id']] = {
+            'student': students_by_regno[row['student_id']],
+            'present': row['present_count'],
+            'total': row['total_count'],
+            'percentage': percentage(row['present_count'], row['total_count']),
+        }
+        data['total_classes'] += row['total_count']
+        data['total_present'] += row['present_count']
+    for data in stats.values():
+        data['percentage'] = percentage(data['total_present'], data['total_classes'])
+    return stats
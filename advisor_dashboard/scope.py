@@ -0,0 +1,107 @@
+"""
+Advisor scope: the sections (and their batches and departments) an advisor supervises.
+
+get_scope() resolves an advisor's section/batch/department assignments into frozen
+sets of ids once, caches them in Django's shared cache (CACHES, so every worker sees
+the same entries and generations) and keeps them on the advisor instance for the
+rest of the request; membership checks are then set lookups and the assigned
+querysets are plain `section_id IN (...)` filters. Cached scopes are versioned by
+generation counters (core.generations): advisor_dashboard.signals bumps the
+advisor's on m2m_changed of its departments, batches or sections, and the shared
+one when a section is created, moved or deleted. Changes that send no signals
+(queryset update(), raw SQL) are picked up when the entry expires after
+ADVISOR_SCOPE_CACHE_TIMEOUT seconds.
+"""
+import logging
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import generations
+
+logger = logging.getLogger(__name__)
+
+SECTIONS_GENERATION = 'advisor:scope:gen:sections'
+
+
+def advisor_generation_key(advisor_id) -> str:
+    return f'advisor:scope:gen:{int(advisor_id)}'
+
+
+@dataclass(frozen=True)
+class AdvisorScope:
+    advisor_id: int
+    section_ids: frozenset
+    batch_ids: frozenset
+    dept_ids: frozenset
+
+    def has_section(self, section) -> bool:
+        """Membership of a Section or section id"""
+        return getattr(section, 'section_id', section) in self.section_ids
+
+    def has_batch(self, batch) -> bool:
+        return getattr(batch, 'batch_id', batch) in self.batch_ids
+
+    def has_student(self, student) -> bool:
+        return student.section_id in self.section_ids
+
+    def sections(self):
+        from core.models import Section
+
+        return Section.objects.filter(section_id__in=self.section_ids).select_related('batch__dept')
+
+    def students(self):
+        from core.models import Student
+
+        return Student.objects.filter(section_id__in=self.section_ids)
+
+
+def compute(advisor) -> AdvisorScope:
+    """Resolve the assignments, most specific first: sections, else batches, else departments"""
+    from core.models import Section
+
+    section_ids = list(advisor.sections.values_list('section_id', flat=True))
+    if section_ids:
+        sections = Section.objects.filter(section_id__in=section_ids)
+    else:
+        batch_ids = list(advisor.batches.values_list('batch_id', flat=True))
+        if batch_ids:
+            sections = Section.objects.filter(batch_id__in=batch_ids)
+        else:
+            sections = Section.objects.filter(batch__dept__in=advisor.departments.all())
+    rows = list(sections.values_list('section_id', 'batch_id', 'batch__dept_id'))
+    return AdvisorScope(
+        advisor_id=advisor.pk,
+        section_ids=frozenset(row[0] for row in rows),
+        batch_ids=frozenset(row[1] for row in rows),
+        dept_ids=frozenset(row[2] for row in rows),
+    )
+
+
+def get_scope(advisor) -> AdvisorScope:
+    """The advisor's scope: from the instance, else the cache, else computed and cached"""
+    scope = getattr(advisor, '_scope', None)
+    if scope is not None:
+        return scope
+
+    versions = generations.get_many([advisor_generation_key(advisor.pk), SECTIONS_GENERATION])
+    key = (f'advisor:scope:{advisor.pk}:'
+           f'{versions[advisor_generation_key(advisor.pk)]}:{versions[SECTIONS_GENERATION]}')
+    scope = cache.get(key)
+    if scope is None:
+        scope = compute(advisor)
+        cache.set(key, scope, getattr(settings, 'ADVISOR_SCOPE_CACHE_TIMEOUT', 300))
+        logger.debug(f"🔐 Computed scope for advisor {advisor.pk} ({len(scope.section_ids)} sections)")
+    advisor._scope = scope
+    return scope
+
+
+def invalidate(advisor):
+    """Drop an advisor's cached scope (the instance copy and every process's cache entry)"""
+    advisor.__dict__.pop('_scope', None)
+    generations.bump(advisor_generation_key(advisor.pk))
+
+
+def invalidate_all():
+    generations.bump(SECTIONS_GENERATION)
@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core import generations
+from core.models import Batch, Section
+
+from . import scope
+from .models import Advisor
+
+
+@receiver(m2m_changed, sender=Advisor.departments.through)
+@receiver(m2m_changed, sender=Advisor.batches.through)
+@receiver(m2m_changed, sender=Advisor.sections.through)
+def invalidate_advisor_scope(sender, instance, action, reverse, pk_set=None, **kwargs):
+    """Assignment changes: drop the advisor's scope once the change commits"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        instance.__dict__.pop('_scope', None)
+        transaction.on_commit(lambda: generations.bump(scope.advisor_generation_key(instance.pk)))
+    elif pk_set:
+        # Changed from the section/batch/department side: pk_set holds advisor ids
+        keys = [scope.advisor_generation_key(advisor_id) for advisor_id in pk_set]
+        transaction.on_commit(lambda: generations.bump(*keys))
+    else:
+        transaction.on_commit(scope.invalidate_all)
+
+
+@receiver(post_save, sender=Section)
+@receiver(post_delete, sender=Section)
+@receiver(post_save, sender=Batch)
+@receiver(post_delete, sender=Batch)
+def invalidate_all_advisor_scopes(sender, **kwargs):
+    """Batch and department assignments expand to sections, so section/batch changes touch every scope"""
+    transaction.on_commit(scope.invalidate_all)
@@ -0,0 +1,90 @@
+"""
+Per-advisor dashboard snapshots.
+
+The dashboard's counters and section list are built once and kept in Django's cache
+for ADVISOR_DASHBOARD_CACHE_TIMEOUT seconds. A snapshot stores the attendance
+generation (core.generations) of each of its sections as read before it was built;
+attendance, timetable and student writes bump those generations, so the next request
+after a write rebuilds the snapshot instead of serving stale numbers, as does a
+change to the advisor's scope (advisor_dashboard/scope.py).
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from core import generations
+from core.models import Timetable
+
+from . import reports
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_key(advisor) -> str:
+    return f'advisor:dashboard:{advisor.pk}'
+
+
+def _is_current(snapshot, advisor, today) -> bool:
+    if snapshot.get('today') != today or snapshot.get('section_ids') != advisor.scope.section_ids:
+        return False
+    stored = snapshot['generations']
+    return not stored or generations.get_many(stored) == stored
+
+
+def build(advisor, today=None):
+    """Compute an advisor's dashboard stats and section rows"""
+    today = today or timezone.now().date()
+    sections = list(
+        advisor.get_assigned_sections().annotate(student_count=Count('student', distinct=True))
+    )
+    # Read before computing: a write landing mid-build bumps past these and forces a rebuild
+    stored = generations.get_many(generations.section_attendance_key(section.pk) for section in sections)
+
+    present_count, total_recent_classes = reports.section_totals(
+        [section.pk for section in sections], date_from=today - timedelta(days=7)
+    )
+    return {
+        'today': today,
+        'section_ids': advisor.scope.section_ids,
+        'generations': stored,
+        'sections': [
+            {
+                'section_id': section.pk,
+                'section_name': section.section_name,
+                'dept_name': section.batch.dept.dept_name,
+                'display_year': section.batch.display_year,
+                'student_count': section.student_count,
+            }
+            for section in sections
+        ],
+        'stats': {
+            'total_students': sum(section.student_count for section in sections),
+            'total_sections': len(sections),
+            'total_departments': advisor.departments.count(),
+            'total_batches': advisor.batches.count(),
+            'attendance_percentage': reports.percentage(present_count, total_recent_classes),
+            'today_classes': Timetable.objects.filter(section__in=[section.pk for section in sections], date=today).count(),
+        },
+    }
+
+
+def dashboard_snapshot(advisor):
+    """The advisor's cached dashboard snapshot, rebuilt when expired, from another day or outdated by a write"""
+    today = timezone.now().date()
+    key = _cache_key(advisor)
+    snapshot = cache.get(key)
+    if snapshot is not None and _is_current(snapshot, advisor, today):
+        return snapshot
+
+    snapshot = build(advisor, today)
+    cache.set(key, snapshot, getattr(settings, 'ADVISOR_DASHBOARD_CACHE_TIMEOUT', 60))
+    logger.debug(f"📊 Rebuilt dashboard snapshot for advisor {advisor.pk} ({len(snapshot['sections'])} sections)")
+    return snapshot
+
+
+def invalidate(advisor):
+    cache.delete(_cache_key(advisor))
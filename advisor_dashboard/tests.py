@@ -1,3 +1,277 @@
-from django.test import TestCase
+import gzip
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import rollups
+from core.models import Attendance, Batch, Department, Section, Student, Subject, Timetable
+from prediction_backend.janitor import Janitor
+from . import exports, jobs, pagination, reports, snapshots
+from .models import Advisor, ReportJob
+
+
+class ReportQueryCountTestCase(TestCase):
+    """Report queries are grouped in SQL: the query count does not depend on how many sections there are"""
+
+    def setUp(self):
+        cache.clear()
+        self.dept = Department.objects.create(dept_id=1, dept_name='AIML')
+        self.batch = Batch.objects.create(dept=self.dept, batch_year=2027)
+        self.subject = Subject.objects.create(subject_code='AI301', subject_name='Deep Learning', batch=self.batch)
+        self.today = timezone.now().date()
+        self.user = User.objects.create_user('advisor', password='secret')
+        self.user.groups.add(Group.objects.create(name='Advisors'))
+        Advisor.objects.create(user=self.user, employee_id='E001').batches.add(self.batch)
+        self.client.force_login(self.user)
+
+    def _add_section(self, name, students=4):
+        # Run the on-commit rollup refreshes and generation bumps as a real commit would
+        with self.captureOnCommitCallbacks(execute=True):
+            section = Section.objects.create(batch=self.batch, section_name=name)
+            for days_ago in (0, 1):
+                timetable = Timetable.objects.create(
+                    section=section, subject=self.subject, date=self.today - timedelta(days=days_ago),
+                    start_time='09:00', end_time='09:50',
+                )
+                for i in range(students):
+                    student, _ = Student.objects.get_or_create(
+                        student_regno=f'{name}{i:03d}',
+                        defaults=dict(name=f'{name} {i}', department=self.dept, batch=self.batch, section=section),
+                    )
+                    Attendance.objects.create(student=student, timetable=timetable, is_present=i % 2 == 0)
+            rollups.rebuild()
+
+    def _count_queries(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return len(queries)
+
+    def _assert_constant(self, func):
+        self._add_section('A')
+        one_section = self._count_queries(func)
+        for name in ('B', 'C', 'D'):
+            self._add_section(name)
+        self.assertEqual(self._count_queries(func), one_section)
+
+    def test_views_run_a_fixed_number_of_queries(self):
+        for name in ('dashboard', 'department_attendance', 'reports', 'daily_report', 'weekly_report', 'custom_report'):
+            with self.subTest(view=name):
+                Attendance.objects.all().delete()
+                Student.objects.all().delete()
+                Section.objects.all().delete()
+                url = reverse(f'advisor_dashboard:{name}')
+                self._assert_constant(lambda: self.assertEqual(self.client.get(url).status_code, 200))
+
+    def test_report_functions_run_a_fixed_number_of_queries(self):
+        week_ago = self.today - timedelta(days=7)
+
+        def run():
+            students = Advisor.objects.get(user=self.user).get_assigned_students()
+            list(reports.student_subject_stats(students, week_ago, self.today).values())
+            list(reports.subject_student_stats(students, week_ago, self.today).values())
+
+        self._assert_constant(run)
+
+    def test_counts(self):
+        self._add_section('A')
+        self._add_section('B')
+        advisor = Advisor.objects.get(user=self.user)
+        stats = reports.section_stats(advisor.get_assigned_sections(), advisor.get_assigned_students())
+        self.assertEqual(
+            [(s['section'].section_name, s['student_count'], s['present_count'], s['total_classes']) for s in stats],
+            [('A', 4, 4, 8), ('B', 4, 4, 8)],
+        )
+        daily = reports.class_stats(advisor.get_assigned_students(), self.today)
+        self.assertEqual([(c['present'], c['total'], len(c['records'])) for c in daily.values()], [(4, 8, 8)])
+        summary = reports.attendance_summary(Attendance.objects.all())
+        self.assertEqual((summary['present_count'], summary['total_records']), (8, 16))
+
+    def test_dashboard_snapshot_is_rebuilt_after_attendance_writes(self):
+        self._add_section('A')
+        advisor = Advisor.objects.get(user=self.user)
+        snapshot = snapshots.dashboard_snapshot(advisor)
+        self.assertEqual(
+            (snapshot['stats']['total_students'], snapshot['stats']['today_classes'], snapshot['stats']['attendance_percentage']),
+            (4, 1, 50.0),
+        )
+        self.assertEqual([s['student_count'] for s in snapshot['sections']], [4])
+        with self.assertNumQueries(0):
+            self.assertEqual(snapshots.dashboard_snapshot(advisor), snapshot)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for attendance in Attendance.objects.filter(is_present=False):
+                attendance.is_present = True
+                attendance.save()
+        self.assertEqual(snapshots.dashboard_snapshot(advisor)['stats']['attendance_percentage'], 100.0)
+
+    def test_csv_export_streams_rows(self):
+        self._add_section('A')
+        url = reverse('advisor_dashboard:custom_report')
+        response = self.client.get(url, {'export': 'csv'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['X-Total-Rows'], '8')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], ','.join(exports.HEADER))
+        self.assertEqual(len(lines), 9)
+        self.assertIn('A000,A 0,Deep Learning', lines[1])
+
+        response = self.client.get(url, {'export': 'csv'}, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode().splitlines(), lines)
+
+    def test_report_job_artifact_is_reused_until_attendance_changes(self):
+        self._add_section('A')
+        with tempfile.TemporaryDirectory() as report_dir, override_settings(REPORT_JOB_WORKERS=0, REPORT_JOB_DIR=report_dir):
+            url = reverse('advisor_dashboard:report_job_create')
+            response = self.client.post(url, {'status': 'present'})
+            self.assertEqual(response.status_code, 200)
+            job = response.json()
+            self.assertEqual((job['status'], job['row_count']), ('done', 4))
+            download = self.client.get(job['download_url'])
+            self.assertEqual(b''.join(download.streaming_content).decode().splitlines()[0], ','.join(exports.HEADER))
+
+            self.assertEqual(self.client.post(url, {'status': 'present'}).json()['job_id'], job['job_id'])
+            self.assertNotEqual(self.client.post(url, {'status': 'absent'}).json()['job_id'], job['job_id'])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                for attendance in Attendance.objects.filter(is_present=False):
+                    attendance.is_present = True
+                    attendance.save()
+            rebuilt = self.client.post(url, {'status': 'present'}).json()
+            self.assertNotEqual(rebuilt['job_id'], job['job_id'])
+            self.assertEqual(rebuilt['row_count'], 8)
+            self.assertEqual(self.client.get(job['status_url']).status_code, 404)  # Superseded
+
+    def test_report_job_download_follows_the_advisor_permissions_and_scope(self):
+        self._add_section('A')
+        advisor = Advisor.objects.get(user=self.user)
+        with tempfile.TemporaryDirectory() as report_dir, override_settings(REPORT_JOB_WORKERS=0, REPORT_JOB_DIR=report_dir):
+            job = self.client.post(reverse('advisor_dashboard:report_job_create'), {'status': 'present'}).json()
+            self.assertEqual(self.client.get(job['download_url']).status_code, 200)
+
+            Advisor.objects.filter(pk=advisor.pk).update(can_generate_reports=False)
+            self.assertEqual(self.client.get(job['download_url']).status_code, 403)
+            self.assertEqual(self.client.get(job['status_url']).status_code, 403)
+            Advisor.objects.filter(pk=advisor.pk).update(can_generate_reports=True)
+
+            # The artifact holds students of a batch the advisor no longer has
+            with self.captureOnCommitCallbacks(execute=True):
+                advisor.batches.remove(self.batch)
+            self.assertEqual(self.client.get(job['download_url']).status_code, 410)
+            self.assertNotIn('download_url', self.client.get(job['status_url']).json())
+
+    def test_stuck_report_job_is_replaced_after_timeout(self):
+        """A job whose worker never ran is failed after REPORT_JOB_TIMEOUT_MINUTES instead of reused forever"""
+        self._add_section('A')
+        url = reverse('advisor_dashboard:report_job_create')
+        with tempfile.TemporaryDirectory() as report_dir, override_settings(REPORT_JOB_WORKERS=2, REPORT_JOB_DIR=report_dir):
+            stuck = self.client.post(url, {'status': 'present'}).json()  # Its on-commit hook never runs
+            self.assertEqual(self.client.post(url, {'status': 'present'}).json()['job_id'], stuck['job_id'])
+
+            ReportJob.objects.filter(job_id=stuck['job_id']).update(created_at=timezone.now() - timedelta(minutes=31))
+            self.assertEqual(self.client.get(stuck['status_url']).json()['status'], ReportJob.FAILED)
+            # A timed-out job that is picked up late is not built
+            self.assertEqual(jobs.run(ReportJob.objects.get(job_id=stuck['job_id']).pk).status, ReportJob.FAILED)
+
+            with override_settings(REPORT_JOB_WORKERS=0):
+                replacement = self.client.post(url, {'status': 'present'}).json()
+            self.assertNotEqual(replacement['job_id'], stuck['job_id'])
+            self.assertEqual((replacement['status'], replacement['row_count']), ('done', 4))
+
+    def test_report_job_timed_out_while_running_stays_failed(self):
+        """A build that outlives REPORT_JOB_TIMEOUT_MINUTES does not overwrite the failure or keep its file"""
+        self._add_section('A')
+        url = reverse('advisor_dashboard:report_job_create')
+        with tempfile.TemporaryDirectory() as report_dir, override_settings(REPORT_JOB_WORKERS=2, REPORT_JOB_DIR=report_dir):
+            job_id = self.client.post(url, {'status': 'present'}).json()['job_id']  # Its on-commit hook never runs
+            write_csv = jobs._write_csv
+
+            def slow_write(path, attendance):
+                # The timeout passes while the worker is still writing
+                ReportJob.objects.filter(job_id=job_id).update(created_at=timezone.now() - timedelta(minutes=31))
+                self.assertTrue(jobs.expire_if_stale(ReportJob.objects.get(job_id=job_id)))
+                return write_csv(path, attendance)
+
+            with mock.patch.object(jobs, '_write_csv', slow_write):
+                job = jobs.run(ReportJob.objects.get(job_id=job_id).pk)
+            self.assertEqual(job.status, ReportJob.FAILED)
+            self.assertEqual(ReportJob.objects.get(job_id=job_id).status, ReportJob.FAILED)
+            self.assertEqual(os.listdir(report_dir), [])
+
+    def test_janitor_removes_old_report_jobs_and_their_files(self):
+        """Jobs older than REPORT_JOB_RETENTION_DAYS go with their artifacts; stray old files go too"""
+        self._add_section('A')
+        url = reverse('advisor_dashboard:report_job_create')
+        with tempfile.TemporaryDirectory() as report_dir, override_settings(REPORT_JOB_WORKERS=0, REPORT_JOB_DIR=report_dir):
+            old = ReportJob.objects.get(job_id=self.client.post(url, {'status': 'present'}).json()['job_id'])
+            new = ReportJob.objects.get(job_id=self.client.post(url, {'status': 'absent'}).json()['job_id'])
+            ReportJob.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=8))
+            stray = os.path.join(report_dir, 'crashed.csv.part')
+            open(stray, 'w').close()
+            os.utime(stray, (0, 0))
+
+            janitor = Janitor(temp_hours=0, session_embedding_hours=0, report_job_days=7)
+            self.assertEqual(janitor.sweep_report_jobs(dry_run=True), (1, 2))
+            self.assertEqual(janitor.sweep_report_jobs(), (1, 2))
+            self.assertEqual(list(ReportJob.objects.values_list('pk', flat=True)), [new.pk])
+            self.assertEqual(os.listdir(report_dir), [os.path.basename(new.artifact_path)])
+
+    def test_keyset_pages_cover_every_record_at_constant_cost(self):
+        for name in ('A', 'B', 'C'):
+            self._add_section(name)
+        attendance = Attendance.objects.all()
+        expected = list(attendance.order_by(*pagination.ORDERING).values_list('pk', flat=True))
+        seen, cursor, costs = [], None, []
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                page = pagination.paginate(attendance, cursor, per_page=5)
+                records = [record.pk for record in page]
+            costs.append(len(queries))
+            seen.extend(records)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+        self.assertEqual(set(costs), {2})  # Page rows and capped total, however deep
+        self.assertEqual(page.total, 24)
+
+        back = pagination.paginate(attendance, page.previous_cursor, per_page=5)
+        self.assertEqual([record.pk for record in back], expected[15:20])
+        self.assertEqual([record.pk for record in pagination.paginate(attendance, 'garbage', per_page=5)], expected[:5])
+
+        response = self.client.get(reverse('advisor_dashboard:attendance_list'), {'status': 'present', 'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+
+    def test_advisor_scope_is_cached_and_follows_assignments(self):
+        self._add_section('A')
+        self._add_section('B')
+        section_a, section_b = Section.objects.order_by('section_name')
+        advisor = Advisor.objects.get(user=self.user)
+        self.assertEqual(advisor.scope.section_ids, {section_a.pk, section_b.pk})
+        self.assertEqual(advisor.scope.batch_ids, {self.batch.pk})
+
+        advisor = Advisor.objects.get(user=self.user)
+        with self.assertNumQueries(0):  # Served from the cache, then the instance
+            self.assertTrue(advisor.scope.has_section(section_a))
+            self.assertTrue(advisor.scope.has_student(Student(section=section_b)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            advisor.sections.add(section_a)  # Direct sections take precedence over batches
+        self.assertEqual(Advisor.objects.get(user=self.user).scope.section_ids, {section_a.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            section_b.advisors.clear()
+            section_a.advisors.remove(advisor)
+        self.assertEqual(Advisor.objects.get(user=self.user).scope.section_ids, {section_a.pk, section_b.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            section_c = Section.objects.create(batch=self.batch, section_name='C')
+        self.assertIn(section_c.pk, Advisor.objects.get(user=self.user).scope.section_ids)
@@ -16,6 +16,9 @@ urlpatterns = [
     path('reports/monthly/', views.monthly_report, name='monthly_report'),
     path('reports/subject/', views.subject_report, name='subject_report'),
     path('reports/custom/', views.custom_report, name='custom_report'),
+    path('reports/jobs/', views.report_job_create, name='report_job_create'),
+    path('reports/jobs/<uuid:job_id>/', views.report_job_status, name='report_job_status'),
+    path('reports/jobs/<uuid:job_id>/download/', views.report_job_download, name='report_job_download'),
     
     path('history/', views.advisor_attendance_history, name='attendance_history'),
     
@@ -41,6 +44,7 @@ urlpatterns = [
     
     # API endpoints
     path('api/sections/', views.get_advisor_sections_api, name='api_sections'),
+    path('api/low-attendance/', views.low_attendance_api, name='api_low_attendance'),
     
     # Staff management
     path('staff/', views.staff_list, name='staff_list'),
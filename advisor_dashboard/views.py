@@ -1,21 +1,25 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseForbidden, JsonResponse, HttpResponse
+from django.http import FileResponse, HttpResponseForbidden, JsonResponse, HttpResponse
 from django.contrib import messages
 from django.db.models import Count, Q, Avg
+from django.conf import settings
 from django.utils import timezone
 from datetime import datetime, timedelta
 import json
 import csv
 import io
+import os
 from django.core.paginator import Paginator
 from django.db import transaction
 from django.contrib.auth.models import User, Group
 from django.contrib.auth.forms import UserCreationForm
 from django import forms
 
+from core import attendance_stats
 from core.models import Student, Department, Batch, Section, Subject, Attendance, Timetable
-from .models import Advisor, StaffCreator
+from .models import Advisor, ReportJob, StaffCreator
+from . import exports, jobs, pagination, reports, snapshots
 from prediction_backend.models import AttendancePrediction, AttendanceSubmission
 
 def get_advisor_profile(user):
@@ -71,48 +75,15 @@ def advisor_dashboard(request):
         }
         return render(request, 'advisor_dashboard/advisor_dashboard.html', context)
     
-    # Get advisor's assigned data
-    assigned_students = advisor.get_assigned_students()
-    assigned_sections = advisor.get_assigned_sections()
-    assigned_departments = advisor.departments.all()
-    assigned_batches = advisor.batches.all()
-    
-    # Calculate attendance statistics
-    today = timezone.now().date()
-    week_ago = today - timedelta(days=7)
-    
-    # Recent attendance stats
-    recent_attendance = Attendance.objects.filter(
-        student__in=assigned_students,
-        timetable__date__gte=week_ago
-    )
-    
-    total_recent_classes = recent_attendance.count()
-    present_count = recent_attendance.filter(is_present=True).count()
-    attendance_percentage = (present_count / total_recent_classes * 100) if total_recent_classes > 0 else 0
-    
-    # Today's classes
-    today_timetables = Timetable.objects.filter(
-        section__in=assigned_sections,
-        date=today
-    )
+    # Counters and section rows come from a short-lived per-advisor snapshot, rebuilt after attendance writes
+    snapshot = snapshots.dashboard_snapshot(advisor)
     
     context = {
         'user': request.user,
         'advisor': advisor,
         'is_advisor': True,
-        'assigned_students': assigned_students,
-        'assigned_sections': assigned_sections,
-        'assigned_departments': assigned_departments,
-        'assigned_batches': assigned_batches,
-        'stats': {
-            'total_students': assigned_students.count(),
-            'total_sections': assigned_sections.count(),
-            'total_departments': assigned_departments.count(),
-            'total_batches': assigned_batches.count(),
-            'attendance_percentage': round(attendance_percentage, 1),
-            'today_classes': today_timetables.count(),
-        }
+        'assigned_sections': snapshot['sections'],
+        'stats': snapshot['stats'],
     }
     return render(request, 'advisor_dashboard/advisor_dashboard.html', context)
 
@@ -150,35 +121,11 @@ def department_attendance(request):
         students = students.filter(section__batch_id=batch_id)
         
     if section_id:
-        sections = sections.filter(id=section_id)
+        sections = sections.filter(section_id=section_id)
         students = students.filter(section_id=section_id)
     
-    # Get attendance data
-    attendance_query = Attendance.objects.filter(student__in=students)
-    
-    if date_from:
-        attendance_query = attendance_query.filter(timetable__date__gte=date_from)
-    if date_to:
-        attendance_query = attendance_query.filter(timetable__date__lte=date_to)
-    
-    # Calculate attendance statistics by section
-    section_stats = []
-    for section in sections:
-        section_students = students.filter(section=section)
-        section_attendance = attendance_query.filter(student__in=section_students)
-        
-        total_classes = section_attendance.count()
-        present_count = section_attendance.filter(is_present=True).count()
-        percentage = (present_count / total_classes * 100) if total_classes > 0 else 0
-        
-        section_stats.append({
-            'section': section,
-            'student_count': section_students.count(),
-            'total_classes': total_classes,
-            'present_count': present_count,
-            'absent_count': total_classes - present_count,
-            'percentage': round(percentage, 1)
-        })
+    # Attendance statistics by section, grouped in SQL
+    section_stats = reports.section_stats(sections, students, date_from, date_to)
     
     context = {
         'user': request.user,
@@ -254,6 +201,37 @@ def get_advisor_sections_api(request):
     
     return JsonResponse({'sections': sections_data})
 
+@login_required
+def low_attendance_api(request):
+    """API endpoint listing the advisor's students below an attendance threshold (overall or in one subject)"""
+    if not check_advisor_permission(request.user):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    advisor = get_advisor_profile(request.user)
+    
+    if not advisor:
+        return JsonResponse({'error': 'No advisor profile found'}, status=404)
+    try:
+        threshold = float(request.GET.get('threshold', getattr(settings, 'ATTENDANCE_ELIGIBILITY_THRESHOLD', 75.0)))
+    except ValueError:
+        return JsonResponse({'error': 'threshold must be a number'}, status=400)
+    subject_id = request.GET.get('subject_id')
+    
+    stats = attendance_stats.below_threshold(threshold, subject_id=subject_id, students=advisor.get_assigned_students())
+    students_data = [
+        {
+            'student_regno': row.student_id,
+            'name': row.student.name,
+            'subject': row.subject.subject_name if row.subject else None,
+            'present': row.present,
+            'total': row.total,
+            'percentage': round(row.percentage, 1),
+        }
+        for row in stats
+    ]
+    
+    return JsonResponse({'threshold': threshold, 'subject_id': subject_id, 'count': len(students_data), 'students': students_data})
+
 @login_required
 def advisor_attendance_history(request):
     """View attendance history with detailed analytics"""
@@ -360,7 +338,7 @@ def student_detail(request, student_regno):
     
     # Get student and verify advisor has permission
     student = get_object_or_404(Student, student_regno=student_regno)
-    if student not in advisor.get_assigned_students():
+    if not advisor.scope.has_student(student):
         messages.error(request, "You don't have permission to view this student.")
         return redirect("advisor_dashboard:student_list")
     
@@ -390,7 +368,7 @@ def student_create(request):
                 section = get_object_or_404(Section, section_id=request.POST['section'])
                 
                 # Ensure advisor has permission for this section
-                if section not in advisor.get_assigned_sections():
+                if not advisor.scope.has_section(section):
                     messages.error(request, "You don't have permission to add students to this section.")
                     return redirect("advisor_dashboard:student_create")
                 
@@ -457,7 +435,7 @@ def bulk_student_upload(request):
             # Get the selected section and validate advisor access
             section = get_object_or_404(Section, section_id=section_id)
             print(f"DEBUG: Found section: {section}")
-            if section not in advisor.get_assigned_sections():
+            if not advisor.scope.has_section(section):
                 print("DEBUG: Section not in advisor's assigned sections")
                 messages.error(request, "You don't have permission to add students to this section.")
                 return redirect("advisor_dashboard:bulk_student_upload")
@@ -590,7 +568,7 @@ def student_edit(request, student_regno):
         return redirect("advisor_dashboard:dashboard")
     
     student = get_object_or_404(Student, student_regno=student_regno)
-    if student not in advisor.get_assigned_students():
+    if not advisor.scope.has_student(student):
         messages.error(request, "You don't have permission to edit this student.")
         return redirect("advisor_dashboard:student_list")
     
@@ -603,7 +581,7 @@ def student_edit(request, student_regno):
                 new_section_id = request.POST.get('section')
                 if new_section_id and int(new_section_id) != student.section.section_id:
                     new_section = get_object_or_404(Section, section_id=new_section_id)
-                    if new_section in advisor.get_assigned_sections():
+                    if advisor.scope.has_section(new_section):
                         student.section = new_section
                         # Automatically update department and batch based on new section
                         student.department = new_section.batch.dept
@@ -642,7 +620,7 @@ def student_delete(request, student_regno):
         return redirect("advisor_dashboard:dashboard")
     
     student = get_object_or_404(Student, student_regno=student_regno)
-    if student not in advisor.get_assigned_students():
+    if not advisor.scope.has_student(student):
         messages.error(request, "You don't have permission to delete this student.")
         return redirect("advisor_dashboard:student_list")
     
@@ -685,8 +663,8 @@ def attendance_list(request):
     student_regno = request.GET.get('student')
     if student_regno:
         # Verify the student belongs to this advisor
-        advisor_students = advisor.get_assigned_students()
-        if advisor_students.filter(student_regno=student_regno).exists():
+        student = Student.objects.filter(student_regno=student_regno).only('section_id').first()
+        if student and advisor.scope.has_student(student):
             attendance_records = attendance_records.filter(student__student_regno=student_regno)
     
     subject_id = request.GET.get('subject')
@@ -695,11 +673,11 @@ def attendance_list(request):
     
     date_from = request.GET.get('date_from')
     if date_from:
-        attendance_records = attendance_records.filter(timetable__date__gte=date_from)
+        attendance_records = attendance_records.filter(date__gte=date_from)
     
     date_to = request.GET.get('date_to')
     if date_to:
-        attendance_records = attendance_records.filter(timetable__date__lte=date_to)
+        attendance_records = attendance_records.filter(date__lte=date_to)
     
     status = request.GET.get('status')
     if status == 'present':
@@ -707,13 +685,8 @@ def attendance_list(request):
     elif status == 'absent':
         attendance_records = attendance_records.filter(is_present=False)
     
-    # Order by date (most recent first)
-    attendance_records = attendance_records.order_by('-timetable__date', '-timetable__start_time')
-    
-    # Pagination
-    paginator = Paginator(attendance_records, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination, most recent class first (deep pages cost the same as the first)
+    page_obj = pagination.paginate(attendance_records, request.GET.get('cursor'), per_page=50, query=request.GET)
     
     context = {
         'user': request.user,
@@ -747,7 +720,7 @@ def attendance_edit(request, attendance_id):
     attendance = get_object_or_404(Attendance, attendance_id=attendance_id)
     
     # Verify advisor has permission to edit this attendance
-    if attendance.student not in advisor.get_assigned_students():
+    if not advisor.scope.has_section(attendance.section_id):
         messages.error(request, "You don't have permission to edit this attendance record.")
         return redirect("advisor_dashboard:attendance_list")
     
@@ -799,7 +772,7 @@ def bulk_attendance_edit(request):
     timetable = get_object_or_404(Timetable, id=timetable_id)
     
     # Verify advisor has permission for this section
-    if timetable.section not in advisor.get_assigned_sections():
+    if not advisor.scope.has_section(timetable.section_id):
         messages.error(request, "You don't have permission to edit attendance for this section.")
         return redirect("advisor_dashboard:attendance_list")
     
@@ -877,28 +850,16 @@ def attendance_reports(request):
     assigned_students = advisor.get_assigned_students()
     assigned_sections = advisor.get_assigned_sections()
     
-    # Calculate today's attendance
+    # Today's, this week's and this month's attendance from the per section per day rollups
     today = timezone.now().date()
-    today_attendance = Attendance.objects.filter(
-        student__in=assigned_students,
-        timetable__date=today
-    )
+    today_present, today_classes = reports.section_totals(assigned_sections, today, today)
     
-    # Calculate this week's attendance
     week_start = today - timedelta(days=today.weekday())
     week_end = week_start + timedelta(days=6)
+    week_present, week_classes = reports.section_totals(assigned_sections, week_start, week_end)
     
-    week_attendance = Attendance.objects.filter(
-        student__in=assigned_students,
-        timetable__date__range=[week_start, week_end]
-    )
-    
-    # Calculate this month's attendance
     month_start = today.replace(day=1)
-    month_attendance = Attendance.objects.filter(
-        student__in=assigned_students,
-        timetable__date__gte=month_start
-    )
+    month_present, month_classes = reports.section_totals(assigned_sections, date_from=month_start)
     
     context = {
         'user': request.user,
@@ -908,12 +869,12 @@ def attendance_reports(request):
         'stats': {
             'total_students': assigned_students.count(),
             'total_sections': assigned_sections.count(),
-            'today_classes': today_attendance.count(),
-            'today_present': today_attendance.filter(is_present=True).count(),
-            'week_classes': week_attendance.count(),
-            'week_present': week_attendance.filter(is_present=True).count(),
-            'month_classes': month_attendance.count(),
-            'month_present': month_attendance.filter(is_present=True).count(),
+            'today_classes': today_classes,
+            'today_present': today_present,
+            'week_classes': week_classes,
+            'week_present': week_present,
+            'month_classes': month_classes,
+            'month_present': month_present,
         }
     }
     return render(request, 'advisor_dashboard/reports/reports_dashboard.html', context)
@@ -940,34 +901,8 @@ def daily_report(request):
     else:
         selected_date = timezone.now().date()
     
-    # Get attendance for the selected date
-    attendance_records = Attendance.objects.filter(
-        student__in=advisor.get_assigned_students(),
-        timetable__date=selected_date
-    ).select_related('student', 'timetable', 'timetable__subject', 'timetable__section')
-    
-    # Group by subject and time
-    grouped_attendance = {}
-    for record in attendance_records:
-        key = f"{record.timetable.subject.subject_name} - {record.timetable.start_time}"
-        if key not in grouped_attendance:
-            grouped_attendance[key] = {
-                'subject': record.timetable.subject,
-                'time': record.timetable.start_time,
-                'section': record.timetable.section,
-                'total': 0,
-                'present': 0,
-                'absent': 0,
-                'records': []
-            }
-        
-        grouped_attendance[key]['total'] += 1
-        grouped_attendance[key]['records'].append(record)
-        
-        if record.is_present:
-            grouped_attendance[key]['present'] += 1
-        else:
-            grouped_attendance[key]['absent'] += 1
+    # Attendance for the selected date, counted per class in SQL
+    grouped_attendance = reports.class_stats(advisor.get_assigned_students(), selected_date)
     
     context = {
         'user': request.user,
@@ -1005,43 +940,8 @@ def weekly_report(request):
     week_start = selected_date - timedelta(days=selected_date.weekday())
     week_end = week_start + timedelta(days=6)
     
-    # Get attendance for the week
-    attendance_records = Attendance.objects.filter(
-        student__in=advisor.get_assigned_students(),
-        timetable__date__range=[week_start, week_end]
-    ).select_related('student', 'timetable', 'timetable__subject')
-    
-    # Group by student and day
-    student_attendance = {}
-    for record in attendance_records:
-        student_id = record.student.student_regno
-        if student_id not in student_attendance:
-            student_attendance[student_id] = {
-                'student': record.student,
-                'days': {},
-                'total_classes': 0,
-                'total_present': 0,
-            }
-        
-        day = record.timetable.date.strftime('%A')
-        if day not in student_attendance[student_id]['days']:
-            student_attendance[student_id]['days'][day] = {'present': 0, 'total': 0}
-        
-        student_attendance[student_id]['days'][day]['total'] += 1
-        student_attendance[student_id]['total_classes'] += 1
-        
-        if record.is_present:
-            student_attendance[student_id]['days'][day]['present'] += 1
-            student_attendance[student_id]['total_present'] += 1
-    
-    # Calculate percentages
-    for student_data in student_attendance.values():
-        if student_data['total_classes'] > 0:
-            student_data['percentage'] = round(
-                (student_data['total_present'] / student_data['total_classes']) * 100, 1
-            )
-        else:
-            student_data['percentage'] = 0
+    # Present/total per student per day, summed over subjects in the rollups
+    student_attendance = reports.student_day_stats(advisor.get_assigned_students(), week_start, week_end)
     
     context = {
         'user': request.user,
@@ -1084,54 +984,8 @@ def monthly_report(request):
     else:
         month_end = month_start.replace(month=month_start.month + 1) - timedelta(days=1)
     
-    # Get attendance for the month
-    attendance_records = Attendance.objects.filter(
-        student__in=advisor.get_assigned_students(),
-        timetable__date__range=[month_start, month_end]
-    ).select_related('student', 'timetable', 'timetable__subject')
-    
-    # Group by student
-    student_attendance = {}
-    for record in attendance_records:
-        student_id = record.student.student_regno
-        if student_id not in student_attendance:
-            student_attendance[student_id] = {
-                'student': record.student,
-                'total_classes': 0,
-                'total_present': 0,
-                'subjects': {}
-            }
-        
-        student_attendance[student_id]['total_classes'] += 1
-        if record.is_present:
-            student_attendance[student_id]['total_present'] += 1
-        
-        # Track by subject
-        subject_name = record.timetable.subject.subject_name
-        if subject_name not in student_attendance[student_id]['subjects']:
-            student_attendance[student_id]['subjects'][subject_name] = {'present': 0, 'total': 0}
-        
-        student_attendance[student_id]['subjects'][subject_name]['total'] += 1
-        if record.is_present:
-            student_attendance[student_id]['subjects'][subject_name]['present'] += 1
-    
-    # Calculate percentages
-    for student_data in student_attendance.values():
-        if student_data['total_classes'] > 0:
-            student_data['percentage'] = round(
-                (student_data['total_present'] / student_data['total_classes']) * 100, 1
-            )
-        else:
-            student_data['percentage'] = 0
-        
-        # Calculate subject percentages
-        for subject_data in student_data['subjects'].values():
-            if subject_data['total'] > 0:
-                subject_data['percentage'] = round(
-                    (subject_data['present'] / subject_data['total']) * 100, 1
-                )
-            else:
-                subject_data['percentage'] = 0
+    # Present/total per student per subject for the month from the rollups
+    student_attendance = reports.student_subject_stats(advisor.get_assigned_students(), month_start, month_end)
     
     # Calculate previous and next month
     if month_start.month == 1:
@@ -1183,61 +1037,10 @@ def subject_report(request):
         timetable__section__in=advisor.get_assigned_sections()
     ).distinct()
     
-    # Build query
-    attendance_query = Attendance.objects.filter(
-        student__in=advisor.get_assigned_students(),
-        timetable__date__range=[date_from, date_to]
-    ).select_related('student', 'timetable', 'timetable__subject')
-    
-    if subject_id:
-        attendance_query = attendance_query.filter(timetable__subject_id=subject_id)
-    
-    attendance_records = attendance_query
-    
-    # Group with subject and student
-    subject_attendance = {}
-    for record in attendance_records:
-        subject_name = record.timetable.subject.subject_name
-        student_id = record.student.student_regno
-        
-        if subject_name not in subject_attendance:
-            subject_attendance[subject_name] = {
-                'subject': record.timetable.subject,
-                'students': {},
-                'total_classes': 0,
-                'total_present': 0,
-            }
-        
-        if student_id not in subject_attendance[subject_name]['students']:
-            subject_attendance[subject_name]['students'][student_id] = {
-                'student': record.student,
-                'present': 0,
-                'total': 0,
-            }
-        
-        subject_attendance[subject_name]['students'][student_id]['total'] += 1
-        subject_attendance[subject_name]['total_classes'] += 1
-        
-        if record.is_present:
-            subject_attendance[subject_name]['students'][student_id]['present'] += 1
-            subject_attendance[subject_name]['total_present'] += 1
-    
-    # Calculate percentages
-    for subject_data in subject_attendance.values():
-        if subject_data['total_classes'] > 0:
-            subject_data['percentage'] = round(
-                (subject_data['total_present'] / subject_data['total_classes']) * 100, 1
-            )
-        else:
-            subject_data['percentage'] = 0
-        
-        for student_data in subject_data['students'].values():
-            if student_data['total'] > 0:
-                student_data['percentage'] = round(
-                    (student_data['present'] / student_data['total']) * 100, 1
-                )
-            else:
-                student_data['percentage'] = 0
+    # Present/total per subject per student from the rollups
+    subject_attendance = reports.subject_student_stats(
+        advisor.get_assigned_students(), date_from, date_to, subject_id=subject_id
+    )
     
     context = {
         'user': request.user,
@@ -1277,40 +1080,25 @@ def custom_report(request):
     ).distinct()
     
     # Build query
-    attendance_query = Attendance.objects.filter(
-        student__in=assigned_students
-    ).select_related('student', 'timetable', 'timetable__subject', 'timetable__section')
-    
-    # Apply filters
-    if student_regno:
-        attendance_query = attendance_query.filter(student__student_regno=student_regno)
-    
-    if subject_id:
-        attendance_query = attendance_query.filter(timetable__subject_id=subject_id)
-    
-    if date_from:
-        attendance_query = attendance_query.filter(timetable__date__gte=date_from)
-    
-    if date_to:
-        attendance_query = attendance_query.filter(timetable__date__lte=date_to)
-    
-    if status == 'present':
-        attendance_query = attendance_query.filter(is_present=True)
-    elif status == 'absent':
-        attendance_query = attendance_query.filter(is_present=False)
+    attendance_query = reports.filter_attendance(
+        assigned_students, student_regno=student_regno, subject_id=subject_id,
+        date_from=date_from, date_to=date_to, status=status,
+    )
+    attendance_records = attendance_query.select_related('student', 'timetable', 'timetable__subject', 'timetable__section')
     
-    attendance_records = attendance_query.order_by('-timetable__date', 'student__name')
+    # Handle export (streamed, before any page or summary queries)
+    if export_format == 'csv':
+        return exports.stream_attendance_csv(
+            request, attendance_query, f"custom_report_{timezone.now().strftime('%Y%m%d')}"
+        )
     
-    # Pagination
-    paginator = Paginator(attendance_records, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination, most recent class first (the summary below gives the exact total)
+    page_obj = pagination.paginate(
+        attendance_records, request.GET.get('cursor'), per_page=50, query=request.GET, with_total=False
+    )
     
-    # Calculate summary statistics
-    total_records = attendance_records.count()
-    present_count = attendance_records.filter(is_present=True).count()
-    absent_count = total_records - present_count
-    attendance_percentage = (present_count / total_records * 100) if total_records > 0 else 0
+    # Summary statistics in one aggregate query
+    summary = reports.attendance_summary(attendance_query)
     
     context = {
         'user': request.user,
@@ -1325,47 +1113,72 @@ def custom_report(request):
             'date_to': date_to,
             'status': status,
         },
-        'summary': {
-            'total_records': total_records,
-            'present_count': present_count,
-            'absent_count': absent_count,
-            'attendance_percentage': round(attendance_percentage, 1),
-        }
+        'summary': summary,
     }
     
-    # Handle export
-    if export_format == 'csv':
-        return export_attendance_csv(attendance_records, f"custom_report_{timezone.now().strftime('%Y%m%d')}")
-    
     return render(request, 'advisor_dashboard/reports/custom_report.html', context)
 
-def export_attendance_csv(attendance_records, filename):
-    """Export attendance records to CSV"""
-    import csv
-    from django.http import HttpResponse
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Student Registration', 'Student Name', 'Subject', 'Date', 'Time', 
-        'Section', 'Status', 'Recorded At'
-    ])
-    
-    for record in attendance_records:
-        writer.writerow([
-            record.student.student_regno,
-            record.student.name,
-            record.timetable.subject.subject_name,
-            record.timetable.date,
-            record.timetable.start_time,
-            record.timetable.section.section_name,
-            'Present' if record.is_present else 'Absent',
-            record.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        ])
-    
-    return response
+@login_required
+def report_job_create(request):
+    """Enqueue a custom report to be built in the background (or reuse an identical, still valid one)"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    if not check_advisor_permission(request.user):
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    advisor = get_advisor_profile(request.user)
+    if not advisor or not advisor.can_generate_reports:
+        return JsonResponse({'error': 'No advisor profile with report permissions found'}, status=403)
+
+    report_format = request.POST.get('format', 'csv')
+    if report_format not in dict(ReportJob.FORMAT_CHOICES):
+        return JsonResponse({'error': f'Unknown report format: {report_format}'}, status=400)
+    params = {
+        'student_regno': request.POST.get('student'),
+        'subject_id': request.POST.get('subject'),
+        'date_from': request.POST.get('date_from'),
+        'date_to': request.POST.get('date_to'),
+        'status': request.POST.get('status'),
+    }
+    job = jobs.submit(advisor, params, report_format)
+    return JsonResponse(jobs.status(job), status=200 if job.status == ReportJob.DONE else 202)
+
+def _get_report_job(request, job_id):
+    """The requesting advisor's report job, checked like report_job_create.
+
+    Returns (job, error_response); error_response is set when the user may not generate reports.
+    """
+    if not check_advisor_permission(request.user):
+        return None, JsonResponse({'error': 'Access denied'}, status=403)
+    advisor = get_advisor_profile(request.user)
+    if not advisor or not advisor.can_generate_reports:
+        return None, JsonResponse({'error': 'No advisor profile with report permissions found'}, status=403)
+    return get_object_or_404(ReportJob.objects.select_related('advisor'), job_id=job_id, advisor=advisor), None
+
+@login_required
+def report_job_status(request, job_id):
+    """Poll a report job"""
+    job, error_response = _get_report_job(request, job_id)
+    if error_response:
+        return error_response
+    jobs.expire_if_stale(job)
+    return JsonResponse(jobs.status(job))
+
+@login_required
+def report_job_download(request, job_id):
+    """Download a finished report job's artifact while it is still valid for the advisor"""
+    job, error_response = _get_report_job(request, job_id)
+    if error_response:
+        return error_response
+    if job.status != ReportJob.DONE:
+        return JsonResponse(jobs.status(job), status=409)
+    if not jobs.is_fresh(job):
+        return JsonResponse({**jobs.status(job), 'error': 'This report is out of date; request it again'}, status=410)
+    filename = f"custom_report_{timezone.localtime(job.finished_at).strftime('%Y%m%d_%H%M')}.{job.report_format}"
+    try:
+        artifact = open(job.artifact_path, 'rb')
+    except FileNotFoundError:  # Superseded since the check
+        return JsonResponse({**jobs.status(job), 'error': 'This report is out of date; request it again'}, status=410)
+    return FileResponse(artifact, as_attachment=True, filename=filename)
 
 
 @login_required
@@ -1386,16 +1199,9 @@ def subject_create(request):
         advisor_batches = Batch.objects.all().order_by('dept__dept_name', 'batch_year')
         advisor_departments = Department.objects.all().order_by('dept_name')
     elif advisor:
-        # Get batches based on advisor's assigned students
-        student_batches = Student.objects.filter(
-            section__in=advisor.assigned_sections.all()
-        ).values_list('batch', flat=True).distinct()
-        
-        advisor_batches = Batch.objects.filter(batch_id__in=student_batches).order_by('dept__dept_name', 'batch_year')
-        
-        # Get departments from these batches
-        dept_ids = advisor_batches.values_list('dept', flat=True).distinct()
-        advisor_departments = Department.objects.filter(dept_id__in=dept_ids).order_by('dept_name')
+        # Batches and departments of the advisor's assigned sections
+        advisor_batches = Batch.objects.filter(batch_id__in=advisor.scope.batch_ids).order_by('dept__dept_name', 'batch_year')
+        advisor_departments = Department.objects.filter(dept_id__in=advisor.scope.dept_ids).order_by('dept_name')
     else:
         # For staff users without advisor profile, allow access to all
         advisor_batches = Batch.objects.all().order_by('dept__dept_name', 'batch_year')
@@ -1422,7 +1228,7 @@ def subject_create(request):
                     
                     # Verify advisor has permission for this batch
                     if not advisor or not advisor.can_view_all_attendance:
-                        if batch not in advisor_batches:
+                        if advisor and not advisor.scope.has_batch(batch):
                             messages.error(request, "You don't have permission to create subjects for this batch.")
                             return render(request, 'advisor_dashboard/subject_create.html', {
                                 'departments': advisor_departments,
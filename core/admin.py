@@ -210,9 +210,9 @@ class TimetableAdmin(admin.ModelAdmin):
 @admin.register(Attendance)
 class AttendanceAdmin(admin.ModelAdmin):
     list_display = ['student', 'timetable', 'is_present', 'created_at']
-    list_filter = ['is_present', 'timetable__date', 'timetable__subject']
+    list_filter = ['is_present', 'date', 'timetable__subject']
     search_fields = ['student__name', 'student__student_regno']
-    ordering = ['-timetable__date', 'student__name']
+    ordering = ['-date', 'student__name']
 
 
 @admin.register(Admin)
@@ -3,6 +3,8 @@ from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.views import View
+from django.utils import timezone
+from core import rosters, timeblocks
 from core.models import Department, Batch, Subject, TimeBlock, Student, Section
 from datetime import datetime, time
 import json
@@ -137,29 +139,19 @@ class AttendanceFormAPIView(View):
             if not batch_exists:
                 return JsonResponse({'error': 'Batch not found'}, status=404)
             
-            current_time = datetime.now().time()
+            current_time = timezone.localtime().time()
             
-            # Get time blocks for this specific batch year, or fall back to general time blocks (batch_year=0)
-            time_blocks = TimeBlock.objects.filter(
-                batch_year__in=[int(batch_year), 0]
-            ).order_by('-batch_year', 'block_number')  # Prefer specific batch over general
-            
-            if not time_blocks.exists():
+            # Blocks for this batch year, with general time blocks (batch_year=0) filling the gaps
+            index = timeblocks.get_index()
+            if not index.blocks(batch_year):
                 return JsonResponse({
                     'current_time_slot': None,
                     'current_time': current_time.strftime('%H:%M'),
                     'message': f'No time blocks configured for batch {batch_year}'
                 })
             
-            current_block = None
-            next_block = None
-            
-            for block in time_blocks:
-                if block.start_time <= current_time <= block.end_time:
-                    current_block = block
-                    break
-                elif current_time < block.start_time and next_block is None:
-                    next_block = block
+            current_block = index.current(batch_year, current_time)
+            next_block = index.next(batch_year, current_time)
             
             if current_block:
                 return JsonResponse({
@@ -207,47 +199,35 @@ class AttendanceFormAPIView(View):
             if not departments:
                 return JsonResponse({'error': 'At least one department is required'}, status=400)
             
-            # Get students from the specified departments, batch year, and sections
-            students_query = Student.objects.select_related('department', 'batch', 'section')
-            
-            # Filter by departments
-            students_query = students_query.filter(
-                department__dept_name__in=departments
-            )
-            
-            # Filter by batch year
-            students_query = students_query.filter(
-                batch__batch_year=int(batch_year)
-            )
+            batch_year = int(batch_year)
+            display_year = Batch(batch_year=batch_year).display_year
             
             # Filter by sections if specified
+            section_names = []
             if sections and sections != ['A']:  # Default to all sections if only 'A' is specified
                 # Handle both "A" format and "DeptName-A" format
-                section_names = []
                 for section in sections:
                     if '-' in section:
                         section_names.append(section.split('-')[-1])
                     else:
                         section_names.append(section)
-                
-                students_query = students_query.filter(
-                    section__section_name__in=section_names
-                )
-            
-            students = students_query.order_by('section__section_name', 'student_regno')
             
+            # Cached rosters of (regno, name, section_id) per department
             students_list = []
-            for student in students:
-                students_list.append({
-                    'id': student.student_regno,
-                    'student_id': student.student_regno,
-                    'name': student.name,
-                    'register_number': student.student_regno,
-                    'department': student.department.dept_name,
-                    'section': student.section.section_name,
-                    'batch_year': student.batch.batch_year,
-                    'display_year': student.batch.display_year
-                })
+            for dept_name in dict.fromkeys(departments):
+                section_lookup = rosters.section_names(dept_name, batch_year)
+                for regno, name, section_id in rosters.get_rosters(dept_name, batch_year, section_names):
+                    students_list.append({
+                        'id': regno,
+                        'student_id': regno,
+                        'name': name,
+                        'register_number': regno,
+                        'department': dept_name,
+                        'section': section_lookup.get(section_id, ''),
+                        'batch_year': batch_year,
+                        'display_year': display_year
+                    })
+            students_list.sort(key=lambda student: (student['section'], student['register_number']))
             
             return JsonResponse({
                 'students': students_list,
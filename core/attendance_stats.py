@@ -0,0 +1,116 @@
+"""
+Materialized attendance percentages per student, per subject and overall.
+
+StudentAttendanceStats holds each student's running present/total in every subject
+(and overall, subject null), so an eligibility check is one indexed lookup instead
+of an aggregate over their whole history. core.rollups.refresh() recomputes the
+stats of the students it touched inside the same transaction as their rollups; the
+stats are derived from the rollups, so rebuild() after rebuilding those.
+"""
+import logging
+from typing import Iterable, List
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+
+
+def percentage(present, total) -> float:
+    return present * 100.0 / total if total else 0.0
+
+
+def compute(student_ids) -> List:
+    """Unsaved stats rows of the given students, computed from their rollups"""
+    from core.models import StudentAttendanceRollup, StudentAttendanceStats
+
+    rows, overall = [], {}
+    for row in (StudentAttendanceRollup.objects.filter(student_id__in=student_ids)
+                .values('student_id', 'subject_id')
+                .annotate(present_sum=Sum('present'), total_sum=Sum('total'))
+                .order_by('student_id', 'subject_id')):
+        rows.append(StudentAttendanceStats(
+            student_id=row['student_id'], subject_id=row['subject_id'], subject_key=row['subject_id'],
+            present=row['present_sum'],
+            total=row['total_sum'], percentage=percentage(row['present_sum'], row['total_sum']),
+        ))
+        totals = overall.setdefault(row['student_id'], [0, 0])
+        totals[0] += row['present_sum']
+        totals[1] += row['total_sum']
+    rows.extend(
+        StudentAttendanceStats(student_id=student_id, subject_id=None, subject_key=0, present=present,
+                               total=total, percentage=percentage(present, total))
+        for student_id, (present, total) in overall.items()
+    )
+    return rows
+
+
+def refresh(student_ids: Iterable) -> int:
+    """Recompute the stats of the given students; returns rows written"""
+    from core.models import Student, StudentAttendanceStats
+
+    student_ids = sorted(set(student_ids))
+    written = 0
+    with transaction.atomic():
+        for start in range(0, len(student_ids), CHUNK_SIZE):
+            chunk = student_ids[start:start + CHUNK_SIZE]
+            # Concurrent refreshes of the same students take turns (locks in pk order, so no deadlocks)
+            list(Student.objects.select_for_update().filter(pk__in=chunk).order_by('pk').values_list('pk', flat=True))
+            StudentAttendanceStats.objects.filter(student_id__in=chunk).delete()
+            written += len(StudentAttendanceStats.objects.bulk_create(compute(chunk)))
+    return written
+
+
+def _students_with_rollups():
+    from core.models import StudentAttendanceRollup
+
+    return list(StudentAttendanceRollup.objects.order_by().values_list('student_id', flat=True).distinct())
+
+
+def rebuild() -> int:
+    """Drop and recompute every student's stats from the rollups"""
+    from core.models import StudentAttendanceStats
+
+    with transaction.atomic():
+        StudentAttendanceStats.objects.all().delete()
+        written = refresh(_students_with_rollups())
+    logger.info(f"📊 Rebuilt {written} student attendance stats rows")
+    return written
+
+
+def verify() -> List:
+    """Register numbers of students whose stored stats differ from their rollups"""
+    from core.models import StudentAttendanceStats
+
+    student_ids = set(_students_with_rollups())
+    student_ids |= set(StudentAttendanceStats.objects.order_by().values_list('student_id', flat=True).distinct())
+    student_ids = sorted(student_ids)
+    mismatched = []
+    for start in range(0, len(student_ids), CHUNK_SIZE):
+        chunk = student_ids[start:start + CHUNK_SIZE]
+        expected = {(row.student_id, row.subject_id): (row.present, row.total) for row in compute(chunk)}
+        stored = {
+            (student_id, subject_id): (present, total)
+            for student_id, subject_id, present, total in StudentAttendanceStats.objects.filter(
+                student_id__in=chunk
+            ).values_list('student_id', 'subject_id', 'present', 'total')
+        }
+        mismatched.extend(sorted({key[0] for key in expected.keys() | stored.keys()
+                                  if expected.get(key) != stored.get(key)}))
+    return mismatched
+
+
+def below_threshold(threshold=None, subject_id=None, students=None):
+    """Stats rows under a percentage (ATTENDANCE_ELIGIBILITY_THRESHOLD by default), lowest first"""
+    from core.models import StudentAttendanceStats
+
+    if threshold is None:
+        threshold = getattr(settings, 'ATTENDANCE_ELIGIBILITY_THRESHOLD', 75.0)
+    stats = StudentAttendanceStats.objects.filter(percentage__lt=threshold)
+    stats = stats.filter(subject_id=subject_id) if subject_id else stats.filter(subject__isnull=True)
+    if students is not None:
+        stats = stats.filter(student__in=students)
+    return stats.select_related('student', 'subject').order_by('percentage', 'student_id')
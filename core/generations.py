@@ -0,0 +1,53 @@
+"""
+Generation counters kept in Django's (shared) cache.
+
+Cached data that depends on some rows stores the generation of those rows with it
+(or puts it in its key); writers bump the generation, so stale entries are never
+read again and simply expire. A generation is a clock reading rather than a count:
+bumping writes a new reading instead of incrementing, which stays correct on cache
+backends whose incr() is a read-modify-write (file, database), and an evicted
+counter never revives old entries.
+"""
+import time
+from typing import Dict, Iterable
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def get(key: str) -> int:
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, time.time_ns(), None)
+        value = cache.get(key, 0)
+    return value
+
+
+def get_many(keys: Iterable[str]) -> Dict[str, int]:
+    keys = list(keys)
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            values[key] = get(key)
+    return values
+
+
+def bump(*keys: str):
+    if keys:
+        now = time.time_ns()
+        current = cache.get_many(keys)
+        # Past the current value even if the clock has not moved on since it was written
+        cache.set_many({key: max(now, current.get(key, 0) + 1) for key in keys}, None)
+
+
+def section_attendance_key(section_id) -> str:
+    """Generation of a section's attendance, timetable and students (bumped by core.rollups/core.signals)"""
+    return f'attendance:gen:section:{int(section_id)}'
+
+
+def bump_sections(section_ids: Iterable):
+    """Bump the attendance generation of sections once the current transaction commits"""
+    keys = {section_attendance_key(section_id) for section_id in section_ids if section_id is not None}
+    if keys:
+        # After commit, or a reader could cache pre-commit data under the new generation
+        transaction.on_commit(lambda: bump(*keys))
@@ -0,0 +1,35 @@
+"""
+Student Attendance Stats Management Command
+Verifies the materialized per student attendance percentages against the rollups, or rebuilds them
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import attendance_stats
+
+
+class Command(BaseCommand):
+    help = 'Check StudentAttendanceStats against the attendance rollups (--rebuild recomputes every row)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Drop and recompute every student\'s stats')
+
+    def handle(self, *args, **options):
+        start = datetime.now()
+        if options['rebuild']:
+            self.stdout.write("📊 Rebuilding student attendance stats...")
+            written = attendance_stats.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Wrote {written} stats rows in {(datetime.now() - start).total_seconds():.1f}s"
+            ))
+            return
+
+        self.stdout.write("🔍 Verifying student attendance stats...")
+        mismatched = attendance_stats.verify()
+        if mismatched:
+            shown = ', '.join(mismatched[:20]) + (' ...' if len(mismatched) > 20 else '')
+            raise CommandError(f"{len(mismatched)} students have stale stats ({shown}); run with --rebuild")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Student attendance stats match the rollups ({(datetime.now() - start).total_seconds():.1f}s)"
+        ))
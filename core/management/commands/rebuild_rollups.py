@@ -0,0 +1,31 @@
+"""
+Attendance Rollup Rebuild Management Command
+Backfills or rebuilds the per student and per section daily attendance rollups from Attendance
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the attendance rollup tables used by the reports (all dates, or a date range) and the student stats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='First date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last date to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        try:
+            date_from = datetime.strptime(options['date_from'], '%Y-%m-%d').date() if options['date_from'] else None
+            date_to = datetime.strptime(options['date_to'], '%Y-%m-%d').date() if options['date_to'] else None
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        self.stdout.write(f"📊 Rebuilding attendance rollups ({date_from or 'start'} to {date_to or 'end'})...")
+        start = datetime.now()
+        written = rollups.rebuild(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Wrote {written} rollup rows in {(datetime.now() - start).total_seconds():.1f}s"
+        ))
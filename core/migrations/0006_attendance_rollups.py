@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_subject_created_by'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SectionAttendanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('section', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.section')),
+            ],
+            options={
+                'db_table': 'AttendanceSectionRollups',
+                'unique_together': {('section', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentAttendanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('section', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.section')),
+                ('student', models.ForeignKey(db_column='student_regno', on_delete=django.db.models.deletion.CASCADE, to='core.student')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.subject')),
+            ],
+            options={
+                'db_table': 'AttendanceStudentRollups',
+                'indexes': [models.Index(fields=['date', 'student'], name='rollup_student_date_idx'), models.Index(fields=['subject', 'section', 'date'], name='rollup_subject_day_idx')],
+                'unique_together': {('student', 'subject', 'section', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_attendance_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentAttendanceStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject_key', models.PositiveIntegerField(default=0, editable=False)),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('percentage', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.ForeignKey(db_column='student_regno', on_delete=django.db.models.deletion.CASCADE, related_name='attendance_stats', to='core.student')),
+                ('subject', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.subject')),
+            ],
+            options={
+                'db_table': 'StudentAttendanceStats',
+                'indexes': [models.Index(fields=['subject', 'percentage'], name='stats_subject_percentage_idx')],
+                'constraints': [models.UniqueConstraint(fields=('student', 'subject_key'), name='stats_student_subject_key_uniq')],
+            },
+        ),
+    ]
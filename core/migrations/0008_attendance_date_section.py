@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_date_section(apps, schema_editor):
+    """Copy each attendance row's timetable date and section, a primary key range at a time"""
+    Attendance = apps.get_model('core', 'Attendance')
+    Timetable = apps.get_model('core', 'Timetable')
+    timetable = Timetable.objects.filter(pk=OuterRef('timetable_id'))
+    last_pk = Attendance.objects.aggregate(last=models.Max('pk'))['last'] or 0
+    for start in range(0, last_pk + 1, 10000):
+        Attendance.objects.filter(pk__gte=start, pk__lt=start + 10000).update(
+            date=Subquery(timetable.values('date')[:1]),
+            section_id=Subquery(timetable.values('section_id')[:1]),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_student_attendance_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='section',
+            field=models.ForeignKey(db_column='section_id', db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.section'),
+        ),
+        migrations.RunPython(backfill_date_section, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='attendance',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.AlterField(
+            model_name='attendance',
+            name='section',
+            field=models.ForeignKey(db_column='section_id', db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.section'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['section', 'date'], name='attendance_section_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['student', 'date'], name='attendance_student_date_idx'),
+        ),
+    ]
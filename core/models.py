@@ -259,18 +259,115 @@ class Attendance(TimestampedModel):
         db_column='timetable_id'
     )
     is_present = models.BooleanField(default=False)
+    # Copies of timetable.date/section (kept in step by core.signals) so reports filter without the join
+    date = models.DateField()
+    section = models.ForeignKey(
+        Section,
+        on_delete=models.CASCADE,
+        db_column='section_id',
+        db_index=False,  # Covered by attendance_section_date_idx
+        related_name='+'
+    )
     
     class Meta:
         db_table = 'Attendance'
         verbose_name = 'Attendance Record'
         verbose_name_plural = 'Attendance Records'
         unique_together = ['student', 'timetable']
+        indexes = [
+            models.Index(fields=['section', 'date'], name='attendance_section_date_idx'),
+            models.Index(fields=['student', 'date'], name='attendance_student_date_idx'),
+        ]
     
     def __str__(self):
         status = "Present" if self.is_present else "Absent"
         return f"{self.student.name} - {status} ({self.timetable.date})"
 
 
+class StudentAttendanceRollup(models.Model):
+    """
+    Present/total attendance of one student in one subject and section on one day.
+    Maintained from Attendance by core.rollups; rebuild with `manage.py rebuild_rollups`.
+    """
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        db_column='student_regno'
+    )
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
+    section = models.ForeignKey(Section, on_delete=models.CASCADE)
+    date = models.DateField()
+    present = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'AttendanceStudentRollups'
+        unique_together = ['student', 'subject', 'section', 'date']
+        indexes = [
+            models.Index(fields=['date', 'student'], name='rollup_student_date_idx'),
+            models.Index(fields=['subject', 'section', 'date'], name='rollup_subject_day_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.student_id} {self.subject_id} {self.date}: {self.present}/{self.total}"
+
+
+class SectionAttendanceRollup(models.Model):
+    """
+    Present/total attendance of one section on one day (all subjects).
+    Maintained from Attendance by core.rollups.
+    """
+    section = models.ForeignKey(Section, on_delete=models.CASCADE)
+    date = models.DateField()
+    present = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'AttendanceSectionRollups'
+        unique_together = ['section', 'date']
+    
+    def __str__(self):
+        return f"{self.section_id} {self.date}: {self.present}/{self.total}"
+
+
+class StudentAttendanceStats(models.Model):
+    """
+    A student's running present/total attendance in one subject, or overall when subject is null.
+    Maintained with the rollups by core.attendance_stats; check or rebuild with `manage.py attendance_stats`.
+    """
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        db_column='student_regno',
+        related_name='attendance_stats'
+    )
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, null=True, blank=True)
+    # The subject id, or 0 for the overall row: MySQL has no partial unique indexes and lets
+    # (student, NULL) repeat, so uniqueness is enforced on this non-null copy instead
+    subject_key = models.PositiveIntegerField(default=0, editable=False)
+    present = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    percentage = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'StudentAttendanceStats'
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'subject_key'], name='stats_student_subject_key_uniq'),
+        ]
+        indexes = [
+            # Eligibility lookups: WHERE subject_id = ? (or IS NULL) AND percentage < ?
+            models.Index(fields=['subject', 'percentage'], name='stats_subject_percentage_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.subject_key = self.subject_id or 0
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.student_id} {self.subject_id or 'overall'}: {self.present}/{self.total}"
+
+
 class Admin(TimestampedModel):
     """
     Model representing system administrators
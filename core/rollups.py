@@ -0,0 +1,142 @@
+"""
+Attendance rollups: present/total counts per student per subject per day and per section per day.
+
+Reports read these instead of scanning Attendance joined to Timetable. A rollup is
+identified by the class day it summarises, a (subject_id, section_id, date) key;
+refresh() recomputes the rollups of the given keys from Attendance, so it is
+idempotent and safe to call after any change; it also refreshes the students'
+running percentages (core.attendance_stats). Attendance/Timetable signals
+(core.signals) schedule the affected keys and refresh them once the transaction
+commits; bulk writers that bypass signals call refresh() themselves.
+"""
+import logging
+import threading
+from functools import reduce
+from operator import or_
+from typing import Iterable, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+from core import attendance_stats, generations
+
+logger = logging.getLogger(__name__)
+
+RollupKey = Tuple[int, int, object]  # (subject_id, section_id, date)
+
+_pending = threading.local()
+
+
+def _any(conditions) -> Q:
+    return reduce(or_, conditions, Q(pk__in=[]))
+
+
+def refresh(keys: Iterable[RollupKey], stats: bool = True) -> int:
+    """Recompute the student and section rollups of the given class days (and, unless stats is False,
+    the running attendance stats of their students); returns rollup rows written"""
+    from core.models import Attendance, SectionAttendanceRollup, StudentAttendanceRollup
+
+    keys = set(keys)
+    if not keys:
+        return 0
+    section_days = {(section_id, day) for _subject_id, section_id, day in keys}
+    counts = dict(total=Count('pk'), present=Count('pk', filter=Q(is_present=True)))
+
+    with transaction.atomic():
+        previous_rollups = StudentAttendanceRollup.objects.filter(_any(
+            Q(subject_id=subject_id, section_id=section_id, date=day) for subject_id, section_id, day in keys
+        ))
+        # Students who lose a rollup here need their running stats recomputed too
+        student_ids = set(previous_rollups.values_list('student_id', flat=True)) if stats else set()
+        previous_rollups.delete()
+        student_rows = [
+            StudentAttendanceRollup(
+                student_id=row['student_id'], subject_id=row['timetable__subject_id'],
+                section_id=row['section_id'], date=row['date'],
+                present=row['present'], total=row['total'],
+            )
+            for row in Attendance.objects.filter(_any(
+                Q(timetable__subject_id=subject_id, section_id=section_id, date=day)
+                for subject_id, section_id, day in keys
+            )).values('student_id', 'timetable__subject_id', 'section_id', 'date')
+            .annotate(**counts).order_by()
+        ]
+        StudentAttendanceRollup.objects.bulk_create(student_rows)
+        if stats:
+            student_ids.update(row.student_id for row in student_rows)
+            attendance_stats.refresh(student_ids)
+
+        SectionAttendanceRollup.objects.filter(_any(
+            Q(section_id=section_id, date=day) for section_id, day in section_days
+        )).delete()
+        section_rows = [
+            SectionAttendanceRollup(
+                section_id=row['section_id'], date=row['date'],
+                present=row['present'], total=row['total'],
+            )
+            for row in Attendance.objects.filter(_any(
+                Q(section_id=section_id, date=day) for section_id, day in section_days
+            )).values('section_id', 'date').annotate(**counts).order_by()
+        ]
+        SectionAttendanceRollup.objects.bulk_create(section_rows)
+        generations.bump_sections(section_id for section_id, _day in section_days)
+    return len(student_rows) + len(section_rows)
+
+
+def schedule(key: RollupKey = None, timetable_id=None):
+    """Refresh a class day (or a timetable's class day) when the current transaction commits"""
+    if not hasattr(_pending, 'keys'):
+        _pending.keys, _pending.timetable_ids = set(), set()
+    if key is not None:
+        _pending.keys.add(key)
+    if timetable_id is not None:
+        _pending.timetable_ids.add(timetable_id)
+    # Every call registers a flush; whichever runs first drains the pending set
+    transaction.on_commit(flush)
+
+
+def flush():
+    from core.models import Timetable
+
+    keys: Set[RollupKey] = getattr(_pending, 'keys', set())
+    timetable_ids = getattr(_pending, 'timetable_ids', set())
+    if not keys and not timetable_ids:
+        return
+    _pending.keys, _pending.timetable_ids = set(), set()
+    if timetable_ids:
+        keys |= set(Timetable.objects.filter(pk__in=timetable_ids).values_list('subject_id', 'section_id', 'date'))
+    refresh(keys)
+
+
+def rebuild(date_from=None, date_to=None) -> int:
+    """Drop and recompute every rollup in a date range (all dates when open), one day at a time"""
+    from core.models import SectionAttendanceRollup, StudentAttendanceRollup, Timetable
+
+    timetables = Timetable.objects.all()
+    student_rollups = StudentAttendanceRollup.objects.all()
+    section_rollups = SectionAttendanceRollup.objects.all()
+    if date_from:
+        timetables = timetables.filter(date__gte=date_from)
+        student_rollups = student_rollups.filter(date__gte=date_from)
+        section_rollups = section_rollups.filter(date__gte=date_from)
+    if date_to:
+        timetables = timetables.filter(date__lte=date_to)
+        student_rollups = student_rollups.filter(date__lte=date_to)
+        section_rollups = section_rollups.filter(date__lte=date_to)
+
+    student_rollups.delete()
+    section_rollups.delete()
+    written = 0
+    for day in timetables.order_by('date').values_list('date', flat=True).distinct():
+        keys = set(timetables.filter(date=day).values_list('subject_id', 'section_id', 'date'))
+        written += refresh(keys, stats=False)
+        logger.debug(f"📊 Rebuilt attendance rollups for {day}")
+    attendance_stats.rebuild()
+    return written
+
+
+def totals(queryset) -> Tuple[int, int]:
+    """(present, total) summed over a rollup queryset"""
+    sums = queryset.aggregate(present_sum=Coalesce(Sum('present'), 0), total_sum=Coalesce(Sum('total'), 0))
+    return sums['present_sum'], sums['total_sum']
@@ -0,0 +1,95 @@
+"""
+Section rosters cached in Django's cache.
+
+A roster is the list of (regno, name, section_id) tuples of one section, or of a
+whole department/batch. Each department/batch has a generation counter that is
+part of every roster key; Student and Section signals (core.signals) bump it, so
+stale rosters are simply never read again and expire on their own.
+"""
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import generations
+
+logger = logging.getLogger(__name__)
+
+RosterEntry = Tuple[str, str, int]  # (student_regno, name, section_id)
+
+_EPOCH_KEY = 'roster:epoch'
+
+
+def _timeout() -> int:
+    return int(getattr(settings, 'ROSTER_CACHE_TIMEOUT', 3600))
+
+
+def _generation(dept_name: str, batch_year) -> str:
+    return f"{generations.get(_EPOCH_KEY)}.{generations.get(f'roster:gen:{dept_name}:{int(batch_year)}')}"
+
+
+def invalidate(dept_name: Optional[str] = None, batch_year=None):
+    """Drop the cached rosters of a department/batch, or of everything when either is unknown"""
+    if dept_name is None or batch_year is None:
+        generations.bump(_EPOCH_KEY)
+        logger.debug("🔄 Invalidated all cached rosters")
+    else:
+        generations.bump(f'roster:gen:{dept_name}:{int(batch_year)}')
+        logger.debug(f"🔄 Invalidated cached rosters for {dept_name} {batch_year}")
+
+
+def _roster_key(dept_name: str, batch_year, section_name: Optional[str]) -> str:
+    return f"roster:{_generation(dept_name, batch_year)}:{dept_name}:{int(batch_year)}:{section_name or '*'}"
+
+
+def cached_roster(dept_name: str, batch_year, section_name: Optional[str] = None) -> Optional[List[RosterEntry]]:
+    """The roster if it is cached, else None (never queries the database)"""
+    return cache.get(_roster_key(dept_name, batch_year, section_name))
+
+
+def get_roster(dept_name: str, batch_year, section_name: Optional[str] = None) -> List[RosterEntry]:
+    """(regno, name, section_id) of the students of a section, or of the whole department/batch"""
+    from core.models import Student
+
+    key = _roster_key(dept_name, batch_year, section_name)
+    roster = cache.get(key)
+    if roster is None:
+        students = Student.objects.filter(
+            section__batch__batch_year=batch_year,
+            section__batch__dept__dept_name=dept_name,
+        )
+        if section_name:
+            students = students.filter(section__section_name=section_name)
+        roster = [tuple(row) for row in students.order_by('student_regno').values_list('student_regno', 'name', 'section_id')]
+        cache.set(key, roster, _timeout())
+    return roster
+
+
+def get_rosters(dept_name: str, batch_year, section_names: Iterable[str] = ()) -> List[RosterEntry]:
+    """Combined roster of several sections; all sections when none are given"""
+    section_names = [name for name in section_names if name]
+    if not section_names:
+        return get_roster(dept_name, batch_year)
+    seen = set()
+    roster = []
+    for section_name in section_names:
+        for entry in get_roster(dept_name, batch_year, section_name):
+            if entry[0] not in seen:
+                seen.add(entry[0])
+                roster.append(entry)
+    return roster
+
+
+def section_names(dept_name: str, batch_year) -> Dict[int, str]:
+    """{section_id: section_name} for a department/batch"""
+    from core.models import Section
+
+    key = f"roster:{_generation(dept_name, batch_year)}:{dept_name}:{int(batch_year)}:sections"
+    names = cache.get(key)
+    if names is None:
+        names = dict(Section.objects.filter(
+            batch__batch_year=batch_year, batch__dept__dept_name=dept_name,
+        ).values_list('section_id', 'section_name'))
+        cache.set(key, names, _timeout())
+    return names
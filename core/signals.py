@@ -0,0 +1,103 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core import generations, rollups, rosters, timeblocks
+from core.models import Attendance, Batch, Section, Student, TimeBlock, Timetable
+
+
+def _section_batch(section_id):
+    return Section.objects.filter(pk=section_id).values_list('batch__dept__dept_name', 'batch__batch_year').first()
+
+
+def _invalidate_section_batch(section_id):
+    batch = _section_batch(section_id) if section_id is not None else None
+    if batch is None:
+        rosters.invalidate()  # Section already gone (cascade delete)
+    else:
+        rosters.invalidate(*batch)
+
+
+@receiver(pre_save, sender=Student)
+def remember_student_section(sender, instance, raw=False, **kwargs):
+    """Remember the section a student is moving out of, so its roster is invalidated too"""
+    if raw:
+        return
+    instance._roster_previous_section_id = (
+        Student.objects.filter(pk=instance.pk).values_list('section_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_student_rosters(sender, instance, **kwargs):
+    _invalidate_section_batch(instance.section_id)
+    previous = getattr(instance, '_roster_previous_section_id', None)
+    if previous is not None and previous != instance.section_id:
+        _invalidate_section_batch(previous)
+    generations.bump_sections([instance.section_id, previous])
+
+
+@receiver(post_save, sender=Section)
+@receiver(post_delete, sender=Section)
+def invalidate_section_rosters(sender, instance, **kwargs):
+    generations.bump_sections([instance.section_id])
+    batch = Batch.objects.filter(pk=instance.batch_id).values_list('dept__dept_name', 'batch_year').first()
+    if batch is None:
+        rosters.invalidate()
+    else:
+        rosters.invalidate(*batch)
+
+
+@receiver(post_save, sender=TimeBlock)
+@receiver(post_delete, sender=TimeBlock)
+def invalidate_time_block_index(sender, **kwargs):
+    timeblocks.invalidate()
+
+
+@receiver(pre_save, sender=Attendance)
+def copy_timetable_day_to_attendance(sender, instance, raw=False, **kwargs):
+    """Attendance carries its timetable's date and section so reports can filter it without the join"""
+    if raw and instance.date is not None:
+        return
+    timetable = instance.timetable
+    instance.date = timetable.date
+    instance.section_id = timetable.section_id
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def refresh_attendance_rollups(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rollups.schedule(timetable_id=instance.timetable_id)
+
+
+@receiver(pre_save, sender=Timetable)
+def remember_timetable_day(sender, instance, raw=False, **kwargs):
+    """Remember the class day a timetable is moving out of, so its rollups are refreshed too"""
+    if raw or instance.pk is None:
+        return
+    instance._rollup_previous_key = (
+        Timetable.objects.filter(pk=instance.pk).values_list('subject_id', 'section_id', 'date').first()
+    )
+
+
+@receiver(post_save, sender=Timetable)
+def refresh_timetable_rollups(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    generations.bump_sections([instance.section_id])  # Today's classes on the advisor dashboard
+    previous = getattr(instance, '_rollup_previous_key', None)
+    if created or previous is None:
+        return
+    generations.bump_sections([previous[1]])
+    current = (instance.subject_id, instance.section_id, instance.date)
+    if previous != current:
+        Attendance.objects.filter(timetable=instance).update(date=instance.date, section_id=instance.section_id)
+        rollups.schedule(key=previous)
+        rollups.schedule(key=current)
+
+
+@receiver(pre_delete, sender=Timetable)
+def refresh_deleted_timetable_rollups(sender, instance, **kwargs):
+    # Its attendance rows are cascade-deleted; by commit time the timetable can't be looked up
+    rollups.schedule(key=(instance.subject_id, instance.section_id, instance.date))
@@ -1,3 +1,233 @@
+import importlib
+from datetime import date, time
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
 
-# Create your tests here.
+from core import attendance_stats, rollups, rosters, timeblocks
+from core.models import (
+    Attendance, Batch, Department, Section, SectionAttendanceRollup, Student, StudentAttendanceRollup,
+    StudentAttendanceStats, Subject, TimeBlock, Timetable,
+)
+from prediction_backend.models import AttendancePrediction, AttendanceSubmission
+
+
+class RosterCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        dept = Department.objects.create(dept_id=1, dept_name='AIML')
+        self.batch = Batch.objects.create(dept=dept, batch_year=2027)
+        self.section_a = Section.objects.create(batch=self.batch, section_name='A')
+        self.section_b = Section.objects.create(batch=self.batch, section_name='B')
+        self.student = Student.objects.create(
+            student_regno='7101', name='Asha', department=dept, batch=self.batch, section=self.section_a
+        )
+
+    def test_roster_is_cached(self):
+        """A cached roster is served without touching the database"""
+        self.assertEqual(rosters.get_roster('AIML', 2027, 'A'), [('7101', 'Asha', self.section_a.pk)])
+        with self.assertNumQueries(0):
+            self.assertEqual(rosters.get_roster('AIML', 2027, 'A'), [('7101', 'Asha', self.section_a.pk)])
+
+    def test_student_changes_invalidate_rosters(self):
+        """Saving, moving and deleting students invalidates the affected rosters"""
+        rosters.get_roster('AIML', 2027, 'A')
+        rosters.get_roster('AIML', 2027, 'B')
+
+        self.student.name = 'Asha K'
+        self.student.save()
+        self.assertEqual(rosters.get_roster('AIML', 2027, 'A'), [('7101', 'Asha K', self.section_a.pk)])
+
+        self.student.section = self.section_b
+        self.student.save()
+        self.assertEqual(rosters.get_roster('AIML', 2027, 'A'), [])
+        self.assertEqual(rosters.get_roster('AIML', 2027, 'B'), [('7101', 'Asha K', self.section_b.pk)])
+
+        self.student.delete()
+        self.assertEqual(rosters.get_roster('AIML', 2027), [])
+
+    def test_section_changes_invalidate_rosters(self):
+        self.assertEqual(rosters.section_names('AIML', 2027), {self.section_a.pk: 'A', self.section_b.pk: 'B'})
+        rosters.get_roster('AIML', 2027, 'A')
+
+        self.section_a.section_name = 'C'
+        self.section_a.save()
+        self.assertEqual(rosters.get_roster('AIML', 2027, 'A'), [])
+        self.assertEqual(rosters.get_roster('AIML', 2027, 'C'), [('7101', 'Asha', self.section_a.pk)])
+        self.assertEqual(rosters.section_names('AIML', 2027)[self.section_a.pk], 'C')
+
+
+class TimeBlockIndexTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        for number, start, end in ((1, '09:00', '09:50'), (2, '10:00', '10:50'), (3, '11:10', '12:00')):
+            TimeBlock.objects.create(batch_year=0, block_number=number, start_time=start, end_time=end)
+        TimeBlock.objects.create(batch_year=2027, block_number=2, start_time='10:10', end_time='11:00')
+
+    def test_lookup(self):
+        """Batch blocks override general ones; current/next/resolve follow the sorted intervals"""
+        index = timeblocks.get_index()
+        self.assertEqual(index.current(2027, time(10, 5)), None)
+        self.assertEqual(index.current(2026, time(10, 5)).block_number, 2)
+        self.assertEqual(index.current(2027, time(11, 0)).batch_year, 2027)
+        self.assertEqual(index.next(2027, time(11, 5)).block_number, 3)
+        self.assertEqual(index.next(2027, time(12, 30)), None)
+        self.assertEqual(index.resolve(2027, time(12, 30)).block_number, 3)
+        self.assertEqual(index.resolve(2027, time(8, 0)).block_number, 1)
+        self.assertEqual(index.by_number(2027, 2).start_time, time(10, 10))
+
+    def test_index_is_rebuilt_on_change(self):
+        """The index is reused until a TimeBlock is saved or deleted"""
+        timeblocks.get_index()
+        with self.assertNumQueries(0):
+            timeblocks.get_index()
+
+        block = TimeBlock.objects.get(batch_year=2027)
+        block.start_time = time(10, 0)
+        block.save()
+        self.assertEqual(timeblocks.get_index().current(2027, time(10, 5)), block)
+
+        block.delete()
+        self.assertEqual(timeblocks.get_index().current(2027, time(10, 30)).batch_year, 0)
+
+    def test_index_expires_after_ttl(self):
+        """Changes that send no signals are picked up once the index is TIME_BLOCK_INDEX_TTL old"""
+        timeblocks.get_index()
+        TimeBlock.objects.filter(batch_year=2027).update(start_time=time(10, 0))
+        self.assertIsNone(timeblocks.get_index().current(2027, time(10, 5)))
+
+        with mock.patch.object(timeblocks.time, 'monotonic', return_value=timeblocks.time.monotonic() + 301):
+            self.assertEqual(timeblocks.get_index().current(2027, time(10, 5)).batch_year, 2027)
+
+
+class AttendanceRollupTestCase(TestCase):
+    def setUp(self):
+        dept = Department.objects.create(dept_id=1, dept_name='AIML')
+        batch = Batch.objects.create(dept=dept, batch_year=2027)
+        self.section = Section.objects.create(batch=batch, section_name='A')
+        self.subject = Subject.objects.create(subject_code='AI301', subject_name='Deep Learning', batch=batch)
+        self.students = [
+            Student.objects.create(student_regno=f'710{i}', name=f'Student {i}', department=dept, batch=batch,
+                                   section=self.section)
+            for i in range(3)
+        ]
+        self.day = date(2026, 8, 3)
+        self.periods = [
+            Timetable.objects.create(section=self.section, subject=self.subject, date=self.day,
+                                     start_time=start, end_time=end)
+            for start, end in (('09:00', '09:50'), ('10:00', '10:50'))
+        ]
+
+    def _rollups(self):
+        return (
+            sorted(StudentAttendanceRollup.objects.values_list('student_id', 'present', 'total')),
+            list(SectionAttendanceRollup.objects.values_list('date', 'present', 'total')),
+        )
+
+    def test_rollups_follow_attendance_changes(self):
+        """Saving, editing and deleting attendance (and timetables) keeps the rollups in step"""
+        with self.captureOnCommitCallbacks(execute=True):
+            for period in self.periods:
+                for i, student in enumerate(self.students):
+                    Attendance.objects.create(student=student, timetable=period, is_present=i > 0)
+        self.assertEqual(self._rollups(), (
+            [('7100', 0, 2), ('7101', 2, 2), ('7102', 2, 2)], [(self.day, 4, 6)],
+        ))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record = Attendance.objects.get(student=self.students[0], timetable=self.periods[0])
+            record.is_present = True
+            record.save()
+        self.assertEqual(self._rollups()[1], [(self.day, 5, 6)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.periods[1].delete()
+        self.assertEqual(self._rollups(), (
+            [('7100', 1, 1), ('7101', 1, 1), ('7102', 1, 1)], [(self.day, 3, 3)],
+        ))
+
+        incremental = self._rollups()
+        rollups.rebuild()
+        self.assertEqual(self._rollups(), incremental)
+
+    def test_student_stats_follow_rollups(self):
+        """Running percentages per subject and overall stay in step with attendance writes"""
+        with self.captureOnCommitCallbacks(execute=True):
+            for period in self.periods:
+                for i, student in enumerate(self.students):
+                    Attendance.objects.create(student=student, timetable=period, is_present=i > 0 or period is self.periods[0])
+        overall = StudentAttendanceStats.objects.filter(subject__isnull=True)
+        self.assertEqual(sorted(overall.values_list('student_id', 'present', 'total')),
+                         [('7100', 1, 2), ('7101', 2, 2), ('7102', 2, 2)])
+        self.assertEqual(StudentAttendanceStats.objects.filter(subject=self.subject).count(), 3)
+        self.assertEqual([row.student_id for row in attendance_stats.below_threshold(75)], ['7100'])
+        self.assertEqual([row.student_id for row in attendance_stats.below_threshold(75, subject_id=self.subject.pk)], ['7100'])
+        # One overall row per student on every backend (MySQL cannot enforce a partial unique index)
+        self.assertEqual(set(overall.values_list('subject_key', flat=True)), {0})
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            StudentAttendanceStats.objects.create(student=self.students[0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.periods[1].delete()
+        self.assertEqual(list(attendance_stats.below_threshold(75)), [])
+        self.assertEqual(attendance_stats.verify(), [])
+
+        StudentAttendanceStats.objects.filter(student_id='7101').update(present=0)
+        self.assertEqual(attendance_stats.verify(), ['7101'])
+        call_command('attendance_stats', rebuild=True, stdout=StringIO())
+        self.assertEqual(attendance_stats.verify(), [])
+
+    def test_attendance_copies_timetable_day_and_backfill(self):
+        """Attendance carries its timetable's date and section, including after the timetable moves"""
+        with self.captureOnCommitCallbacks(execute=True):
+            record = Attendance.objects.create(student=self.students[0], timetable=self.periods[0], is_present=True)
+        self.assertEqual((record.date, record.section_id), (self.day, self.section.pk))
+
+        moved = date(2026, 8, 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.periods[0].date = moved
+            self.periods[0].save()
+        self.assertEqual(Attendance.objects.get(pk=record.pk).date, moved)
+
+        Attendance.objects.update(date=self.day)
+        migration = importlib.import_module('core.migrations.0008_attendance_date_section')
+        migration.backfill_date_section(django_apps, None)
+        self.assertEqual(Attendance.objects.get(pk=record.pk).date, moved)
+
+    @staticmethod
+    def _mysql_plan_keys(queryset):
+        """The `possible_keys` of MySQL's EXPLAIN: every index the plan could read a table through.
+        The chosen `key` depends on table statistics, and may be a full scan on a test-sized table"""
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return [key for row in rows for key in (row['possible_keys'] or '').split(',') if key]
+
+    @skipUnless(connection.vendor in ('sqlite', 'mysql'), 'Plans checked against SQLite and MySQL EXPLAIN output')
+    def test_report_lookups_use_indexes(self):
+        plans = {
+            'attendance_section_date_idx': Attendance.objects.filter(section=self.section, date__gte=self.day),
+            'attendance_student_date_idx': Attendance.objects.filter(student__in=self.students, date__gte=self.day),
+            'stats_subject_percentage_idx': StudentAttendanceStats.objects.filter(subject__isnull=True, percentage__lt=75),
+        }
+        for index, queryset in plans.items():
+            with self.subTest(index=index):
+                if connection.vendor == 'mysql':
+                    self.assertIn(index, self._mysql_plan_keys(queryset))
+                else:
+                    self.assertIn(index, queryset.explain())
+        # Prediction and submission session lookups use their (session_id, student) unique indexes
+        for model in (AttendancePrediction, AttendanceSubmission):
+            with self.subTest(model=model.__name__):
+                queryset = model.objects.filter(session_id='s1')
+                if connection.vendor == 'mysql':
+                    self.assertTrue(any('session_id' in key for key in self._mysql_plan_keys(queryset)))
+                else:
+                    self.assertIn('USING INDEX', queryset.explain())
@@ -0,0 +1,119 @@
+"""
+In-process index of TimeBlocks for resolving the current/next block of a batch.
+
+Every TimeBlock is loaded once into per-batch-year lists sorted by start time, so
+lookups are a bisect instead of a query. A batch's own blocks override the general
+(batch_year=0) blocks with the same block number. Each process checks a version kept
+in the shared cache (CACHES) before using its index; core.signals bumps it when a
+TimeBlock is saved or deleted, so every worker rebuilds on its next lookup. Writes
+that send no signals (queryset update(), bulk_create, raw SQL) do not bump it, so
+the index is also rebuilt once it is TIME_BLOCK_INDEX_TTL seconds old.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_right
+from datetime import time as datetime_time
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+
+from core import generations
+
+logger = logging.getLogger(__name__)
+
+_VERSION_KEY = 'timeblocks:version'
+
+
+class TimeBlockIndex:
+    """Sorted TimeBlock intervals per batch year (blocks are assumed not to overlap)"""
+
+    def __init__(self, blocks: Iterable = ()):
+        general = {}
+        specific: Dict[int, dict] = {}
+        for block in blocks:
+            if block.batch_year == 0:
+                general[block.block_number] = block
+            else:
+                specific.setdefault(block.batch_year, {})[block.block_number] = block
+        self._general = self._sorted(general)
+        self._by_batch = {
+            batch_year: self._sorted({**general, **own}) for batch_year, own in specific.items()
+        }
+
+    @staticmethod
+    def _sorted(blocks: dict):
+        ordered = sorted(blocks.values(), key=lambda block: (block.start_time, block.block_number))
+        return [block.start_time for block in ordered], ordered
+
+    def _for(self, batch_year):
+        return self._by_batch.get(int(batch_year or 0), self._general)
+
+    def blocks(self, batch_year) -> List:
+        """Blocks that apply to a batch year, in start time order"""
+        return list(self._for(batch_year)[1])
+
+    def by_number(self, batch_year, block_number):
+        for block in self._for(batch_year)[1]:
+            if block.block_number == int(block_number):
+                return block
+        return None
+
+    def current(self, batch_year, at: datetime_time):
+        """The block running at `at` (start and end inclusive), or None"""
+        starts, blocks = self._for(batch_year)
+        i = bisect_right(starts, at) - 1
+        if i >= 0 and at <= blocks[i].end_time:
+            return blocks[i]
+        return None
+
+    def next(self, batch_year, at: datetime_time):
+        """The first block starting after `at`, or None"""
+        starts, blocks = self._for(batch_year)
+        i = bisect_right(starts, at)
+        return blocks[i] if i < len(blocks) else None
+
+    def previous(self, batch_year, at: datetime_time):
+        """The last block that started at or before `at`, or None"""
+        starts, blocks = self._for(batch_year)
+        i = bisect_right(starts, at) - 1
+        return blocks[i] if i >= 0 else None
+
+    def resolve(self, batch_year, at: datetime_time):
+        """Block an attendance taken at `at` belongs to: the running block, else the one
+        that just ended, else the first upcoming one"""
+        return self.current(batch_year, at) or self.previous(batch_year, at) or self.next(batch_year, at)
+
+
+_index: Optional[TimeBlockIndex] = None
+_index_version = None
+_index_built_at = 0.0
+_lock = threading.Lock()
+
+
+def _is_current(version) -> bool:
+    ttl = getattr(settings, 'TIME_BLOCK_INDEX_TTL', 300)
+    return (_index is not None and _index_version == version
+            and (not ttl or time.monotonic() - _index_built_at < ttl))
+
+
+def get_index() -> TimeBlockIndex:
+    """The TimeBlockIndex of this process, rebuilt if any TimeBlock changed or it has expired"""
+    global _index, _index_version, _index_built_at
+    version = generations.get(_VERSION_KEY)
+    index = _index
+    if _is_current(version):
+        return index
+    from core.models import TimeBlock
+
+    with _lock:
+        if not _is_current(version):
+            _index = TimeBlockIndex(TimeBlock.objects.all())
+            _index_version = version
+            _index_built_at = time.monotonic()
+            logger.debug("🕒 Rebuilt time block index")
+        return _index
+
+
+def invalidate():
+    generations.bump(_VERSION_KEY)
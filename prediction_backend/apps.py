@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class PredictionBackendConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'prediction_backend'
+
+    def ready(self):
+        # Warm galleries/rosters ahead of each time block (PREDICTION_PREFETCH_ENABLED)
+        from .prefetch import should_start_scheduler, start_scheduler
+        if should_start_scheduler():
+            start_scheduler()
+
+        # Sweep temp directories and expired prediction rows (PREDICTION_JANITOR_ENABLED); each worker
+        # starts a thread, and a file lock lets one of them do each sweep
+        if should_start_scheduler(setting='PREDICTION_JANITOR_ENABLED'):
+            from . import janitor
+            janitor.start_scheduler()
@@ -0,0 +1,210 @@
+import base64
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from typing import Iterable, Iterator, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def decode_base64_image(image_data: Union[str, bytes]) -> bytes:
+    """Encoded image bytes from a base64 string (data URLs allowed) or raw bytes"""
+    if isinstance(image_data, bytes):
+        return image_data
+    if image_data.startswith("data:image"):
+        image_data = image_data.split(",")[1]
+    return base64.b64decode(image_data)
+
+
+@dataclass
+class DecodedImage:
+    """A decoded BGR image and its grayscale copy, possibly backed by shared memory.
+
+    `digest` is the SHA-256 of the encoded bytes (used by the recognition result
+    cache). Call release() once the arrays are no longer needed.
+    """
+    index: int
+    image: Optional[np.ndarray]
+    gray: Optional[np.ndarray]
+    digest: str = ""
+    encoded_size: int = 0
+    error: Optional[str] = None
+    _shm: Optional[shared_memory.SharedMemory] = field(default=None, repr=False)
+
+    def release(self):
+        self.image = self.gray = None
+        if self._shm is not None:
+            try:
+                self._shm.close()
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+            self._shm = None
+
+
+def _decode(image_data) -> Tuple[bytes, str, Optional[np.ndarray], Optional[np.ndarray]]:
+    image_bytes = decode_base64_image(image_data)
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img is not None else None
+    return image_bytes, digest, img, gray
+
+
+def _decode_into_shared_memory(image_data):
+    """Worker: decode one image and place the BGR and gray planes in a new shared memory block.
+
+    Only the block name and shapes travel back through the pool's pipe; the parent
+    maps the pixels directly and unlinks the block when it is done.
+    """
+    cv2.setNumThreads(1)
+    try:
+        image_bytes, digest, img, gray = _decode(image_data)
+    except Exception as e:
+        return None, None, "", 0, f"{type(e).__name__}: {e}"
+    if img is None:
+        return None, None, digest, len(image_bytes), "Could not decode image"
+    shm = shared_memory.SharedMemory(create=True, size=img.nbytes + gray.nbytes)
+    try:
+        np.ndarray(img.shape, np.uint8, buffer=shm.buf)[:] = img
+        np.ndarray(gray.shape, np.uint8, buffer=shm.buf, offset=img.nbytes)[:] = gray
+        return shm.name, (img.shape, gray.shape), digest, len(image_bytes), None
+    finally:
+        shm.close()
+
+
+def _attach(index, name, shapes, digest, encoded_size, error) -> DecodedImage:
+    if error is not None:
+        return DecodedImage(index, None, None, digest, encoded_size, error)
+    shm = shared_memory.SharedMemory(name=name)
+    image_shape, gray_shape = shapes
+    image = np.ndarray(image_shape, np.uint8, buffer=shm.buf)
+    gray = np.ndarray(gray_shape, np.uint8, buffer=shm.buf, offset=int(np.prod(image_shape)))
+    return DecodedImage(index, image, gray, digest, encoded_size, None, shm)
+
+
+def decode_inline(index: int, image_data) -> DecodedImage:
+    try:
+        image_bytes, digest, img, gray = _decode(image_data)
+    except Exception as e:
+        return DecodedImage(index, None, None, error=f"{type(e).__name__}: {e}")
+    if img is None:
+        return DecodedImage(index, None, None, digest, len(image_bytes), "Could not decode image")
+    return DecodedImage(index, img, gray, digest, len(image_bytes))
+
+
+class DecodePool:
+    """Decodes upcoming images in worker processes while the current one is in the models.
+
+    Base64 decoding, cv2.imdecode and the grayscale conversion run in a small
+    spawn-context process pool; results come back through shared memory so large
+    frames are not pickled. With workers=0 (or if the pool breaks) images are
+    decoded inline on the calling thread.
+    """
+
+    def __init__(self, workers: int = 2, prefetch: int = 2):
+        self.workers = workers
+        self.prefetch = prefetch
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._executor is None:
+                # spawn: never fork a process that already holds torch/YOLO threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+                logger.info(f"🧵 Started image decode pool with {self.workers} workers")
+            return self._executor
+
+    def _reset(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def shutdown(self):
+        self._reset()
+
+    def imap(self, images: Iterable) -> Iterator[DecodedImage]:
+        """Yield DecodedImage objects in input order, keeping up to workers + prefetch decodes in flight"""
+        executor = self._get_executor()
+        images = iter(enumerate(images))
+        if executor is None:
+            for index, image_data in images:
+                yield decode_inline(index, image_data)
+            return
+
+        pending = deque()
+
+        def submit_next():
+            try:
+                index, image_data = next(images)
+            except StopIteration:
+                return False
+            pending.append((index, image_data, executor.submit(_decode_into_shared_memory, image_data)))
+            return True
+
+        try:
+            while len(pending) < self.workers + self.prefetch and submit_next():
+                pass
+            while pending:
+                index, image_data, future = pending.popleft()
+                try:
+                    decoded = _attach(index, *future.result())
+                except BrokenProcessPool as e:
+                    logger.warning(f"⚠️  Image decode pool failed ({e}); decoding inline")
+                    self._reset()
+                    retry = [(index, image_data)] + [(i, d) for i, d, _future in pending]
+                    pending.clear()
+                    for later_index, later_data in itertools.chain(retry, images):
+                        yield decode_inline(later_index, later_data)
+                    return
+                submit_next()
+                yield decoded
+        finally:
+            # The consumer stopped early: free blocks that were decoded but never handed over
+            for _index, _image_data, future in pending:
+                _release_result(future)
+
+
+def _release_result(future):
+    try:
+        name = future.result()[0]
+    except Exception:
+        return
+    if name:
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_decode_pool() -> DecodePool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from django.conf import settings
+            _pool = DecodePool(
+                workers=int(getattr(settings, 'PREDICTION_DECODE_WORKERS', 2)),
+                prefetch=int(getattr(settings, 'PREDICTION_DECODE_PREFETCH', 2)),
+            )
+        return _pool
@@ -0,0 +1,500 @@
+import os
+import json
+import time
+import base64
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import torch
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; appends are then only serialised within a process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+GALLERY_DIR = 'gallery'
+EMBEDDING_DIM = 256
+GALLERY_DTYPES = ('float32', 'float16', 'bfloat16')
+# Base file entry {identity: enrolled template count} for identities that also hold live templates
+ENROLLED_KEY = '__enrolled__'
+
+_process_lock = threading.Lock()
+_compactions_running = set()
+
+
+def gallery_base_path(department_name: str, batch_year, gallery_dir: str = GALLERY_DIR) -> str:
+    return os.path.join(gallery_dir, f"gallery_{department_name}_{batch_year}.pth")
+
+
+def normalize_key(key):
+    """Gallery identities are register numbers; keep them as ints like test_detection.py"""
+    try:
+        return int(key)
+    except (TypeError, ValueError):
+        return key
+
+
+def file_fingerprint(path: str) -> str:
+    try:
+        stat = os.stat(path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        return "missing"
+
+
+def read_gallery_file(path: str) -> Dict[str, np.ndarray]:
+    """Load a gallery .pth as {identity: float32 embedding}, keys as stored in the file"""
+    return _read_gallery_base(path)[0]
+
+
+def _read_gallery_base(path: str) -> Tuple[Dict[str, np.ndarray], Dict[str, int]]:
+    """Load a gallery .pth as ({identity: embedding}, {identity: enrolled template count})"""
+    try:
+        try:
+            from numpy._core import multiarray as _multiarray
+            torch.serialization.add_safe_globals([_multiarray._reconstruct, np.ndarray])
+        except Exception as ge:
+            logger.debug(f"Could not add safe globals: {ge}")
+        gallery_data = torch.load(path, map_location='cpu')
+    except Exception as e:
+        logger.warning(
+            "Safe torch.load failed, falling back to weights_only=False as the gallery file is trusted: %s",
+            e,
+        )
+        try:
+            gallery_data = torch.load(path, map_location='cpu', weights_only=False)
+        except TypeError:
+            gallery_data = torch.load(path, map_location='cpu')
+
+    enrolled = {str(k): int(v) for k, v in (gallery_data.pop(ENROLLED_KEY, None) or {}).items()}
+    gallery = {}
+    for k, v in gallery_data.items():
+        if isinstance(v, np.ndarray):
+            gallery[k] = v
+        elif isinstance(v, torch.Tensor):
+            gallery[k] = v.cpu().numpy()
+        else:
+            logger.warning(f"⚠️  Skipping invalid embedding for {k}: {type(v)}")
+    return gallery, enrolled
+
+
+def best_face_crop(img: np.ndarray, result, min_confidence: float) -> Optional[np.ndarray]:
+    """Grayscale crop of the most confident, largest face in an enrollment photo"""
+    if result is None or len(result.boxes) == 0:
+        return None
+    boxes = result.boxes.xyxy.cpu().numpy().astype(np.int32)
+    confidences = result.boxes.conf.cpu().numpy()
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    best = int(np.argmax(confidences * areas))
+    if confidences[best] < min_confidence:
+        return None
+    x1, y1, x2, y2 = boxes[best]
+    crop = img[max(y1, 0):y2, max(x1, 0):x2]
+    if crop.size == 0:
+        return None
+    return cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+
+
+def as_float32(vectors) -> np.ndarray:
+    """float32 view of embeddings kept in any gallery dtype (uint16 holds bfloat16 bits)"""
+    vectors = np.asarray(vectors)
+    if vectors.dtype == np.uint16:
+        return (vectors.astype(np.uint32) << 16).view(np.float32)
+    return vectors.astype(np.float32, copy=False)
+
+
+def to_gallery_dtype(vectors, dtype: str = 'float32') -> np.ndarray:
+    """Store embeddings as float32, float16 or bfloat16.
+
+    numpy has no bfloat16, so those are kept as the upper 16 bits of the float32
+    values (round-to-nearest-even) in a uint16 array; as_float32 restores them.
+    """
+    vectors = np.asarray(vectors)
+    if dtype == 'float32':
+        return as_float32(vectors)
+    if dtype == 'float16':
+        return as_float32(vectors).astype(np.float16, copy=False)
+    if dtype == 'bfloat16':
+        if vectors.dtype == np.uint16:
+            return vectors
+        bits = np.ascontiguousarray(vectors, dtype=np.float32).view(np.uint32)
+        return ((bits + 0x7FFF + ((bits >> 16) & 1)) >> 16).astype(np.uint16)
+    raise ValueError(f"Unsupported gallery dtype {dtype!r}; expected one of {GALLERY_DTYPES}")
+
+
+def compact_gallery(gallery: Dict, dtype: str = 'float32') -> Dict:
+    """Convert a gallery dict's embeddings to the storage dtype in place"""
+    for key, value in gallery.items():
+        gallery[key] = to_gallery_dtype(value, dtype)
+    return gallery
+
+
+def _l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = as_float32(vectors).reshape(-1, EMBEDDING_DIM)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def make_template(vectors) -> np.ndarray:
+    """Per-student template: mean of the L2-normalised embeddings of all their photos"""
+    return _l2_normalize(np.stack(vectors)).mean(axis=0).astype(np.float32)
+
+
+def make_templates(vectors, max_templates: int = 1) -> np.ndarray:
+    """Up to max_templates templates for a student: the mean template, then the most
+    distinct individual photos (farthest-point sampling), as a (k, 256) array"""
+    mean = make_template(vectors)
+    if max_templates <= 1 or len(vectors) < 2:
+        return mean.reshape(1, -1)
+    normalized = _l2_normalize(np.stack(vectors))
+    chosen = [_l2_normalize(mean)[0]]
+    closest = normalized @ chosen[0]
+    while len(chosen) < max_templates:
+        candidate = int(np.argmin(closest))
+        if closest[candidate] > 0.98:  # Everything left is a near-duplicate
+            break
+        chosen.append(normalized[candidate])
+        closest = np.maximum(closest, normalized @ normalized[candidate])
+    return np.stack(chosen).astype(np.float32)
+
+
+class GalleryMatrix:
+    """All templates of a gallery in one flat L2-normalised (templates, 256) matrix.
+
+    Identity i owns rows starts[i]:starts[i + 1], so scoring N faces is one matmul
+    followed by a segmented max (np.maximum.reduceat) over each identity's templates.
+    The matrix can be held in float16 or bfloat16 (see to_gallery_dtype); scoring then
+    upcasts it a block of rows at a time and accumulates in float32.
+    """
+
+    BLOCK_ROWS = 4096
+
+    def __init__(self, ids: List, templates: List[np.ndarray], sources: Optional[List] = None,
+                 dtype: str = 'float32'):
+        self.ids = list(ids)
+        self.sources = list(sources) if sources is not None else [None] * len(self.ids)
+        counts = np.array([len(t) for t in templates], dtype=np.int64)
+        self.starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64) if len(counts) else counts
+        self.counts = counts
+        self.dtype = dtype
+        self.matrix = to_gallery_dtype(
+            _l2_normalize(np.concatenate(templates)) if templates else np.zeros((0, EMBEDDING_DIM), dtype=np.float32),
+            dtype,
+        )
+        self._index = {identity: i for i, identity in enumerate(self.ids)}
+
+    @classmethod
+    def from_gallery(cls, gallery: Dict, sources: Optional[Dict] = None, dtype: str = 'float32') -> 'GalleryMatrix':
+        """Build from {identity: (256,) or (k, 256) embeddings}"""
+        ids = list(gallery.keys())
+        templates = [as_float32(gallery[identity]).reshape(-1, EMBEDDING_DIM) for identity in ids]
+        keep = [i for i, t in enumerate(templates) if len(t)]
+        return cls(
+            [ids[i] for i in keep], [templates[i] for i in keep],
+            [(sources or {}).get(ids[i]) for i in keep], dtype,
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def source_of(self, identity):
+        return self.sources[self._index[identity]]
+
+    def templates_of(self, identity) -> np.ndarray:
+        i = self._index[identity]
+        return as_float32(self.matrix[self.starts[i]:self.starts[i] + self.counts[i]])
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+    def scores(self, embeddings: np.ndarray) -> np.ndarray:
+        """(faces, identities) cosine similarity: the best template of each identity"""
+        queries = _l2_normalize(embeddings)
+        if not len(self.ids) or not len(queries):
+            return np.zeros((len(queries), len(self.ids)), dtype=np.float32)
+        if self.matrix.dtype == np.float32:
+            template_scores = queries @ self.matrix.T
+        else:
+            # Never materialise a full float32 copy of a half-precision matrix
+            template_scores = np.empty((len(queries), len(self.matrix)), dtype=np.float32)
+            for start in range(0, len(self.matrix), self.BLOCK_ROWS):
+                block = as_float32(self.matrix[start:start + self.BLOCK_ROWS])
+                template_scores[:, start:start + len(block)] = queries @ block.T
+        return np.maximum.reduceat(template_scores, self.starts, axis=1)
+
+
+def embed_enrollment_images(service, images: List[np.ndarray], detect: bool = True,
+                            min_confidence: float = 0.5, max_templates: int = 1) -> Tuple[Optional[np.ndarray], int]:
+    """Template(s) for one student from BGR photos; returns (templates or None, photos used)"""
+    images = [img for img in images if img is not None]
+    if not images:
+        return None, 0
+    if detect:
+        results = service.yolo_model(images, verbose=False)
+        crops = [best_face_crop(img, result, min_confidence) for img, result in zip(images, results)]
+        crops = [crop for crop in crops if crop is not None]
+    else:
+        crops = [cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) for img in images]
+    if not crops:
+        return None, 0
+    templates = make_templates(list(service._embed_crops(crops)), max_templates)
+    return (templates[0] if len(templates) == 1 else templates), len(crops)
+
+
+@contextmanager
+def _file_lock(lock_path: str):
+    with _process_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class GalleryStore:
+    """A gallery base file plus its append-only delta log.
+
+    Identity changes (put/remove) are appended to gallery_<dept>_<batch>.delta
+    as JSON lines and merged on read. Compaction folds the log into a new base
+    file and starts a fresh log whose first line is a checkpoint, so readers
+    that had already applied everything can carry on without a full reload.
+    """
+
+    def __init__(self, department_name: str, batch_year, gallery_dir: str = GALLERY_DIR):
+        self.base_path = gallery_base_path(department_name, batch_year, gallery_dir)
+        stem = os.path.splitext(self.base_path)[0]
+        self.log_path = stem + '.delta'
+        self.lock_path = stem + '.lock'
+
+    # Writing
+
+    def _append(self, record: Dict) -> int:
+        os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+        line = json.dumps(record) + "\n"
+        with _file_lock(self.lock_path):
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        pending = self.pending_count()
+        self._maybe_compact_in_background(pending)
+        return pending
+
+    def put(self, student_id, embedding: np.ndarray) -> int:
+        """Add or replace an identity with one (256,) or several (k, 256) templates;
+        returns the number of pending delta records"""
+        embedding = np.asarray(embedding, dtype=np.float32)
+        if embedding.shape[-1] != EMBEDDING_DIM or embedding.ndim > 2:
+            raise ValueError(f"Expected {EMBEDDING_DIM}-d embeddings, got shape {embedding.shape}")
+        return self._append({
+            'op': 'put',
+            'id': str(student_id),
+            'shape': list(embedding.shape),
+            'embedding': base64.b64encode(embedding.tobytes()).decode('ascii'),
+            'ts': time.time(),
+        })
+
+    def add_template(self, student_id, embedding: np.ndarray, max_templates: int) -> int:
+        """Append one live template to an identity; past max_templates the oldest live
+        template is dropped. Enrolled templates are always kept, so the template is not
+        added when they already fill every slot"""
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(EMBEDDING_DIM)
+        return self._append({
+            'op': 'add_template',
+            'id': str(student_id),
+            'max': int(max_templates),
+            'embedding': base64.b64encode(embedding.tobytes()).decode('ascii'),
+            'ts': time.time(),
+        })
+
+    def remove(self, student_id) -> int:
+        return self._append({'op': 'remove', 'id': str(student_id), 'ts': time.time()})
+
+    # Reading
+
+    def _log_identity(self):
+        try:
+            stat = os.stat(self.log_path)
+            return [stat.st_ino, stat.st_dev]
+        except OSError:
+            return None
+
+    def read_log(self, offset: int = 0) -> Tuple[List[Dict], int]:
+        """Complete records from a byte offset, and the offset just past the last one"""
+        try:
+            with open(self.log_path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0
+        end = data.rfind(b"\n") + 1  # Ignore a line still being written
+        records = []
+        for line in data[:end].splitlines():
+            if line.strip():
+                records.append(json.loads(line))
+        return records, offset + end
+
+    def pending_count(self) -> int:
+        records, _ = self.read_log()
+        return sum(1 for record in records if record['op'] != 'checkpoint')
+
+    @staticmethod
+    def apply(gallery: Dict, records: List[Dict], key_func=normalize_key, enrolled: Optional[Dict] = None) -> int:
+        """Apply delta records to a gallery dict in place; returns how many changed it.
+
+        enrolled maps identities holding live templates to how many of their leading
+        templates were enrolled, and is updated in place; other identities are all enrolled.
+        """
+        enrolled = {} if enrolled is None else enrolled
+        applied = 0
+        for record in records:
+            key = key_func(record['id']) if record['op'] != 'checkpoint' else None
+            if record['op'] in ('put', 'add_template'):
+                embedding = np.frombuffer(base64.b64decode(record['embedding']), dtype=np.float32).copy()
+            if record['op'] == 'put':
+                gallery[key] = embedding.reshape(record.get('shape', [EMBEDDING_DIM]))
+                enrolled.pop(key, None)
+                applied += 1
+            elif record['op'] == 'add_template':
+                if key not in gallery:
+                    continue  # Removed since the template was captured
+                templates = as_float32(gallery[key]).reshape(-1, EMBEDDING_DIM)
+                enrolled_count = enrolled.get(key, len(templates))
+                limit = max(record['max'], 1)
+                while len(templates) >= limit and len(templates) > enrolled_count:
+                    templates = np.delete(templates, enrolled_count, axis=0)  # The oldest live template
+                if len(templates) >= limit:
+                    continue  # Enrolled templates fill every slot
+                gallery[key] = np.concatenate([templates, embedding.reshape(1, -1)])
+                enrolled[key] = enrolled_count
+                applied += 1
+            elif record['op'] == 'remove':
+                enrolled.pop(key, None)
+                if gallery.pop(key, None) is not None:
+                    applied += 1
+        return applied
+
+    def load(self, key_func=normalize_key) -> Tuple[Dict, Dict]:
+        """Full merged read: base file plus every delta. Returns (gallery, sync state)"""
+        with _file_lock(self.lock_path):
+            base_fingerprint = file_fingerprint(self.base_path)
+            gallery, enrolled = {}, {}
+            if os.path.exists(self.base_path):
+                base, base_enrolled = _read_gallery_base(self.base_path)
+                gallery = {key_func(k): v for k, v in base.items()}
+                enrolled = {key_func(k): count for k, count in base_enrolled.items()}
+            records, offset = self.read_log()
+            log_identity = self._log_identity()
+        self.apply(gallery, records, key_func, enrolled)
+        return gallery, {'base': base_fingerprint, 'log': log_identity, 'offset': offset, 'enrolled': enrolled}
+
+    def sync(self, gallery: Dict, state: Dict, key_func=normalize_key) -> Tuple[Optional[Dict], Dict]:
+        """Bring a previously loaded gallery up to date by reading only new delta records.
+
+        Returns (gallery, state); the gallery is a new dict when deltas were applied
+        (copy-on-write, so readers of the old one are unaffected) and None when a
+        full reload is needed.
+        """
+        base_fingerprint = file_fingerprint(self.base_path)
+        log_identity = self._log_identity()
+        offset = state['offset']
+
+        if log_identity != state['log']:
+            # The log was created, or replaced by a compaction
+            records, _ = self.read_log()
+            checkpoint = records[0] if records and records[0]['op'] == 'checkpoint' else None
+            if checkpoint is None and state['log'] is None and base_fingerprint == state['base']:
+                offset = 0
+            elif (checkpoint is not None and checkpoint['prev_log'] == state['log']
+                  and checkpoint['folded'] == state['offset'] and checkpoint['base'] == base_fingerprint):
+                # We had applied exactly what was folded into the new base
+                offset = 0
+            else:
+                return None, state
+        elif base_fingerprint != state['base']:
+            return None, state
+
+        records, new_offset = self.read_log(offset)
+        enrolled = state.get('enrolled', {})
+        if not any(record['op'] != 'checkpoint' for record in records):
+            return gallery, {'base': base_fingerprint, 'log': log_identity, 'offset': new_offset, 'enrolled': enrolled}
+        updated, enrolled = dict(gallery), dict(enrolled)
+        self.apply(updated, records, key_func, enrolled)
+        return updated, {'base': base_fingerprint, 'log': log_identity, 'offset': new_offset, 'enrolled': enrolled}
+
+    def replace_base(self, gallery: Dict[str, np.ndarray]) -> int:
+        """Write a freshly built base file and discard the delta log; returns the records dropped"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.base_path)), exist_ok=True)
+        with _file_lock(self.lock_path):
+            dropped = self.pending_count()
+            tmp_base = f"{self.base_path}.tmp"
+            torch.save({str(k): v for k, v in gallery.items()}, tmp_base)
+            os.replace(tmp_base, self.base_path)
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+        return dropped
+
+    # Compaction
+
+    def compact(self) -> int:
+        """Fold the delta log into a new base file; returns the number of records folded"""
+        with _file_lock(self.lock_path):
+            records, folded = self.read_log()
+            changes = [record for record in records if record['op'] != 'checkpoint']
+            if not changes:
+                return 0
+            gallery, enrolled = _read_gallery_base(self.base_path) if os.path.exists(self.base_path) else ({}, {})
+            self.apply(gallery, changes, key_func=str, enrolled=enrolled)
+            gallery = {str(k): v for k, v in gallery.items()}
+
+            tmp_base = f"{self.base_path}.tmp"
+            torch.save({**gallery, ENROLLED_KEY: enrolled} if enrolled else gallery, tmp_base)
+            os.replace(tmp_base, self.base_path)
+
+            checkpoint = {
+                'op': 'checkpoint',
+                'base': file_fingerprint(self.base_path),
+                'folded': folded,
+                'prev_log': self._log_identity(),
+                'ts': time.time(),
+            }
+            tmp_log = f"{self.log_path}.tmp"
+            with open(tmp_log, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(checkpoint) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_log, self.log_path)
+
+        logger.info(f"🗜️  Compacted {len(changes)} delta records into {self.base_path} ({len(gallery)} identities)")
+        return len(changes)
+
+    def _maybe_compact_in_background(self, pending: int):
+        from django.conf import settings
+        threshold = int(getattr(settings, 'PREDICTION_GALLERY_COMPACT_THRESHOLD', 50))
+        if threshold <= 0 or pending < threshold:
+            return
+        with _process_lock:
+            if self.base_path in _compactions_running:
+                return
+            _compactions_running.add(self.base_path)
+
+        def run():
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"❌ Background compaction of {self.base_path} failed: {e}")
+            finally:
+                with _process_lock:
+                    _compactions_running.discard(self.base_path)
+
+        threading.Thread(target=run, name=f"gallery-compact-{os.path.basename(self.base_path)}", daemon=True).start()
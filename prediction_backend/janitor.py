@@ -0,0 +1,239 @@
+import os
+import shutil
+import time
+import logging
+import tempfile
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; every process then runs its own janitor
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TEMP_SESSION_PREFIX = "attendance_session_"
+# In the temp directory; holds the time of the last threaded run, shared by all serving processes
+SCHEDULER_LOCK_FILE = "attendance_janitor.lock"
+
+
+def _tree_size(path) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class Janitor:
+    """Retention policy for session temp directories, session embeddings, prediction tables and report jobs.
+
+    Ages are in hours (files) and days (rows); 0 keeps things forever. Rows are
+    deleted in primary-key chunks of `chunk_size`, each its own short statement, so
+    a purge never holds long locks on a table that requests are writing to.
+    """
+
+    def __init__(self, temp_hours=24, session_embedding_hours=168, prediction_days=0,
+                 submission_days=0, processed_image_days=0, report_job_days=0, chunk_size=1000, chunk_pause=0.0):
+        self.temp_hours = temp_hours
+        self.session_embedding_hours = session_embedding_hours
+        self.prediction_days = prediction_days
+        self.submission_days = submission_days
+        self.processed_image_days = processed_image_days
+        self.report_job_days = report_job_days
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+
+    @classmethod
+    def from_settings(cls) -> "Janitor":
+        return cls(
+            temp_hours=float(getattr(settings, 'PREDICTION_TEMP_RETENTION_HOURS', 24)),
+            session_embedding_hours=float(getattr(settings, 'PREDICTION_SESSION_EMBEDDINGS_MAX_AGE_HOURS', 168)),
+            prediction_days=float(getattr(settings, 'PREDICTION_RETENTION_DAYS', 0)),
+            submission_days=float(getattr(settings, 'PREDICTION_SUBMISSION_RETENTION_DAYS', 0)),
+            processed_image_days=float(getattr(settings, 'PREDICTION_PROCESSED_IMAGE_RETENTION_DAYS', 0)),
+            report_job_days=float(getattr(settings, 'REPORT_JOB_RETENTION_DAYS', 7)),
+            chunk_size=int(getattr(settings, 'PREDICTION_JANITOR_CHUNK_SIZE', 1000)),
+            chunk_pause=float(getattr(settings, 'PREDICTION_JANITOR_CHUNK_PAUSE_SECONDS', 0)),
+        )
+
+    def sweep_temp_directories(self, dry_run=False):
+        """Remove attendance_session_* temp directories older than temp_hours; returns (count, bytes)"""
+        if not self.temp_hours:
+            return 0, 0
+        cutoff = time.time() - self.temp_hours * 3600
+        removed = reclaimed = 0
+        with os.scandir(tempfile.gettempdir()) as entries:
+            for entry in entries:
+                if not entry.name.startswith(TEMP_SESSION_PREFIX):
+                    continue
+                try:
+                    if not entry.is_dir(follow_symlinks=False) or entry.stat().st_mtime >= cutoff:
+                        continue
+                except OSError:
+                    continue
+                reclaimed += _tree_size(entry.path)
+                removed += 1
+                if not dry_run:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+        return removed, reclaimed
+
+    def sweep_session_embeddings(self, dry_run=False) -> int:
+        from .session_faces import SessionFaceStore
+
+        store = SessionFaceStore.from_settings()
+        if store is None or not self.session_embedding_hours or dry_run:
+            return 0
+        return store.prune(self.session_embedding_hours)
+
+    def purge(self, queryset, date_field, days, dry_run=False) -> int:
+        """Delete rows whose `date_field` is older than `days`, chunk by chunk; returns the row count"""
+        if not days:
+            return 0
+        expired = queryset.filter(**{f"{date_field}__lt": timezone.now() - timedelta(days=days)})
+        if dry_run:
+            return expired.count()
+        model = queryset.model
+        deleted = 0
+        while True:
+            ids = list(expired.order_by('pk').values_list('pk', flat=True)[:self.chunk_size])
+            if not ids:
+                return deleted
+            deleted += model.objects.filter(pk__in=ids).delete()[1].get(model._meta.label, 0)
+            if self.chunk_pause:
+                time.sleep(self.chunk_pause)
+
+    def sweep_report_jobs(self, dry_run=False):
+        """Remove report job artifacts, then job rows, older than report_job_days; returns (rows, files)"""
+        from advisor_dashboard import jobs
+        from advisor_dashboard.models import ReportJob
+
+        files = jobs.sweep_artifacts(self.report_job_days, dry_run)
+        return self.purge(ReportJob.objects.all(), 'created_at', self.report_job_days, dry_run), files
+
+    def run(self, dry_run=False) -> dict:
+        """Apply the retention policy once; returns what was (or would be) reclaimed"""
+        from .models import AttendancePrediction, AttendanceSubmission, ProcessedImage, RecognitionSession
+
+        started = time.perf_counter()
+        temp_dirs, temp_bytes = self.sweep_temp_directories(dry_run)
+        report_jobs, report_files = self.sweep_report_jobs(dry_run)
+        report = {
+            'temp_directories': temp_dirs,
+            'temp_bytes': temp_bytes,
+            'session_embedding_files': self.sweep_session_embeddings(dry_run),
+            'recognition_sessions': self.purge(
+                RecognitionSession.objects.all(), 'predicted_at', self.prediction_days, dry_run),
+            'attendance_predictions': self.purge(
+                AttendancePrediction.objects.all(), 'predicted_at', self.prediction_days, dry_run),
+            'attendance_submissions': self.purge(
+                AttendanceSubmission.objects.all(), 'submitted_at', self.submission_days, dry_run),
+            'processed_images': self.purge(
+                ProcessedImage.objects.all(), 'processed_at', self.processed_image_days, dry_run),
+            'report_jobs': report_jobs,
+            'report_files': report_files,
+        }
+        report['seconds'] = round(time.perf_counter() - started, 3)
+        return report
+
+
+class JanitorScheduler:
+    """Runs the Janitor every `interval` seconds on a daemon thread.
+
+    Every uvicorn worker starts one; a flock on SCHEDULER_LOCK_FILE and the last run
+    time written into it make a single worker do each sweep.
+    """
+
+    def __init__(self, janitor: Janitor, interval: float = 3600):
+        self.janitor = janitor
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_report = None
+        self.last_error = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="prediction-janitor", daemon=True)
+        self._thread.start()
+        logger.info(f"🧹 Janitor started (every {self.interval:.0f}s)")
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        """Run the janitor unless another process is running it or ran it less than half an interval ago;
+        returns the report, or None when skipped"""
+        lock_path = os.path.join(tempfile.gettempdir(), SCHEDULER_LOCK_FILE)
+        with open(lock_path, 'a+') as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return None
+            try:
+                lock_file.seek(0)
+                try:
+                    last_run = float(lock_file.read() or 0)
+                except ValueError:
+                    last_run = 0
+                if time.time() - last_run < self.interval / 2:
+                    return None
+                report = self.janitor.run()
+                lock_file.truncate(0)
+                lock_file.write(str(time.time()))
+                lock_file.flush()
+                return report
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                report = self.run_once()
+                if report is not None:
+                    self.last_report = report
+                    if any(value for key, value in report.items() if key != 'seconds'):
+                        logger.info(f"🧹 Janitor reclaimed: {report}")
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"❌ Janitor run failed: {e}")
+            finally:
+                close_old_connections()
+            self._stop.wait(self.interval)
+
+    def status(self):
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'interval_seconds': self.interval,
+            'last_report': self.last_report,
+            'last_error': self.last_error,
+        }
+
+
+_scheduler = None
+
+
+def get_scheduler():
+    return _scheduler
+
+
+def start_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = JanitorScheduler(
+            Janitor.from_settings(),
+            interval=float(getattr(settings, 'PREDICTION_JANITOR_INTERVAL_MINUTES', 60)) * 60,
+        )
+    _scheduler.start()
+    return _scheduler
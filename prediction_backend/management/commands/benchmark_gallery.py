@@ -0,0 +1,83 @@
+"""
+Gallery Precision Benchmark Management Command
+Compares memory, matching latency and agreement of float32/float16/bfloat16 galleries
+"""
+import glob
+import os
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from prediction_backend.gallery import (
+    GALLERY_DIR, GALLERY_DTYPES, GalleryMatrix, as_float32, gallery_base_path, read_gallery_file,
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare memory, latency and accuracy agreement of gallery storage dtypes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dept', help='Department name (default: every gallery file)')
+        parser.add_argument('--batch', type=int, help='Batch year used in the gallery name')
+        parser.add_argument('--identities', type=int, default=0,
+                            help='Grow the gallery to this many identities with perturbed copies '
+                                 '(simulates a campus-wide gallery)')
+        parser.add_argument('--templates', type=int, default=1, help='Templates per identity')
+        parser.add_argument('--faces', type=int, default=60, help='Faces matched per call')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed calls per dtype')
+        parser.add_argument('--threshold', type=float, default=0.45)
+
+    def handle(self, *args, **options):
+        if options['dept'] and options['batch']:
+            paths = [gallery_base_path(options['dept'], options['batch'])]
+        else:
+            paths = sorted(glob.glob(os.path.join(GALLERY_DIR, 'gallery_*.pth')))
+        paths = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            raise CommandError("No gallery files found")
+
+        enrolled = np.concatenate([
+            np.stack([as_float32(v).reshape(-1, 256)[0] for v in read_gallery_file(path).values()])
+            for path in paths
+        ])
+        rng = np.random.default_rng(0)
+        noise = float(enrolled.std())
+
+        # Synthetic identities and extra templates are enrolled embeddings plus noise
+        identities = max(options['identities'], len(enrolled))
+        base = enrolled[rng.integers(0, len(enrolled), identities)]
+        base[len(enrolled):] += rng.normal(0, noise, base[len(enrolled):].shape).astype(np.float32)
+        gallery = {
+            i: np.concatenate([base[i:i + 1], base[i] + rng.normal(0, noise / 2, (options['templates'] - 1, 256))])
+            .astype(np.float32)
+            for i in range(identities)
+        }
+        picked = rng.integers(0, identities, options['faces'])
+        queries = (base[picked] + rng.normal(0, noise, (options['faces'], 256))).astype(np.float32)
+
+        self.stdout.write(
+            f"🚀 {len(paths)} gallery files, {identities} identities x {options['templates']} templates, "
+            f"{options['faces']} faces per call"
+        )
+
+        reference = None
+        for dtype in GALLERY_DTYPES:
+            matrix = GalleryMatrix.from_gallery(gallery, dtype=dtype)
+            scores = matrix.scores(queries)  # Warm-up
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                scores = matrix.scores(queries)
+            latency_ms = (time.perf_counter() - start) * 1000 / options['repeat']
+
+            line = f"📊 {dtype:>8}: {matrix.nbytes / 1024 / 1024:8.2f} MB | {latency_ms:7.2f} ms/call"
+            if reference is None:
+                reference = scores
+            else:
+                top1 = float((scores.argmax(axis=1) == reference.argmax(axis=1)).mean())
+                decisions = float(((scores > options['threshold']) == (reference > options['threshold'])).mean())
+                line += (f" | top-1 agreement {top1:.2%} | threshold agreement {decisions:.2%}"
+                         f" | max |Δscore| {np.abs(scores - reference).max():.2e}")
+            self.stdout.write(line)
+
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark complete"))
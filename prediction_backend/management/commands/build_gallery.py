@@ -0,0 +1,199 @@
+"""
+Gallery Builder Management Command
+Builds gallery/gallery_<dept>_<batch>.pth from a directory of raw enrollment photos
+"""
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import cv2
+import torch
+from torch.utils.data import DataLoader, Dataset
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Student
+from prediction_backend.gallery import GalleryStore, best_face_crop, make_templates
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+
+
+def find_enrollment_photos(photos_dir):
+    """List (student_id, path) pairs.
+
+    Photos are either grouped in one folder per student (<dir>/<regno>/*.jpg) or
+    named after the student (<dir>/<regno>.jpg, <dir>/<regno>_2.jpg).
+    """
+    photos = []
+    for path in sorted(Path(photos_dir).rglob('*')):
+        if path.suffix.lower() not in IMAGE_EXTENSIONS or not path.is_file():
+            continue
+        relative = path.relative_to(photos_dir)
+        if len(relative.parts) > 1:
+            student_id = relative.parts[0]
+        else:
+            student_id = path.stem.split('_')[0]
+        photos.append((student_id, str(path)))
+    return photos
+
+
+class EnrollmentPhotoDataset(Dataset):
+    """Decodes enrollment photos in DataLoader workers, downscaling very large ones"""
+
+    def __init__(self, photos, max_side=1920):
+        self.photos = photos
+        self.max_side = max_side
+
+    def __len__(self):
+        return len(self.photos)
+
+    def __getitem__(self, index):
+        student_id, path = self.photos[index]
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is not None and max(img.shape[:2]) > self.max_side:
+            scale = self.max_side / max(img.shape[:2])
+            img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return student_id, path, img
+
+
+def collate_photos(items):
+    # Images have different sizes, so keep the batch as a list
+    return items
+
+
+def _init_worker(_worker_id):
+    # Workers already run in parallel; stop OpenCV from spawning its own thread pool in each
+    cv2.setNumThreads(0)
+
+
+class Command(BaseCommand):
+    help = 'Build a face gallery (.pth) for a department/batch from a directory of enrollment photos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dept', required=True, help='Department name, e.g. AIML')
+        parser.add_argument('--batch', required=True, type=int, help='Batch year used in the gallery name')
+        parser.add_argument('--photos', required=True, help='Directory of enrollment photos')
+        parser.add_argument('--output', help='Output path (default: gallery/gallery_<dept>_<batch>.pth, '
+                                             'which also discards that gallery\'s pending delta log)')
+        parser.add_argument('--batch-size', type=int, default=32, help='Photos per detection/embedding batch')
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                            help='DataLoader worker processes for decoding photos')
+        parser.add_argument('--min-confidence', type=float, default=0.5,
+                            help='Minimum YOLO confidence for the enrolled face')
+        parser.add_argument('--no-detect', action='store_true',
+                            help='Photos are already cropped faces; skip YOLO')
+        parser.add_argument('--templates', type=int, default=1,
+                            help='Templates kept per student: the mean plus the most distinct photos')
+
+    def handle(self, *args, **options):
+        from prediction_backend.services import prediction_service
+
+        photos_dir = options['photos']
+        if not os.path.isdir(photos_dir):
+            raise CommandError(f"Photos directory not found: {photos_dir}")
+
+        store = None if options['output'] else GalleryStore(options['dept'], options['batch'])
+        output = options['output'] or store.base_path
+        detect = not options['no_detect']
+
+        photos = find_enrollment_photos(photos_dir)
+        if not photos:
+            raise CommandError(f"No images found in {photos_dir}")
+        student_count = len({student_id for student_id, _ in photos})
+        self.stdout.write(f"🚀 Building gallery from {len(photos)} photos of {student_count} students")
+
+        prediction_service.initialize()
+        if prediction_service.face_model is None:
+            raise CommandError("LightCNN model is not available; cannot compute embeddings")
+        if detect and prediction_service.yolo_model is None:
+            raise CommandError("YOLO model is not available; use --no-detect for pre-cropped faces")
+
+        loader = DataLoader(
+            EnrollmentPhotoDataset(photos),
+            batch_size=options['batch_size'],
+            num_workers=options['workers'],
+            collate_fn=collate_photos,
+            worker_init_fn=_init_worker,
+        )
+
+        embeddings_by_student = defaultdict(list)
+        unreadable, no_face = [], []
+        processed = 0
+        start = time.perf_counter()
+
+        for batch in loader:
+            crops, owners = [], []
+            readable = [(student_id, path, img) for student_id, path, img in batch if img is not None]
+            unreadable.extend(path for _student_id, path, img in batch if img is None)
+
+            if detect and readable:
+                # One batched YOLO call per DataLoader batch
+                results = prediction_service.yolo_model([img for _s, _p, img in readable], verbose=False)
+                for (student_id, path, img), result in zip(readable, results):
+                    crop = best_face_crop(img, result, options['min_confidence'])
+                    if crop is None:
+                        no_face.append(path)
+                        continue
+                    crops.append(crop)
+                    owners.append(student_id)
+            else:
+                for student_id, _path, img in readable:
+                    crops.append(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+                    owners.append(student_id)
+
+            embeddings = prediction_service._embed_crops(crops, batch_size=options['batch_size'])
+            for student_id, embedding in zip(owners, embeddings):
+                embeddings_by_student[student_id].append(embedding)
+
+            processed += len(batch)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"📸 {processed}/{len(photos)} photos | {processed / max(elapsed, 1e-6):.1f} img/s | "
+                f"{len(embeddings_by_student)} students embedded"
+            )
+
+        gallery = {}
+        for student_id, vectors in sorted(embeddings_by_student.items()):
+            templates = make_templates(vectors, options['templates'])
+            gallery[student_id] = templates[0] if len(templates) == 1 else templates
+        if not gallery:
+            raise CommandError("No faces were embedded; gallery not written")
+
+        if store is not None:
+            dropped = store.replace_base(gallery)
+            if dropped:
+                self.stdout.write(self.style.WARNING(f"⚠️  Discarded {dropped} pending gallery delta records"))
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+            tmp_output = f"{output}.tmp"
+            torch.save(gallery, tmp_output)
+            os.replace(tmp_output, output)
+
+        elapsed = time.perf_counter() - start
+        for path in unreadable:
+            self.stdout.write(self.style.WARNING(f"⚠️  Could not read {path}"))
+        for path in no_face:
+            self.stdout.write(self.style.WARNING(f"⚠️  No usable face in {path}"))
+        self._report_missing_students(options['dept'], options['batch'], gallery)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Wrote {output} with {len(gallery)} students from {len(photos)} photos "
+            f"in {elapsed:.1f}s ({len(photos) / max(elapsed, 1e-6):.1f} img/s)"
+        ))
+
+    def _report_missing_students(self, dept, batch, gallery):
+        """Warn about enrolled students of the department/batch that have no photos"""
+        try:
+            regnos = set(
+                Student.objects.filter(department__dept_name=dept, batch__batch_year=batch)
+                .values_list('student_regno', flat=True)
+            )
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f"⚠️  Could not check student roster: {e}"))
+            return
+        missing = sorted(regnos - set(gallery))
+        if missing:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️  {len(missing)} students of {dept} {batch} have no gallery entry: {', '.join(missing[:20])}"
+                + (" ..." if len(missing) > 20 else "")
+            ))
@@ -0,0 +1,43 @@
+"""
+Janitor Management Command
+Applies the retention policy once: session temp directories, session embeddings, prediction rows and report jobs
+"""
+from django.core.management.base import BaseCommand
+
+from prediction_backend.janitor import Janitor
+
+
+class Command(BaseCommand):
+    help = 'Sweep old session temp directories and purge expired prediction rows and report jobs (for cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be removed')
+        parser.add_argument('--temp-hours', type=float, help='Override PREDICTION_TEMP_RETENTION_HOURS')
+        parser.add_argument('--prediction-days', type=float, help='Override PREDICTION_RETENTION_DAYS')
+        parser.add_argument('--submission-days', type=float, help='Override PREDICTION_SUBMISSION_RETENTION_DAYS')
+        parser.add_argument('--processed-image-days', type=float,
+                            help='Override PREDICTION_PROCESSED_IMAGE_RETENTION_DAYS')
+        parser.add_argument('--report-job-days', type=float, help='Override REPORT_JOB_RETENTION_DAYS')
+        parser.add_argument('--chunk-size', type=int, help='Rows deleted per statement')
+
+    def handle(self, *args, **options):
+        janitor = Janitor.from_settings()
+        for option, attribute in (('temp_hours', 'temp_hours'), ('prediction_days', 'prediction_days'),
+                                  ('submission_days', 'submission_days'),
+                                  ('processed_image_days', 'processed_image_days'),
+                                  ('report_job_days', 'report_job_days'),
+                                  ('chunk_size', 'chunk_size')):
+            if options[option] is not None:
+                setattr(janitor, attribute, options[option])
+
+        verb = "Would remove" if options['dry_run'] else "Removed"
+        self.stdout.write(f"🧹 Running janitor{' (dry run)' if options['dry_run'] else ''}...")
+        report = janitor.run(dry_run=options['dry_run'])
+
+        self.stdout.write(f"🗑️  {verb} {report['temp_directories']} temp directories "
+                          f"({report['temp_bytes'] / 1024 / 1024:.1f} MB)")
+        self.stdout.write(f"🗑️  {verb} {report['session_embedding_files']} session embedding files")
+        for table in ('recognition_sessions', 'attendance_predictions', 'attendance_submissions', 'processed_images'):
+            self.stdout.write(f"🗑️  {verb} {report[table]} {table} rows")
+        self.stdout.write(f"🗑️  {verb} {report['report_jobs']} report jobs and {report['report_files']} report files")
+        self.stdout.write(self.style.SUCCESS(f"✅ Janitor finished in {report['seconds']}s"))
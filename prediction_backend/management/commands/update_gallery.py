@@ -0,0 +1,93 @@
+"""
+Gallery Update Management Command
+Adds, replaces or removes a single identity through the gallery delta log
+"""
+import os
+
+import cv2
+from django.core.management.base import BaseCommand, CommandError
+
+from prediction_backend.gallery import GalleryStore, embed_enrollment_images
+from prediction_backend.management.commands.build_gallery import IMAGE_EXTENSIONS
+
+
+class Command(BaseCommand):
+    help = 'Add, replace or remove one student in a gallery without rebuilding it, or compact its delta log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['add', 'replace', 'remove', 'compact', 'status'])
+        parser.add_argument('--dept', required=True, help='Department name, e.g. AIML')
+        parser.add_argument('--batch', required=True, help='Batch year used in the gallery name')
+        parser.add_argument('--student', help='Register number of the student')
+        parser.add_argument('--photos', nargs='+', default=[],
+                            help='Enrollment photos (files or a directory) for add/replace')
+        parser.add_argument('--no-detect', action='store_true',
+                            help='Photos are already cropped faces; skip YOLO')
+        parser.add_argument('--templates', type=int, default=1,
+                            help='Templates kept for the student: the mean plus the most distinct photos')
+
+    def handle(self, *args, **options):
+        store = GalleryStore(options['dept'], options['batch'])
+        action = options['action']
+
+        if action == 'status':
+            gallery, _state = store.load(key_func=str)
+            self.stdout.write(f"📚 {store.base_path}: {len(gallery)} identities, "
+                              f"{store.pending_count()} pending delta records")
+            return
+
+        if action == 'compact':
+            folded = store.compact()
+            self.stdout.write(self.style.SUCCESS(f"✅ Compacted {folded} delta records into {store.base_path}"))
+            return
+
+        student_id = options['student']
+        if not student_id:
+            raise CommandError(f"--student is required for {action}")
+
+        gallery, _state = store.load(key_func=str)
+        exists = student_id in gallery
+        if action == 'add' and exists:
+            raise CommandError(f"{student_id} is already in the gallery; use replace")
+        if action in ('replace', 'remove') and not exists:
+            raise CommandError(f"{student_id} is not in the gallery")
+
+        if action == 'remove':
+            pending = store.remove(student_id)
+            self.stdout.write(self.style.SUCCESS(f"✅ Removed {student_id} ({pending} pending delta records)"))
+            return
+
+        paths = self._photo_paths(options['photos'])
+        if not paths:
+            raise CommandError("--photos is required for add/replace")
+
+        from prediction_backend.services import prediction_service
+        prediction_service.initialize()
+        if prediction_service.face_model is None or (not options['no_detect'] and prediction_service.yolo_model is None):
+            raise CommandError("Face models are not available; cannot compute embeddings")
+
+        template, used = embed_enrollment_images(
+            prediction_service, [cv2.imread(path, cv2.IMREAD_COLOR) for path in paths],
+            detect=not options['no_detect'], max_templates=options['templates'],
+        )
+        if template is None:
+            raise CommandError("No usable face found in the given photos")
+
+        pending = store.put(student_id, template)
+        verb = 'Added' if action == 'add' else 'Replaced'
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {verb} {student_id} from {used}/{len(paths)} photos ({pending} pending delta records)"
+        ))
+
+    @staticmethod
+    def _photo_paths(photos):
+        paths = []
+        for photo in photos:
+            if os.path.isdir(photo):
+                paths.extend(
+                    os.path.join(photo, name) for name in sorted(os.listdir(photo))
+                    if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+                )
+            else:
+                paths.append(photo)
+        return paths
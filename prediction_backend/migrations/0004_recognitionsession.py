@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_subject_created_by'),
+        ('prediction_backend', '0003_attendancesubmission_submission_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecognitionSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(max_length=100, unique=True)),
+                ('detection_method', models.CharField(default='camera', max_length=50)),
+                ('time_slot_info', models.TextField(blank=True)),
+                ('student_count', models.PositiveIntegerField(default=0)),
+                ('predictions_blob', models.BinaryField()),
+                ('predicted_at', models.DateTimeField(auto_now_add=True)),
+                ('section', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.section')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.subject')),
+            ],
+            options={
+                'db_table': 'recognition_sessions',
+            },
+        ),
+    ]
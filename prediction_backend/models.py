@@ -1,6 +1,12 @@
+import json
+import struct
+from collections import namedtuple
+
 from django.db import models
 from core.models import Student, Subject, Section, Department, Batch
 
+PackedPrediction = namedtuple('PackedPrediction', ['regno', 'section_id', 'present', 'confidence'])
+
 
 class AttendancePrediction(models.Model):
     """Store ML model predictions before user editing"""
@@ -20,6 +26,70 @@ class AttendancePrediction(models.Model):
         unique_together = ['session_id', 'student']
 
 
+class RecognitionSession(models.Model):
+    """One row per prediction session with every student's prediction packed into a blob.
+
+    Replaces a row per student in attendance_predictions: the blob holds, per student,
+    a length-prefixed register number, section id, present flag and float32 confidence
+    (about 20 bytes each).
+    """
+    PACK_VERSION = 1
+    _ENTRY = struct.Struct('<i?f')  # section_id, present, confidence (after the regno)
+
+    session_id = models.CharField(max_length=100, unique=True)
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
+    section = models.ForeignKey(Section, on_delete=models.CASCADE)  # Section used for the timetable entry
+    detection_method = models.CharField(max_length=50, default='camera')
+    time_slot_info = models.TextField(blank=True)  # JSON string containing time slot information
+    student_count = models.PositiveIntegerField(default=0)
+    predictions_blob = models.BinaryField()
+    predicted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'recognition_sessions'
+
+    @classmethod
+    def pack(cls, predictions) -> bytes:
+        """Pack (regno, section_id, present, confidence) tuples"""
+        parts = [bytes([cls.PACK_VERSION])]
+        for regno, section_id, present, confidence in predictions:
+            encoded = str(regno).encode('utf-8')
+            parts.append(bytes([len(encoded)]) + encoded + cls._ENTRY.pack(section_id, bool(present), confidence))
+        return b''.join(parts)
+
+    @classmethod
+    def unpack(cls, blob) -> list:
+        blob = bytes(blob)
+        if not blob:
+            return []
+        if blob[0] != cls.PACK_VERSION:
+            raise ValueError(f"Unknown prediction blob version {blob[0]}")
+        predictions = []
+        offset = 1
+        while offset < len(blob):
+            length = blob[offset]
+            regno = blob[offset + 1:offset + 1 + length].decode('utf-8')
+            offset += 1 + length
+            section_id, present, confidence = cls._ENTRY.unpack_from(blob, offset)
+            offset += cls._ENTRY.size
+            predictions.append(PackedPrediction(regno, section_id, present, confidence))
+        return predictions
+
+    @property
+    def predictions(self) -> list:
+        return self.unpack(self.predictions_blob)
+
+    @property
+    def time_slot(self):
+        try:
+            return json.loads(self.time_slot_info).get('time_slot') if self.time_slot_info else None
+        except (ValueError, AttributeError):
+            return None
+
+    def __str__(self):
+        return f"{self.session_id} ({self.student_count} students)"
+
+
 class AttendanceSubmission(models.Model):
     """Store final user-edited attendance submissions"""
     session_id = models.CharField(max_length=100)  # Links to prediction session
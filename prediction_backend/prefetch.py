@@ -0,0 +1,159 @@
+import os
+import sys
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class PrefetchScheduler:
+    """Warms galleries and rosters shortly before each TimeBlock starts.
+
+    Every `interval` seconds the scheduler looks for time blocks starting within
+    the next `lead_minutes`, finds today's Timetable entries in those blocks and
+    loads the matching galleries and section rosters into this process's caches,
+    so the burst of process-images requests at period start does not cold-load them.
+    """
+
+    def __init__(self, service, lead_minutes: float = 5, interval: float = 60):
+        self.service = service
+        self.lead = timedelta(minutes=lead_minutes)
+        self.interval = interval
+        self._warmed_blocks = set()  # (date, time_block_id)
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.last_run = None
+        self.last_error = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="gallery-prefetch", daemon=True)
+        self._thread.start()
+        logger.info(f"⏰ Gallery prefetch scheduler started (lead {self.lead}, every {self.interval:.0f}s)")
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"❌ Gallery prefetch failed: {e}")
+            finally:
+                close_old_connections()
+            self._stop.wait(self.interval)
+
+    def upcoming_blocks(self, now: datetime):
+        """TimeBlocks starting between now and now + lead (blocks don't span midnight)"""
+        from core.models import TimeBlock
+
+        horizon = now + self.lead
+        if horizon.date() != now.date():
+            horizon = now.replace(hour=23, minute=59, second=59)
+        return list(TimeBlock.objects.filter(
+            start_time__gte=now.time(), start_time__lte=horizon.time()
+        ))
+
+    def targets_for_block(self, block, day):
+        """(dept_name, batch_year, section_name) for classes scheduled in a block"""
+        from core.models import Batch, Timetable
+
+        entries = Timetable.objects.filter(
+            date=day, start_time__lt=block.end_time, end_time__gt=block.start_time,
+        ).select_related('section__batch__dept')
+        if block.batch_year:
+            entries = entries.filter(section__batch__batch_year=block.batch_year)
+        targets = {
+            (entry.section.batch.dept.dept_name, entry.section.batch.batch_year, entry.section.section_name)
+            for entry in entries
+        }
+        if targets:
+            return targets
+
+        # No timetable for today: warm every department of the block's batch(es)
+        batches = Batch.objects.select_related('dept')
+        if block.batch_year:
+            batches = batches.filter(batch_year=block.batch_year)
+        return {(batch.dept.dept_name, batch.batch_year, None) for batch in batches}
+
+    def run_once(self, now: datetime = None) -> int:
+        """Warm everything needed for the upcoming blocks; returns how many blocks were warmed"""
+        now = now or timezone.localtime()
+        self.runs += 1
+        self.last_run = now
+        blocks = [block for block in self.upcoming_blocks(now)
+                  if (now.date(), block.time_block_id) not in self._warmed_blocks]
+        if not blocks:
+            return 0
+
+        self.service.initialize()
+        for block in blocks:
+            targets = self.targets_for_block(block, now.date())
+            galleries = set()
+            for dept_name, batch_year, section_name in targets:
+                if (dept_name, batch_year) not in galleries:
+                    galleries.add((dept_name, batch_year))
+                    self.service.load_gallery(dept_name, batch_year, record_access=False)
+                    self.service.mark_prefetched('gallery', f"gallery_{dept_name}_{batch_year}")
+                self.service.get_roster(dept_name, batch_year, section_name, record_access=False)
+                self.service.mark_prefetched('roster', (dept_name, int(batch_year), section_name))
+            self._warmed_blocks.add((now.date(), block.time_block_id))
+            logger.info(f"🔥 Prefetched {len(galleries)} galleries and {len(targets)} rosters for block "
+                        f"{block.block_number} ({block.start_time})")
+
+        # Forget blocks from previous days
+        self._warmed_blocks = {key for key in self._warmed_blocks if key[0] == now.date()}
+        return len(blocks)
+
+    def status(self):
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'lead_minutes': self.lead.total_seconds() / 60,
+            'interval_seconds': self.interval,
+            'runs': self.runs,
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+            'last_error': self.last_error,
+            'blocks_warmed_today': len(self._warmed_blocks),
+        }
+
+
+_scheduler = None
+
+
+def get_scheduler():
+    return _scheduler
+
+
+def should_start_scheduler(argv=None, setting='PREDICTION_PREFETCH_ENABLED', default=False) -> bool:
+    """Only in serving processes: not for migrations, tests or other management commands"""
+    if not getattr(settings, setting, default):
+        return False
+    argv = argv if argv is not None else sys.argv
+    if argv and os.path.basename(argv[0]) == 'manage.py':
+        # runserver's autoreloader parent sets no RUN_MAIN; only the child serves requests
+        return len(argv) > 1 and argv[1] == 'runserver' and (
+            os.environ.get('RUN_MAIN') == 'true' or '--noreload' in argv
+        )
+    return True
+
+
+def start_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        from .services import prediction_service
+        _scheduler = PrefetchScheduler(
+            prediction_service,
+            lead_minutes=float(getattr(settings, 'PREDICTION_PREFETCH_LEAD_MINUTES', 5)),
+            interval=float(getattr(settings, 'PREDICTION_PREFETCH_INTERVAL_SECONDS', 60)),
+        )
+    _scheduler.start()
+    return _scheduler
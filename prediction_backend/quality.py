@@ -0,0 +1,123 @@
+import hashlib
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+
+class FaceQualityGate:
+    """Vectorized quality check run between YOLO detection and LightCNN embedding.
+
+    Every box in an image is scored at once on size, blur (variance of the
+    Laplacian), aspect ratio and detector confidence. The Laplacian is computed
+    once for the whole image and per-box variances come from integral images,
+    so scoring costs the same whether there are 2 faces or 200.
+    """
+
+    REASONS = ('too_small', 'blurry', 'bad_aspect_ratio', 'low_confidence')
+
+    def __init__(self, min_size: int = 24, min_sharpness: float = 30.0,
+                 min_aspect_ratio: float = 0.45, max_aspect_ratio: float = 1.6,
+                 min_confidence: float = 0.35, enabled: bool = True):
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.min_aspect_ratio = min_aspect_ratio
+        self.max_aspect_ratio = max_aspect_ratio
+        self.min_confidence = min_confidence
+        self.enabled = enabled
+
+    @classmethod
+    def from_settings(cls):
+        from django.conf import settings
+        return cls(
+            min_size=int(getattr(settings, 'PREDICTION_QUALITY_MIN_FACE_SIZE', 24)),
+            min_sharpness=float(getattr(settings, 'PREDICTION_QUALITY_MIN_SHARPNESS', 30.0)),
+            min_aspect_ratio=float(getattr(settings, 'PREDICTION_QUALITY_MIN_ASPECT_RATIO', 0.45)),
+            max_aspect_ratio=float(getattr(settings, 'PREDICTION_QUALITY_MAX_ASPECT_RATIO', 1.6)),
+            min_confidence=float(getattr(settings, 'PREDICTION_QUALITY_MIN_CONFIDENCE', 0.35)),
+            enabled=getattr(settings, 'PREDICTION_QUALITY_GATE_ENABLED', True),
+        )
+
+    @property
+    def version(self) -> str:
+        """Short fingerprint of the thresholds, used to keep cached results consistent"""
+        if not self.enabled:
+            return "off"
+        config = f"{self.min_size}|{self.min_sharpness}|{self.min_aspect_ratio}|{self.max_aspect_ratio}|{self.min_confidence}"
+        return hashlib.sha256(config.encode('utf-8')).hexdigest()[:8]
+
+    @staticmethod
+    def sharpness(gray_img: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+        """Laplacian variance inside each (x1, y1, x2, y2) box of a grayscale image"""
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        if len(boxes) == 0:
+            return np.zeros(0, dtype=np.float64)
+
+        laplacian = cv2.Laplacian(gray_img, cv2.CV_64F)
+        total, squared = cv2.integral2(laplacian, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+
+        x1, y1, x2, y2 = boxes.T
+
+        def box_sum(table):
+            return table[y2, x2] - table[y1, x2] - table[y2, x1] + table[y1, x1]
+
+        area = np.maximum((x2 - x1) * (y2 - y1), 1).astype(np.float64)
+        mean = box_sum(total) / area
+        return np.maximum(box_sum(squared) / area - mean ** 2, 0.0)
+
+    def score(self, gray_img: np.ndarray, boxes: np.ndarray, confidences: np.ndarray) -> Dict[str, np.ndarray]:
+        """Compute the quality metrics for every box"""
+        height, width = gray_img.shape[:2]
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4).copy()
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height)
+
+        box_w = (boxes[:, 2] - boxes[:, 0]).astype(np.float64)
+        box_h = (boxes[:, 3] - boxes[:, 1]).astype(np.float64)
+        return {
+            'size': np.minimum(box_w, box_h),
+            'aspect_ratio': box_w / np.maximum(box_h, 1.0),
+            'sharpness': self.sharpness(gray_img, boxes),
+            'confidence': np.asarray(confidences, dtype=np.float64).reshape(-1),
+        }
+
+    def evaluate(self, gray_img: np.ndarray, boxes: np.ndarray, confidences: np.ndarray,
+                 metrics: Dict[str, np.ndarray] = None) -> Tuple[np.ndarray, List[Dict]]:
+        """Return (keep mask, skipped faces) where each skipped face lists why it was dropped.
+
+        Pass the result of score() as `metrics` when the caller already has it.
+        """
+        boxes = np.asarray(boxes).reshape(-1, 4)
+        if not self.enabled or len(boxes) == 0:
+            return np.ones(len(boxes), dtype=bool), []
+
+        if metrics is None:
+            metrics = self.score(gray_img, boxes, confidences)
+        failures = np.stack([
+            metrics['size'] < self.min_size,
+            metrics['sharpness'] < self.min_sharpness,
+            (metrics['aspect_ratio'] < self.min_aspect_ratio) | (metrics['aspect_ratio'] > self.max_aspect_ratio),
+            metrics['confidence'] < self.min_confidence,
+        ], axis=1)
+        keep = ~failures.any(axis=1)
+
+        skipped = []
+        for index in np.flatnonzero(~keep):
+            skipped.append({
+                'coords': [int(c) for c in boxes[index]],
+                'reasons': [reason for reason, failed in zip(self.REASONS, failures[index]) if failed],
+                'size': float(metrics['size'][index]),
+                'sharpness': round(float(metrics['sharpness'][index]), 2),
+                'aspect_ratio': round(float(metrics['aspect_ratio'][index]), 3),
+                'confidence': round(float(metrics['confidence'][index]), 3),
+            })
+        return keep, skipped
+
+    @classmethod
+    def summarize(cls, skipped: List[Dict]) -> Dict[str, int]:
+        """Count skipped faces per reason"""
+        counts = {reason: 0 for reason in cls.REASONS}
+        for face in skipped:
+            for reason in face['reasons']:
+                counts[reason] += 1
+        return counts
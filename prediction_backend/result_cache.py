@@ -0,0 +1,143 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class RecognitionResultCache:
+    """Size-bounded on-disk LRU of per-image detection results.
+
+    Entries are keyed by the SHA-256 of the raw image bytes plus the model and
+    gallery versions, and hold the face boxes and embeddings for that image (and
+    the faces the quality gate skipped) so a resubmitted photo only has to be
+    matched against the current gallery.
+    """
+
+    FILE_SUFFIX = '.npz'
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._current_bytes = None  # Lazily computed from the directory contents
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(image_bytes: bytes, model_version: str, gallery_version: str) -> str:
+        """Build the cache key for an image under the given model and gallery versions"""
+        return RecognitionResultCache.make_key_for_digest(
+            hashlib.sha256(image_bytes).hexdigest(), model_version, gallery_version
+        )
+
+    @staticmethod
+    def make_key_for_digest(image_digest: str, model_version: str, gallery_version: str) -> str:
+        """Same as make_key when the SHA-256 of the image bytes is already known"""
+        version_digest = hashlib.sha256(f"{model_version}|{gallery_version}".encode('utf-8')).hexdigest()[:16]
+        return f"{image_digest}-{version_digest}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + self.FILE_SUFFIX)
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray, List[Dict]]]:
+        """Return (boxes, embeddings, skipped faces) for a key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                boxes = data['boxes']
+                embeddings = data['embeddings']
+                skipped = json.loads(str(data['skipped'])) if 'skipped' in data.files else []
+            # Touch the entry so eviction treats it as recently used
+            os.utime(path, None)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️  Discarding unreadable recognition cache entry {path}: {e}")
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return boxes, embeddings, skipped
+
+    def put(self, key: str, boxes: np.ndarray, embeddings: np.ndarray, skipped: List[Dict] = None):
+        """Store the boxes and embeddings for a key and evict old entries if over budget"""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, boxes=np.asarray(boxes, dtype=np.int32),
+                         embeddings=np.asarray(embeddings, dtype=np.float32),
+                         skipped=np.array(json.dumps(skipped or [])))
+            entry_size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"⚠️  Could not write recognition cache entry {path}: {e}")
+            self._remove(tmp_path)
+            return
+
+        with self._lock:
+            if self._current_bytes is None:
+                self._current_bytes = self._scan_size()
+            else:
+                self._current_bytes += entry_size
+            if self._current_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan_entries(self):
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(self.FILE_SUFFIX):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _mtime, size, _path in self._scan_entries())
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under 90% of its budget"""
+        entries = sorted(self._scan_entries())
+        total = sum(size for _mtime, size, _path in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for _mtime, size, path in entries:
+            if total <= target:
+                break
+            self._remove(path)
+            total -= size
+            removed += 1
+        self._current_bytes = total
+        if removed:
+            logger.info(f"🗑️  Evicted {removed} recognition cache entries ({total / (1024 * 1024):.1f} MB kept)")
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size_bytes': self._current_bytes,
+            'max_bytes': self.max_bytes,
+        }
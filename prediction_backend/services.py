@@ -2,6 +2,7 @@ import os
 import json
 import uuid
 import base64
+import hashlib
 import logging
 import asyncio
 import concurrent.futures
@@ -11,8 +12,8 @@ import numpy as np
 import cv2
 import torch
 import torchvision.transforms as transforms
+from torchvision.ops import nms
 from PIL import Image
-from scipy.spatial.distance import cosine
 from ultralytics import YOLO
 from pathlib import Path
 import pickle
@@ -22,9 +23,16 @@ import time
 # Django imports
 from django.conf import settings
 from django.core.cache import cache
+from core import rosters
 from core.models import Student, Department, Batch, Section
 from asgiref.sync import sync_to_async
 
+from .gallery import GALLERY_DTYPES, GalleryMatrix, GalleryStore, compact_gallery
+from .decode import DecodedImage
+from .quality import FaceQualityGate
+from .result_cache import RecognitionResultCache
+from .tracking import IoUTracker, crop_quality
+
 # Import the LightCNN model
 try:
     from prediction_backend.LightCNN.light_cnn import LightCNN_29Layers_v2
@@ -76,7 +84,15 @@ class PredictionService:
         self.initialized = False
         self._init_lock = threading.Lock()
         self._gallery_cache = {}
+        self._gallery_versions = {}
+        self._gallery_states = {}
+        self._prefetched = set()  # Gallery/roster keys warmed by the prefetch scheduler, not yet used
+        self._cache_stats = defaultdict(int)
+        self._stats_lock = threading.Lock()
         self._gallery_lock = threading.RLock()
+        self.model_version = ""
+        self._result_cache = None
+        self.quality_gate = FaceQualityGate.from_settings()
         
         logger.info("🚀 PredictionService instance created")
         
@@ -145,6 +161,9 @@ class PredictionService:
                     ])
                     logger.info("🔄 Image transforms initialized")
                     
+                    self.model_version = self._compute_model_version([model_path, yolo_path])
+                    logger.info(f"🏷️  Model version: {self.model_version}")
+                    
                     self.initialized = True
                     logger.info("🎉 PredictionService initialized successfully")
             
@@ -153,23 +172,96 @@ class PredictionService:
                 logger.exception("Full exception details:")
                 self.initialized = False
 
-    def load_gallery(self, department_name: str, batch_year: int, section_names: List[str] = None) -> Dict[str, np.ndarray]:
-        """Load student gallery embeddings from .pth files with thread-safe caching"""
+    @staticmethod
+    def _file_fingerprint(path: str) -> str:
+        """Cheap identity of a file on disk (path, size and modification time)"""
+        try:
+            stat = os.stat(path)
+            return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+        except OSError:
+            return f"{path}:missing"
+
+    def _compute_model_version(self, model_paths: List[str]) -> str:
+        """Version string covering the detector/embedder weights and preprocessing"""
+        parts = [self._file_fingerprint(path) for path in model_paths]
+        parts.append(repr(self.transform))
+        return hashlib.sha256("|".join(parts).encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def _gallery_state_version(state: Dict) -> str:
+        """Version of a loaded gallery: base file identity plus how much of the delta log was applied"""
+        return f"{state['base']}+{state['log']}:{state['offset']}"
+
+    def gallery_version(self, gallery_keys) -> str:
+        """Version string for a set of loaded galleries (see load_gallery)"""
+        with self._gallery_lock:
+            return "|".join(self._gallery_versions.get(key, f"{key}:missing") for key in sorted(gallery_keys))
+
+    def _get_result_cache(self) -> Optional[RecognitionResultCache]:
+        """Return the on-disk recognition result cache, or None when disabled"""
+        if not getattr(settings, 'PREDICTION_RESULT_CACHE_ENABLED', True):
+            return None
+        if self._result_cache is None:
+            cache_dir = str(getattr(settings, 'PREDICTION_RESULT_CACHE_DIR', os.path.join('cache', 'recognition')))
+            max_bytes = int(getattr(settings, 'PREDICTION_RESULT_CACHE_MAX_MB', 256)) * 1024 * 1024
+            self._result_cache = RecognitionResultCache(cache_dir, max_bytes)
+            logger.info(f"💾 Recognition result cache at {cache_dir} (max {max_bytes // (1024 * 1024)} MB)")
+        return self._result_cache
+
+    def result_cache_key(self, image_digest: str, tiling: Optional[Dict], gallery_version: str) -> str:
+        """Recognition cache key for an image under the current model, quality gate, tiling and gallery"""
+        # The quality gate and tiling decide which faces get embedded, so they are part of the key
+        tiling_version = json.dumps(tiling, sort_keys=True) if tiling else ""
+        return RecognitionResultCache.make_key_for_digest(
+            image_digest, f"{self.model_version}|{self.quality_gate.version}|{tiling_version}", gallery_version
+        )
+
+    @property
+    def gallery_dtype(self) -> str:
+        """Storage dtype of cached galleries (PREDICTION_GALLERY_DTYPE); matching always accumulates in float32"""
+        dtype = getattr(settings, 'PREDICTION_GALLERY_DTYPE', 'float32')
+        if dtype not in GALLERY_DTYPES:
+            logger.warning(f"⚠️  Unsupported PREDICTION_GALLERY_DTYPE {dtype!r}, using float32")
+            return 'float32'
+        return dtype
+
+    def load_gallery(self, department_name: str, batch_year: int, section_names: List[str] = None,
+                     record_access: bool = True) -> Dict[str, np.ndarray]:
+        """Load student gallery embeddings from .pth files with thread-safe caching.
+        
+        record_access=False is used by the prefetch scheduler so warming does not count as a hit.
+        """
         try:
             logger.info(f"📚 Loading gallery for dept: {department_name}, batch: {batch_year}, sections: {section_names}")
             
             # Create cache key based on department and batch
             cache_key = f"gallery_{department_name}_{batch_year}"
             
-            # Try to get from cache first (thread-safe)
+            store = GalleryStore(department_name, batch_year)
+            gallery_path = store.base_path
+            
+            # Try to get from cache first (thread-safe), picking up any new delta records
             with self._gallery_lock:
-                if cache_key in self._gallery_cache:
-                    gallery = self._gallery_cache[cache_key]
+                cached = self._gallery_cache.get(cache_key)
+                state = self._gallery_states.get(cache_key)
+            if cached is not None:
+                gallery, new_state = store.sync(cached, state)
+                if gallery is not None:
+                    if gallery is not cached:
+                        compact_gallery(gallery, self.gallery_dtype)
+                    with self._gallery_lock:
+                        if gallery is not cached:
+                            logger.info(f"🔄 Applied gallery deltas for {department_name}_{batch_year} ({len(gallery)} students)")
+                        self._gallery_cache[cache_key] = gallery
+                        self._gallery_states[cache_key] = new_state
+                        self._gallery_versions[cache_key] = self._gallery_state_version(new_state)
                     logger.info(f"💾 Loaded gallery from cache for {department_name}_{batch_year} with {len(gallery)} students")
+                    if record_access:
+                        self._record_cache_access('gallery', cache_key, hit=True)
                     return self._filter_gallery_by_sections(gallery, department_name, batch_year, section_names)
+                logger.info(f"🔄 Gallery base file for {department_name}_{batch_year} changed, reloading")
             
             # Load from file system
-            gallery_path = f"gallery/gallery_{department_name}_{batch_year}.pth"
             abs_gallery_path = os.path.abspath(gallery_path)
             logger.info(f"🔍 Attempting to load gallery from: {gallery_path} (abs: {abs_gallery_path})")
             
@@ -181,55 +273,24 @@ class PredictionService:
             else:
                 logger.debug(f"🔍 DEBUG - Gallery directory {gallery_dir} does not exist")
             
-            logger.debug(f"🔍 DEBUG - Looking for gallery file: gallery_{department_name}_{batch_year}.pth")
-            logger.debug(f"🔍 DEBUG - Department name requested: '{department_name}'")
-            logger.debug(f"🔍 DEBUG - Batch year requested: '{batch_year}'")
-            logger.debug(f"🔍 DEBUG - Expected full filename: 'gallery_{department_name}_{batch_year}.pth'")
-            
-            if not Path(abs_gallery_path).exists():
+            if not Path(abs_gallery_path).exists() and not os.path.exists(store.log_path):
                 logger.warning(f"⚠️  Gallery file {gallery_path} not found (abs: {abs_gallery_path})")
                 return {}
             
-            # Load gallery data
+            if record_access:
+                self._record_cache_access('gallery', cache_key, hit=False)
+            
+            # Load base file and merge the delta log
             with TimedLogger(logger, f"Gallery loading from {gallery_path}"):
                 logger.info(f"📄 Loading gallery data from {gallery_path} (abs: {abs_gallery_path})")
-                # Try safe loading first: allowlist numpy reconstruct and ndarray
-                try:
-                    try:
-                        from numpy._core import multiarray as _multiarray
-                        torch.serialization.add_safe_globals([_multiarray._reconstruct, np.ndarray])
-                        logger.debug("Added numpy._core.multiarray._reconstruct and numpy.ndarray to torch safe globals")
-                    except Exception as ge:
-                        logger.debug(f"Could not add safe globals: {ge}")
-                    gallery_data = torch.load(gallery_path, map_location='cpu')
-                except Exception as e:
-                    logger.warning(
-                        "Safe torch.load failed, falling back to weights_only=False as the gallery file is trusted: %s",
-                        e,
-                    )
-                    try:
-                        gallery_data = torch.load(abs_gallery_path, map_location='cpu', weights_only=False)
-                    except TypeError:
-                        gallery_data = torch.load(abs_gallery_path, map_location='cpu')
-            
-                # Handle np.ndarray or tensor values
-                gallery = {}
-                for k, v in gallery_data.items():
-                    # Convert keys to integers like test_detection.py
-                    try:
-                        idx = int(k)
-                    except Exception:
-                        idx = k  # fallback to string label
-                    if isinstance(v, np.ndarray):
-                        gallery[idx] = v
-                    elif isinstance(v, torch.Tensor):
-                        gallery[idx] = v.cpu().numpy()
-                    else:
-                        logger.warning(f"⚠️  Skipping invalid embedding for {k}: {type(v)}")
+                gallery, state = store.load()
+                compact_gallery(gallery, self.gallery_dtype)
             
             # Cache the gallery (thread-safe)
             with self._gallery_lock:
                 self._gallery_cache[cache_key] = gallery
+                self._gallery_states[cache_key] = state
+                self._gallery_versions[cache_key] = self._gallery_state_version(state)
                 
             logger.info(f"✅ Loaded gallery {gallery_path} with {len(gallery)} identities")
             
@@ -277,6 +338,7 @@ class PredictionService:
             
         # Process sections data to get combined gallery and student lists
         combined_gallery = {}
+        gallery_keys = set()
         all_section_students = set()
         
         logger.info(f"📋 Processing {len(sections_data) if sections_data else 0} section groups")
@@ -293,18 +355,13 @@ class PredictionService:
                     # Load gallery for this department/batch/sections via sync_to_async
                     gallery = await sync_to_async(self.load_gallery)(dept_name, batch_year, section_names)
                     combined_gallery.update(gallery)
+                    gallery_keys.add(f"gallery_{dept_name}_{batch_year}")
                     logger.info(f"📚 Added {len(gallery)} embeddings to combined gallery")
                     
                     # Get students for these sections using sync_to_async
                     for section_name in section_names:
                         try:
-                            student_list = await sync_to_async(list)(
-                                Student.objects.filter(
-                                    section__section_name=section_name,
-                                    section__batch__batch_year=batch_year,
-                                    section__batch__dept__dept_name=dept_name
-                                ).values_list('student_regno', flat=True)
-                            )
+                            student_list = await sync_to_async(self.get_roster)(dept_name, batch_year, section_name)
                             all_section_students.update(student_list)
                             logger.info(f"👥 Added {len(student_list)} students from section {section_name}")
                         except Exception as e:
@@ -315,24 +372,51 @@ class PredictionService:
         return await loop.run_in_executor(
             self.executor,
             self._process_image_sync,
-            image_bytes, threshold, combined_gallery, all_section_students
+            image_bytes, threshold, combined_gallery, all_section_students,
+            self.gallery_version(gallery_keys)
         )
     
-    def process_image_sync(self, image_bytes: bytes, threshold: float = 0.45, 
-                          sections_data: List[Dict] = None) -> Tuple[str, List[Dict]]:
-        """Synchronous wrapper for image processing with support for multiple sections"""
-        logger.info(f"🖼️  Starting sync image processing (threshold: {threshold})")
-        
-        if not self.initialized:
-            logger.info("🔧 Service not initialized, initializing now...")
-            self.initialize()
-            
-        if not self.face_model or not self.yolo_model:
-            logger.warning("⚠️  Models not available, returning empty results")
-            return None, []
-            
+    def get_roster(self, department_name: str, batch_year: int, section_name: Optional[str] = None,
+                   record_access: bool = True) -> List[str]:
+        """Register numbers of a section (or of the whole department/batch) from the shared roster cache"""
+        key = (department_name, int(batch_year), section_name)
+        roster = rosters.cached_roster(department_name, batch_year, section_name)
+        if record_access:
+            self._record_cache_access('roster', key, hit=roster is not None)
+        if roster is None:
+            roster = rosters.get_roster(department_name, batch_year, section_name)
+        return [regno for regno, _name, _section_id in roster]
+
+    def mark_prefetched(self, kind: str, key):
+        with self._stats_lock:
+            self._prefetched.add((kind, key))
+            self._cache_stats[f'{kind}_prefetched'] += 1
+
+    def _record_cache_access(self, kind: str, key, hit: bool):
+        with self._stats_lock:
+            self._cache_stats[f'{kind}_{"hits" if hit else "misses"}'] += 1
+            if (kind, key) in self._prefetched:
+                # First request for something the scheduler warmed
+                self._prefetched.discard((kind, key))
+                self._cache_stats[f'{kind}_prefetch_used'] += 1
+
+    def cache_stats(self) -> Dict:
+        """Gallery/roster cache hit rates and how many prefetched entries were used"""
+        with self._stats_lock:
+            stats = dict(self._cache_stats)
+            pending = len(self._prefetched)
+        for kind in ('gallery', 'roster'):
+            hits, misses = stats.get(f'{kind}_hits', 0), stats.get(f'{kind}_misses', 0)
+            stats[f'{kind}_hit_rate'] = round(hits / (hits + misses), 4) if hits + misses else None
+        stats['prefetched_unused'] = pending
+        return stats
+
+    def _prepare_gallery(self, sections_data: List[Dict] = None) -> Tuple[GalleryMatrix, Set[str], Set[str]]:
+        """Load the combined gallery and roster for the requested sections (synchronous)"""
         # Process sections data to get combined gallery and student lists
         combined_gallery = {}
+        gallery_sources = {}  # identity -> (department, batch) of the gallery it came from
+        gallery_keys = set()
         all_section_students = set()
         
         logger.info(f"📋 Processing {len(sections_data) if sections_data else 0} section groups")
@@ -349,18 +433,14 @@ class PredictionService:
                     # Load gallery for this department/batch/sections synchronously
                     gallery = self.load_gallery(dept_name, batch_year, section_names)
                     combined_gallery.update(gallery)
+                    gallery_sources.update(dict.fromkeys(gallery, (dept_name, batch_year)))
+                    gallery_keys.add(f"gallery_{dept_name}_{batch_year}")
                     logger.info(f"📚 Added {len(gallery)} embeddings to combined gallery")
                     
                     # Get students for these sections synchronously
                     for section_name in section_names:
                         try:
-                            student_list = list(
-                                Student.objects.filter(
-                                    section__section_name=section_name,
-                                    section__batch__batch_year=batch_year,
-                                    section__batch__dept__dept_name=dept_name
-                                ).values_list('student_regno', flat=True)
-                            )
+                            student_list = self.get_roster(dept_name, batch_year, section_name)
                             all_section_students.update(student_list)
                             logger.info(f"👥 Added {len(student_list)} students from section {section_name}")
                         except Exception as e:
@@ -375,36 +455,92 @@ class PredictionService:
                 logger.info(f"📂 Loading all students for {dept_name} {batch_year}")
                 gallery = self.load_gallery(dept_name, batch_year, [])
                 combined_gallery.update(gallery)
+                gallery_sources.update(dict.fromkeys(gallery, (dept_name, batch_year)))
+                gallery_keys.add(f"gallery_{dept_name}_{batch_year}")
                 
                 try:
-                    student_list = list(
-                        Student.objects.filter(
-                            section__batch__batch_year=batch_year,
-                            section__batch__dept__dept_name=dept_name
-                        ).values_list('student_regno', flat=True)
-                    )
+                    student_list = self.get_roster(dept_name, batch_year)
                     all_section_students.update(student_list)
                     logger.info(f"👥 Added {len(student_list)} students from all sections")
                 except Exception as e:
                     logger.error(f"❌ Error fetching all students: {e}")
         
+        gallery = GalleryMatrix.from_gallery(combined_gallery, gallery_sources, dtype=self.gallery_dtype)
+        return gallery, gallery_keys, all_section_students
+
+    def process_image_sync(self, image_bytes: bytes, threshold: float = 0.45, 
+                          sections_data: List[Dict] = None) -> Tuple[str, List[Dict]]:
+        """Synchronous wrapper for image processing with support for multiple sections"""
+        result = self.process_image_detailed(image_bytes, threshold, sections_data)
+        return result['image'], result['students']
+        
+    def process_image_detailed(self, image_bytes: Optional[bytes], threshold: float = 0.45,
+                               sections_data: List[Dict] = None, room: Optional[str] = None,
+                               decoded: Optional[DecodedImage] = None) -> Dict:
+        """Like process_image_sync, but also returns the per-image face quality report.
+        
+        `room` selects a tiled-detection profile from PREDICTION_TILING_PROFILES.
+        `decoded` is an image already decoded by the decode pool, used instead of image_bytes.
+        """
+        logger.info(f"🖼️  Starting sync image processing (threshold: {threshold})")
+        
+        if not self.initialized:
+            logger.info("🔧 Service not initialized, initializing now...")
+            self.initialize()
+            
+        if not self.face_model or not self.yolo_model:
+            logger.warning("⚠️  Models not available, returning empty results")
+            return self._empty_result()
+            
+        combined_gallery, gallery_keys, all_section_students = self._prepare_gallery(sections_data)
+        
         # Call the synchronous processing method directly
-        return self._process_image_sync(image_bytes, threshold, combined_gallery, all_section_students)
+        return self._process_image_detailed(image_bytes, threshold, combined_gallery, all_section_students,
+                                            self.gallery_version(gallery_keys), self.get_tiling_profile(room),
+                                            decoded)
+        
+    @staticmethod
+    def _empty_result() -> Dict:
+        return {
+            'image': None,
+            'students': [],
+            'faces_detected': 0,
+            'faces_skipped': 0,
+            'skip_reasons': FaceQualityGate.summarize([]),
+            'skipped_faces': [],
+            'boxes': np.zeros((0, 4), dtype=np.int32),
+            'embeddings': np.zeros((0, 256), dtype=np.float32),
+        }
         
     def _process_image_sync(self, image_bytes: bytes, threshold: float, 
-                           gallery: Dict[str, np.ndarray], section_students: Set[str]) -> Tuple[str, List[Dict]]:
+                           gallery: Dict[str, np.ndarray], section_students: Set[str],
+                           gallery_version: str = "") -> Tuple[str, List[Dict]]:
         """Synchronous image processing logic based on temp_main.py"""
+        result = self._process_image_detailed(image_bytes, threshold, gallery, section_students, gallery_version)
+        return result['image'], result['students']
+        
+    def _process_image_detailed(self, image_bytes: Optional[bytes], threshold: float,
+                                gallery: Dict[str, np.ndarray], section_students: Set[str],
+                                gallery_version: str = "", tiling: Optional[Dict] = None,
+                                decoded: Optional[DecodedImage] = None) -> Dict:
+        """Detect, quality-gate, embed and match the faces in one image"""
         try:
             with TimedLogger(logger, "Image processing"):
                 logger.info(f"🔍 Starting image processing with threshold {threshold}")
                 logger.info(f"📚 Gallery size: {len(gallery)} students")
                 logger.info(f"👥 Section students: {len(section_students)} students")
                 
-                # Decode image
-                nparr = np.frombuffer(image_bytes, np.uint8)
-                img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                if img is None:
-                    raise ValueError("Could not decode image")
+                # Decode image (unless the decode pool already did, together with the grayscale copy)
+                if decoded is not None:
+                    if decoded.error:
+                        raise ValueError(decoded.error)
+                    img, gray_img, image_digest = decoded.image, decoded.gray, decoded.digest
+                else:
+                    nparr = np.frombuffer(image_bytes, np.uint8)
+                    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                    if img is None:
+                        raise ValueError("Could not decode image")
+                    gray_img, image_digest = None, hashlib.sha256(image_bytes).hexdigest()
                 
                 logger.info(f"📸 Image decoded: {img.shape[1]}x{img.shape[0]} pixels")
                     
@@ -412,96 +548,24 @@ class PredictionService:
                 detected_students = []
                 detected_ids = set()
                 
-                # Detect faces using YOLO
-                logger.info("🔍 Running YOLO face detection...")
-                results = self.yolo_model(img)
-                total_faces = len(results[0].boxes) if results and len(results) > 0 else 0
-                logger.info(f"👤 YOLO detected {total_faces} faces")
+                # Reuse boxes and embeddings from an earlier submission of the same image bytes
+                result_cache = self._get_result_cache()
+                cache_key = None
+                cached = None
+                if result_cache is not None:
+                    cache_key = self.result_cache_key(image_digest, tiling, gallery_version)
+                    cached = result_cache.get(cache_key)
                 
-                # Step 1: Get all faces and their embeddings
-                faces_data = []
-                valid_faces = 0
-                
-                for result in results:
-                    for i, box in enumerate(result.boxes):
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        
-                        # Crop and preprocess face (no padding like test_detection.py)
-                        face = img[y1:y2, x1:x2]
-                        if face.size == 0:
-                            logger.warning(f"⚠️  Empty face crop at {x1},{y1},{x2},{y2}")
-                            continue
-                        
-                        valid_faces += 1
-                        logger.debug(f"🔄 Processing face {valid_faces}: {x2-x1}x{y2-y1} pixels")
-                        
-                        # Convert to grayscale and process like test_detection.py
-                        gray_face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
-                        face_pil = Image.fromarray(gray_face)
-                        face_tensor = self.transform(face_pil).unsqueeze(0).to(self.device)
-                        
-                        # First approach: Cosine similarity with gallery (like test_detection.py)
-                        with torch.no_grad():
-                            _, embedding = self.face_model(face_tensor)
-                            face_embedding = embedding.cpu().squeeze().numpy()
-                        
-                        # Cosine similarity with gallery (all)
-                        similarities = []
-                        gallery_indices = list(gallery.keys())
-                        for class_idx in gallery_indices:
-                            gallery_emb = gallery[class_idx]
-                            sim = 1 - cosine(face_embedding, gallery_emb)
-                            similarities.append((class_idx, sim))
-                        similarities.sort(key=lambda x: x[1], reverse=True)
-                        pred_class_cosine, best_sim = similarities[0] if similarities else ("Unknown", 0)
-                        
-                        # Log top 3 cosine similarities like test_detection.py
-                        top_n = 3
-                        logger.info(f"Face {valid_faces}: bbox=({x1},{y1},{x2},{y2}), predicted class index (cosine)={pred_class_cosine}, best similarity={best_sim:.4f}, embedding[:5]={face_embedding[:5]}")
-                        logger.info(f"  Top {top_n} cosine similarities:")
-                        for rank, (class_idx, sim) in enumerate(similarities[:top_n], 1):
-                            logger.info(f"    {rank}. class {class_idx}: {sim:.4f}")
-                        
-                        faces_data.append({
-                            'coords': (x1, y1, x2, y2),
-                            'embedding': face_embedding,
-                            'best_match': pred_class_cosine,
-                            'best_score': best_sim
-                        })
-                        
-                        # Second approach: Softmax probabilities (duplicate processing like test_detection.py)
-                        # This duplicates the face processing exactly like test_detection.py
-                        face = img[y1:y2, x1:x2]  # Re-crop face
-                        if face.size == 0:
-                            logger.info(f"Face {valid_faces}: empty crop, skipping.")
-                            continue
-                        gray_face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
-                        face_pil = Image.fromarray(gray_face)
-                        face_tensor = self.transform(face_pil).unsqueeze(0).to(self.device)
-                        
-                        with torch.no_grad():
-                            logits, embedding = self.face_model(face_tensor)
-                            face_embedding = embedding.cpu().squeeze().numpy()
-                            probs = torch.softmax(logits, dim=1).cpu().numpy().squeeze()
-                            
-                            # Restrict to class indices like test_detection.py
-                            class_start = 0
-                            class_end = 111
-                            restricted_probs = probs[class_start : class_end + 1]
-                            restricted_indices = np.arange(class_start, class_end + 1)
-                            pred_idx_in_restricted = int(np.argmax(restricted_probs))
-                            pred_class_softmax = int(restricted_indices[pred_idx_in_restricted])
-                        
-                        # Print softmax results like test_detection.py
-                        top_indices_in_restricted = np.argsort(restricted_probs)[::-1][:top_n]
-                        logger.info(f"Face {valid_faces}: bbox=({x1},{y1},{x2},{y2}), predicted class index (restricted)={pred_class_softmax}, embedding[:5]={face_embedding[:5]}")
-                        logger.info(f"  Top {top_n} classes in [{class_start}-{class_end}]:")
-                        for rank, idx_in_restricted in enumerate(top_indices_in_restricted, 1):
-                            class_idx = int(restricted_indices[idx_in_restricted])
-                            prob = restricted_probs[idx_in_restricted]
-                            logger.info(f"    {rank}. class {class_idx}: {prob:.4f}")
+                if cached is not None:
+                    boxes, embeddings, skipped_faces = cached
+                    logger.info(f"💾 Recognition cache hit: reusing {len(boxes)} faces, skipping detection and embedding")
+                else:
+                    boxes, embeddings, skipped_faces = self._detect_and_embed(img, tiling, gray_img)
+                    if result_cache is not None:
+                        result_cache.put(cache_key, boxes, embeddings, skipped_faces)
                 
-                logger.info(f"🎯 Processed {valid_faces} valid faces from {total_faces} detected faces")
+                faces_data = self._match_faces(boxes, embeddings, gallery)
+                self._self_update_gallery(gallery, faces_data)
                 
                 # Simple assignment like test_detection.py (no duplicate prevention)
                 logger.info("🎯 Drawing results like test_detection.py...")
@@ -530,17 +594,468 @@ class PredictionService:
                         except Exception as e:
                             logger.warning(f"⚠️  Could not add student {best_match}: {e}")
                     
+                # Faces dropped by the quality gate are outlined in red
+                for face in skipped_faces:
+                    x1, y1, x2, y2 = face['coords']
+                    cv2.rectangle(result_img, (x1, y1), (x2, y2), (0, 0, 255), 1)
+                    
                 # Encode result image
                 _, buffer = cv2.imencode('.jpg', result_img)
                 img_base64 = base64.b64encode(buffer).decode('utf-8')
                 
                 logger.info(f"🎉 Image processing complete: detected {len(detected_students)} students from {len(faces_data)} faces")
-                return img_base64, detected_students
+                return {
+                    'image': img_base64,
+                    'students': detected_students,
+                    'faces_detected': len(faces_data) + len(skipped_faces),
+                    'faces_skipped': len(skipped_faces),
+                    'skip_reasons': FaceQualityGate.summarize(skipped_faces),
+                    'skipped_faces': skipped_faces,
+                    'boxes': boxes,
+                    'embeddings': embeddings,
+                }
             
         except Exception as e:
             logger.error(f"❌ Error processing image: {e}")
             logger.exception("Image processing exception details:")
-            return None, []
+            return self._empty_result()
+
+    def rematch_embeddings(self, embeddings: np.ndarray, threshold: float = 0.45,
+                           sections_data: List[Dict] = None) -> Dict[str, Dict]:
+        """Re-score stored session embeddings against the current gallery.
+        
+        Returns {register_number: {register_number, name, confidence}} for the faces
+        scoring above the threshold, keeping each student's best face.
+        """
+        gallery, _gallery_keys, _students = self._prepare_gallery(sections_data)
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, 256)
+        detected = {}
+        if len(gallery) == 0 or len(embeddings) == 0:
+            return detected
+        
+        scores = gallery.scores(embeddings)
+        best = scores.argmax(axis=1)
+        best_scores = scores[np.arange(len(best)), best]
+        for identity_index, score in zip(best[best_scores > threshold], best_scores[best_scores > threshold]):
+            register_number = str(gallery.ids[identity_index])
+            if register_number not in detected or score > detected[register_number]['confidence']:
+                detected[register_number] = {
+                    'register_number': register_number,
+                    'name': f'Student_{register_number}',
+                    'confidence': float(score),
+                }
+        logger.info(f"🔁 Re-matched {len(embeddings)} stored faces at threshold {threshold}: {len(detected)} students")
+        return detected
+
+    def get_tiling_profile(self, room: Optional[str] = None) -> Optional[Dict]:
+        """Tiled-detection settings for a room, or None to run YOLO on the whole image"""
+        profiles = getattr(settings, 'PREDICTION_TILING_PROFILES', {}) or {}
+        profile = profiles.get(room) if room else None
+        if profile is None:
+            profile = profiles.get('default')
+        if not profile:
+            return None
+        return {
+            'tile_size': int(profile.get('tile_size', 1280)),
+            'overlap': float(profile.get('overlap', 0.25)),
+            'batch_size': int(profile.get('batch_size', 8)),
+            'include_full_frame': bool(profile.get('include_full_frame', True)),
+            'nms_iou': float(profile.get('nms_iou', 0.5)),
+        }
+
+    @staticmethod
+    def _tile_origins(length: int, tile_size: int, stride: int) -> List[int]:
+        """Start offsets of overlapping tiles covering [0, length), the last one flush with the edge"""
+        if length <= tile_size:
+            return [0]
+        origins = list(range(0, length - tile_size, stride))
+        origins.append(length - tile_size)
+        return origins
+
+    @staticmethod
+    def _result_boxes(result) -> Tuple[np.ndarray, np.ndarray]:
+        if result is None or len(result.boxes) == 0:
+            return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32)
+        return (result.boxes.xyxy.cpu().numpy().astype(np.float32),
+                result.boxes.conf.cpu().numpy().astype(np.float32))
+
+    @staticmethod
+    def _merge_detections(boxes: np.ndarray, confidences: np.ndarray, iou_threshold: float) -> np.ndarray:
+        """Indices of the boxes kept after NMS across tiles.
+        
+        Plain NMS misses the partial face a tile cuts at its edge, so a box mostly
+        contained in a higher-confidence box is also dropped.
+        """
+        keep = nms(torch.from_numpy(boxes), torch.from_numpy(confidences), iou_threshold).numpy()
+        boxes = boxes[keep]
+        x1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+        y1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+        x2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+        y2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+        intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+        areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+        # keep is sorted by confidence, so only look at higher-confidence boxes (earlier rows)
+        contained = np.triu(intersection / np.maximum(areas[None, :], 1e-6) > 0.8, k=1).any(axis=0)
+        return keep[~contained]
+
+    def _detect_faces(self, img: np.ndarray, tiling: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Run YOLO on an image, returning (boxes as int32 xyxy, confidences).
+        
+        With a tiling profile a large image is split into overlapping tiles that are
+        detected in batches, so small back-row faces are seen closer to YOLO's native
+        resolution; the per-tile boxes are then merged with NMS.
+        """
+        height, width = img.shape[:2]
+        if not tiling or max(height, width) <= tiling['tile_size']:
+            results = self.yolo_model(img)
+            boxes, confidences = self._result_boxes(results[0] if results else None)
+        else:
+            tile_size = tiling['tile_size']
+            stride = max(1, int(tile_size * (1 - tiling['overlap'])))
+            offsets = [(x, y) for y in self._tile_origins(height, tile_size, stride)
+                       for x in self._tile_origins(width, tile_size, stride)]
+            tiles = [img[y:y + tile_size, x:x + tile_size] for x, y in offsets]
+            logger.info(f"🧩 Tiled detection: {len(tiles)} tiles of {tile_size}px ({tiling['overlap']:.0%} overlap) over {width}x{height}")
+            
+            all_boxes, all_confidences = [], []
+            if tiling['include_full_frame']:
+                # Large, close-up faces can span several tiles
+                full_boxes, full_confidences = self._result_boxes(self.yolo_model(img, verbose=False)[0])
+                all_boxes.append(full_boxes)
+                all_confidences.append(full_confidences)
+            
+            batch_size = max(1, tiling['batch_size'])
+            for start in range(0, len(tiles), batch_size):
+                # A list input runs as one batched forward pass
+                results = self.yolo_model(tiles[start:start + batch_size], verbose=False)
+                for result, (x, y) in zip(results, offsets[start:start + batch_size]):
+                    tile_boxes, tile_confidences = self._result_boxes(result)
+                    all_boxes.append(tile_boxes + np.array([x, y, x, y], dtype=np.float32))
+                    all_confidences.append(tile_confidences)
+            
+            boxes = np.concatenate(all_boxes)
+            confidences = np.concatenate(all_confidences)
+            if len(boxes):
+                keep = self._merge_detections(boxes, confidences, tiling['nms_iou'])
+                logger.info(f"🧩 Merged {len(boxes)} tile detections into {len(keep)} faces")
+                boxes, confidences = boxes[keep], confidences[keep]
+        
+        boxes = boxes.astype(np.int32).reshape(-1, 4)
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height)
+        return boxes, confidences
+
+    def _detect_and_embed(self, img: np.ndarray, tiling: Optional[Dict] = None,
+                          gray_img: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, List[Dict]]:
+        """Run YOLO detection, the face quality gate and LightCNN embedding.
+        
+        Returns (boxes, embeddings) for the faces that passed the gate, plus the skipped faces.
+        """
+        # Detect faces using YOLO (tiled for large wide-angle photos when a profile is given)
+        detected_boxes, confidences = self._detect_faces(img, tiling)
+        total_faces = len(detected_boxes)
+        logger.info(f"👤 YOLO detected {total_faces} faces")
+        
+        boxes = []
+        embeddings = []
+        top_n = 3
+        if gray_img is None:
+            gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        
+        # Score every box at once and only embed the usable ones
+        keep, skipped_faces = self.quality_gate.evaluate(gray_img, detected_boxes, confidences)
+        for face in skipped_faces:
+            logger.info(f"🚫 Skipping face at {face['coords']}: {', '.join(face['reasons'])}")
+        
+        for x1, y1, x2, y2 in detected_boxes[keep]:
+            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+
+            # Crop and preprocess face (no padding like test_detection.py)
+            face = img[y1:y2, x1:x2]
+            if face.size == 0:
+                logger.warning(f"⚠️  Empty face crop at {x1},{y1},{x2},{y2}")
+                continue
+
+            logger.debug(f"🔄 Processing face {len(boxes) + 1}: {x2-x1}x{y2-y1} pixels")
+
+            # Grayscale crop like test_detection.py (the image was already converted for the gate)
+            gray_face = gray_img[y1:y2, x1:x2]
+            face_pil = Image.fromarray(gray_face)
+            face_tensor = self.transform(face_pil).unsqueeze(0).to(self.device)
+
+            # One forward pass gives both the embedding (for cosine matching) and the
+            # logits (for the softmax diagnostics that test_detection.py prints)
+            with torch.no_grad():
+                logits, embedding = self.face_model(face_tensor)
+                face_embedding = embedding.cpu().squeeze().numpy()
+                probs = torch.softmax(logits, dim=1).cpu().numpy().squeeze()
+
+            # Restrict to class indices like test_detection.py
+            class_start = 0
+            class_end = 111
+            restricted_probs = probs[class_start : class_end + 1]
+            restricted_indices = np.arange(class_start, class_end + 1)
+            pred_idx_in_restricted = int(np.argmax(restricted_probs))
+            pred_class_softmax = int(restricted_indices[pred_idx_in_restricted])
+
+            # Print softmax results like test_detection.py
+            top_indices_in_restricted = np.argsort(restricted_probs)[::-1][:top_n]
+            logger.info(f"Face {len(boxes) + 1}: bbox=({x1},{y1},{x2},{y2}), predicted class index (restricted)={pred_class_softmax}, embedding[:5]={face_embedding[:5]}")
+            logger.info(f"  Top {top_n} classes in [{class_start}-{class_end}]:")
+            for rank, idx_in_restricted in enumerate(top_indices_in_restricted, 1):
+                class_idx = int(restricted_indices[idx_in_restricted])
+                prob = restricted_probs[idx_in_restricted]
+                logger.info(f"    {rank}. class {class_idx}: {prob:.4f}")
+
+            boxes.append((x1, y1, x2, y2))
+            embeddings.append(face_embedding)
+
+        logger.info(f"🎯 Processed {len(boxes)} valid faces from {total_faces} detected faces ({len(skipped_faces)} skipped by quality gate)")
+        
+        if not boxes:
+            return np.zeros((0, 4), dtype=np.int32), np.zeros((0, 256), dtype=np.float32), skipped_faces
+        return np.asarray(boxes, dtype=np.int32), np.stack(embeddings).astype(np.float32), skipped_faces
+
+    def _match_faces(self, boxes: np.ndarray, embeddings: np.ndarray, gallery) -> List[Dict]:
+        """Match face embeddings against the gallery with cosine similarity.
+        
+        All faces are scored in one matmul against every template, then each identity
+        takes the max over its own templates (see GalleryMatrix).
+        """
+        if not isinstance(gallery, GalleryMatrix):
+            gallery = GalleryMatrix.from_gallery(gallery)
+        
+        faces_data = []
+        top_n = 3
+        scores = gallery.scores(embeddings)
+        
+        for face_number, (coords, face_embedding) in enumerate(zip(boxes, embeddings), 1):
+            x1, y1, x2, y2 = (int(c) for c in coords)
+            face_scores = scores[face_number - 1]
+            ranked = np.argsort(face_scores)[::-1][:top_n]
+            if len(ranked):
+                pred_class_cosine, best_sim = gallery.ids[ranked[0]], float(face_scores[ranked[0]])
+            else:
+                pred_class_cosine, best_sim = "Unknown", 0.0
+            second_sim = float(face_scores[ranked[1]]) if len(ranked) > 1 else 0.0
+            
+            # Log top 3 cosine similarities like test_detection.py
+            logger.info(f"Face {face_number}: bbox=({x1},{y1},{x2},{y2}), predicted class index (cosine)={pred_class_cosine}, best similarity={best_sim:.4f}")
+            logger.info(f"  Top {top_n} cosine similarities:")
+            for rank, identity_index in enumerate(ranked, 1):
+                logger.info(f"    {rank}. class {gallery.ids[identity_index]}: {face_scores[identity_index]:.4f}")
+            
+            faces_data.append({
+                'coords': (x1, y1, x2, y2),
+                'embedding': face_embedding,
+                'best_match': pred_class_cosine,
+                'best_score': best_sim,
+                'second_score': second_sim,
+            })
+        
+        return faces_data
+
+    def _self_update_gallery(self, gallery, faces_data: List[Dict]) -> int:
+        """Add confidently matched live faces as extra templates (PREDICTION_GALLERY_SELF_UPDATE).
+        
+        Only unambiguous matches (high score and a clear margin over the runner-up) that
+        are not near-duplicates of an existing template are kept; returns how many were added.
+        """
+        if not getattr(settings, 'PREDICTION_GALLERY_SELF_UPDATE', False) or not isinstance(gallery, GalleryMatrix):
+            return 0
+        min_score = float(getattr(settings, 'PREDICTION_GALLERY_SELF_UPDATE_MIN_SCORE', 0.75))
+        min_margin = float(getattr(settings, 'PREDICTION_GALLERY_SELF_UPDATE_MIN_MARGIN', 0.1))
+        max_templates = int(getattr(settings, 'PREDICTION_GALLERY_MAX_TEMPLATES', 5))
+        
+        added = 0
+        updated_ids = set()
+        for face in faces_data:
+            identity = face['best_match']
+            if (identity == "Unknown" or identity in updated_ids or face['best_score'] < min_score
+                    or face['best_score'] - face['second_score'] < min_margin):
+                continue
+            source = gallery.source_of(identity)
+            if source is None:
+                continue
+            embedding = np.asarray(face['embedding'], dtype=np.float32)
+            embedding = embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+            if float((gallery.templates_of(identity) @ embedding).max()) > 0.95:
+                continue  # Already well covered by an existing template
+            try:
+                GalleryStore(*source).add_template(identity, embedding, max_templates)
+                updated_ids.add(identity)
+                added += 1
+            except Exception as e:
+                logger.warning(f"⚠️  Could not add live template for {identity}: {e}")
+        
+        if added:
+            logger.info(f"🧬 Added {added} live templates to the gallery")
+        return added
+            
+    def _embed_crops(self, gray_crops: List[np.ndarray], batch_size: int = 32) -> np.ndarray:
+        """Embed grayscale face crops with LightCNN in batches, returning an (N, 256) array"""
+        if not gray_crops:
+            return np.zeros((0, 256), dtype=np.float32)
+        
+        embeddings = []
+        for start in range(0, len(gray_crops), batch_size):
+            batch = torch.stack([
+                self.transform(Image.fromarray(crop)) for crop in gray_crops[start:start + batch_size]
+            ]).to(self.device)
+            with torch.no_grad():
+                _, embedding = self.face_model(batch)
+            embeddings.append(embedding.cpu().numpy())
+        return np.concatenate(embeddings).astype(np.float32)
+
+    @staticmethod
+    def iter_video_frames(video_path: str, sample_fps: float, max_frames: int):
+        """Yield (frame_index, frame) for frames sampled from a video at roughly sample_fps"""
+        capture = cv2.VideoCapture(video_path)
+        if not capture.isOpened():
+            raise ValueError("Could not open video")
+        try:
+            native_fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+            step = max(1, int(round(native_fps / max(sample_fps, 0.1))))
+            frame_index = 0
+            sampled = 0
+            # grab() skips decoding for frames we are not going to look at
+            while sampled < max_frames and capture.grab():
+                if frame_index % step == 0:
+                    ok, frame = capture.retrieve()
+                    if ok and frame is not None:
+                        yield frame_index, frame
+                        sampled += 1
+                frame_index += 1
+        finally:
+            capture.release()
+
+    @staticmethod
+    def iter_burst_frames(frames_bytes: List[bytes]):
+        """Yield (frame_index, frame) for a burst of still images"""
+        for frame_index, frame_bytes in enumerate(frames_bytes):
+            frame = cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                logger.warning(f"⚠️  Could not decode burst frame {frame_index + 1}, skipping")
+                continue
+            yield frame_index, frame
+
+    def process_video_sync(self, frames, threshold: float = 0.45, sections_data: List[Dict] = None,
+                           room: Optional[str] = None) -> Tuple[str, List[Dict], Dict]:
+        """Recognise students in a video or burst: detect on sampled frames, track faces and
+        embed each track only once or twice using its best-quality crops.
+        
+        `frames` is an iterable of (frame_index, BGR frame), see iter_video_frames/iter_burst_frames.
+        Returns (annotated key frame as base64, detected students, stats).
+        """
+        logger.info(f"🎞️  Starting video/burst processing (threshold: {threshold})")
+        stats = {'frames_sampled': 0, 'detections': 0, 'tracks': 0, 'embeddings_computed': 0,
+                 'faces_deferred': 0, 'skip_reasons': FaceQualityGate.summarize([])}
+        
+        if not self.initialized:
+            logger.info("🔧 Service not initialized, initializing now...")
+            self.initialize()
+            
+        if not self.face_model or not self.yolo_model:
+            logger.warning("⚠️  Models not available, returning empty results")
+            return None, [], stats
+        
+        combined_gallery, _gallery_keys, _section_students = self._prepare_gallery(sections_data)
+        tiling = self.get_tiling_profile(room)
+        
+        tracker = IoUTracker(
+            iou_threshold=float(getattr(settings, 'PREDICTION_TRACK_IOU_THRESHOLD', 0.3)),
+            max_age=int(getattr(settings, 'PREDICTION_TRACK_MAX_AGE', 3)),
+            min_hits=int(getattr(settings, 'PREDICTION_TRACK_MIN_HITS', 1)),
+            max_crops=int(getattr(settings, 'PREDICTION_TRACK_EMBEDDINGS', 2)),
+        )
+        key_frame = None
+        key_frame_tracks = []
+        
+        try:
+            with TimedLogger(logger, "Video/burst processing"):
+                for frame_index, frame in frames:
+                    stats['frames_sampled'] += 1
+                    boxes, confidences = self._detect_faces(frame, tiling)
+                    if len(boxes) == 0:
+                        tracker.update(frame_index, np.zeros((0, 4)))
+                        continue
+                    
+                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                    metrics = self.quality_gate.score(gray, boxes, confidences)
+                    qualities = crop_quality(metrics['size'], metrics['sharpness'], metrics['confidence'])
+                    
+                    # Faces failing the quality gate are still tracked, but their embedding is
+                    # deferred to a frame where the same face is usable
+                    keep, skipped = self.quality_gate.evaluate(gray, boxes, confidences, metrics=metrics)
+                    stats['faces_deferred'] += len(skipped)
+                    for reason, count in FaceQualityGate.summarize(skipped).items():
+                        stats['skip_reasons'][reason] += count
+                    
+                    crops = []
+                    for (x1, y1, x2, y2), usable in zip(boxes, keep):
+                        crop = gray[y1:y2, x1:x2]
+                        crops.append(crop if usable and crop.size else None)
+                    
+                    track_ids = tracker.update(frame_index, boxes, qualities, crops)
+                    stats['detections'] += len(boxes)
+                    
+                    # Keep the frame with the most faces as the annotated preview
+                    if len(track_ids) > len(key_frame_tracks):
+                        key_frame = frame
+                        key_frame_tracks = list(zip(track_ids, boxes))
+                
+                tracks = [track for track in tracker.confirmed_tracks() if track.best_crops]
+                stats['tracks'] = len(tracks)
+                logger.info(f"🧭 {stats['frames_sampled']} sampled frames, {stats['detections']} detections, {len(tracks)} tracks")
+                
+                # One batched LightCNN pass over the best crops of every track
+                crops = [crop for track in tracks for _q, _f, _b, crop in track.best_crops]
+                embeddings = self._embed_crops(crops)
+                stats['embeddings_computed'] = len(crops)
+                
+                track_embeddings = []
+                offset = 0
+                for track in tracks:
+                    count = len(track.best_crops)
+                    track_embedding = embeddings[offset:offset + count].mean(axis=0)
+                    track_embeddings.append(track_embedding)
+                    offset += count
+                
+                track_boxes = np.array([track.best_crops[0][2] for track in tracks], dtype=np.int32).reshape(-1, 4)
+                track_embeddings = np.array(track_embeddings, dtype=np.float32).reshape(-1, 256)
+                faces_data = self._match_faces(track_boxes, track_embeddings, combined_gallery)
+                self._self_update_gallery(combined_gallery, faces_data)
+                
+                detected = {}
+                labels = {}
+                for track, face in zip(tracks, faces_data):
+                    labels[track.track_id] = face['best_match']
+                    if face['best_match'] != "Unknown" and face['best_score'] > threshold:
+                        reg_num = str(face['best_match'])
+                        if reg_num not in detected or face['best_score'] > detected[reg_num]['confidence']:
+                            detected[reg_num] = {
+                                'register_number': reg_num,
+                                'name': f'Student_{reg_num}',
+                                'confidence': face['best_score'],
+                            }
+                
+                img_base64 = None
+                if key_frame is not None:
+                    result_img = key_frame.copy()
+                    for track_id, (x1, y1, x2, y2) in key_frame_tracks:
+                        label = labels.get(track_id, f"track {track_id}")
+                        cv2.rectangle(result_img, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
+                        cv2.putText(result_img, f"{label}", (int(x1), max(15, int(y1) - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                    _, buffer = cv2.imencode('.jpg', result_img)
+                    img_base64 = base64.b64encode(buffer).decode('utf-8')
+                
+                logger.info(f"🎉 Video processing complete: {len(detected)} students from {len(tracks)} tracks ({stats['embeddings_computed']} embeddings)")
+                return img_base64, list(detected.values()), stats
+        
+        except Exception as e:
+            logger.error(f"❌ Error processing video: {e}")
+            logger.exception("Video processing exception details:")
+            return None, [], stats
             
     async def _mock_process_image(self, image_bytes: bytes) -> Tuple[str, List[Dict]]:
         """Mock image processing for testing when models are not available"""
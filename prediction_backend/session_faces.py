@@ -0,0 +1,96 @@
+import os
+import re
+import json
+import time
+import logging
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,100}$')
+
+
+class SessionFaceStore:
+    """Detected face embeddings of each prediction session, kept for re-matching.
+
+    Every session gets `<session_id>.npy` holding its (N, 256) embeddings as float16
+    and `<session_id>.json` with the face boxes, the image each face came from and
+    the request parameters, so a session can be re-scored at another threshold or
+    section scope without running YOLO or LightCNN again.
+    """
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+
+    @classmethod
+    def from_settings(cls) -> Optional['SessionFaceStore']:
+        from django.conf import settings
+        if not getattr(settings, 'PREDICTION_SESSION_EMBEDDINGS_ENABLED', True):
+            return None
+        return cls(getattr(settings, 'PREDICTION_SESSION_EMBEDDINGS_DIR', os.path.join('cache', 'sessions')))
+
+    def _paths(self, session_id: str) -> Tuple[str, str]:
+        if not _SESSION_ID_RE.match(session_id or ''):
+            raise ValueError(f"Invalid session id: {session_id!r}")
+        base = os.path.join(self.base_dir, session_id)
+        return f"{base}.npy", f"{base}.json"
+
+    def exists(self, session_id: str) -> bool:
+        try:
+            return all(os.path.exists(path) for path in self._paths(session_id))
+        except ValueError:
+            return False
+
+    def save(self, session_id: str, embeddings: np.ndarray, boxes: np.ndarray,
+             image_indices: np.ndarray, meta: Dict) -> str:
+        """Write a session's faces; returns the embeddings path"""
+        npy_path, meta_path = self._paths(session_id)
+        os.makedirs(self.base_dir, exist_ok=True)
+
+        embeddings = np.asarray(embeddings, dtype=np.float16).reshape(-1, 256)
+        record = dict(meta)
+        record['boxes'] = np.asarray(boxes, dtype=np.int64).reshape(-1, 4).tolist()
+        record['image_indices'] = np.asarray(image_indices, dtype=np.int64).reshape(-1).tolist()
+        record['saved_at'] = time.time()
+
+        # Temp files are renamed into place so a concurrent rematch never reads half a session
+        tmp_npy = f"{npy_path}.tmp.npy"
+        np.save(tmp_npy, embeddings)
+        os.replace(tmp_npy, npy_path)
+        tmp_meta = f"{meta_path}.tmp"
+        with open(tmp_meta, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp_meta, meta_path)
+        return npy_path
+
+    def load(self, session_id: str) -> Optional[Tuple[np.ndarray, Dict]]:
+        """Return (float32 embeddings, metadata) for a session, or None if it was not saved"""
+        npy_path, meta_path = self._paths(session_id)
+        try:
+            embeddings = np.load(npy_path).astype(np.float32)
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        return embeddings, meta
+
+    def prune(self, max_age_hours: float) -> int:
+        """Delete sessions older than max_age_hours; returns how many files were removed"""
+        cutoff = time.time() - max_age_hours * 3600
+        removed = 0
+        try:
+            entries = list(os.scandir(self.base_dir))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError as e:
+                logger.warning(f"⚠️  Could not remove session file {entry.path}: {e}")
+        if removed:
+            logger.info(f"🗑️  Pruned {removed} old session embedding files")
+        return removed
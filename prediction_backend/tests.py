@@ -0,0 +1,496 @@
+import base64
+import fcntl
+import glob
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from multiprocessing import shared_memory
+from unittest import mock, skipUnless
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import timeblocks
+from core.models import Attendance, Batch, Department, Section, SectionAttendanceRollup, Student, Subject, TimeBlock
+from .decode import DecodePool
+from .gallery import GALLERY_DIR, GalleryMatrix, GalleryStore, as_float32, read_gallery_file, to_gallery_dtype
+from .janitor import SCHEDULER_LOCK_FILE, Janitor, JanitorScheduler
+from .models import AttendancePrediction, AttendanceSubmission, RecognitionSession
+from .quality import FaceQualityGate
+from .result_cache import RecognitionResultCache
+from .services import PredictionService, prediction_service
+from .session_faces import SessionFaceStore
+from .tracking import IoUTracker
+from .views import store_session_predictions
+
+GALLERY_FILES = sorted(glob.glob(os.path.join(settings.BASE_DIR, GALLERY_DIR, 'gallery_AIML_*.pth')))
+
+
+def temp_dir(test_case):
+    directory = tempfile.TemporaryDirectory()
+    test_case.addCleanup(directory.cleanup)
+    return directory.name
+
+
+class RecognitionResultCacheTestCase(TestCase):
+    def test_evicts_least_recently_used_entries(self):
+        """Over budget, the entries read or written longest ago go first"""
+        result_cache = RecognitionResultCache(temp_dir(self), max_bytes=10 ** 6)
+        boxes, embeddings = np.zeros((1, 4)), np.zeros((1, 256))
+        for key in ('aa-1', 'bb-1', 'cc-1'):
+            result_cache.put(key, boxes, embeddings)
+        for age, key in enumerate(('cc-1', 'bb-1', 'aa-1')):
+            os.utime(result_cache._path(key), (1000 + age, 1000 + age))
+        self.assertIsNotNone(result_cache.get('aa-1'))  # Now the most recently used
+
+        result_cache.max_bytes = int(os.path.getsize(result_cache._path('aa-1')) * 3.2)
+        result_cache.put('dd-1', boxes, embeddings)
+
+        kept = {key for key in ('aa-1', 'bb-1', 'cc-1', 'dd-1') if os.path.exists(result_cache._path(key))}
+        self.assertEqual(kept, {'aa-1', 'dd-1'})
+        self.assertIsNone(result_cache.get('cc-1'))
+        self.assertEqual(result_cache.stats()['hits'], 1)
+
+    def test_key_follows_model_gate_tiling_and_gallery(self):
+        service = PredictionService()
+        service.model_version = 'model-a'
+        digest = 'ab' * 32
+        key = service.result_cache_key(digest, None, 'gallery-1')
+        self.assertEqual(key, service.result_cache_key(digest, None, 'gallery-1'))
+        self.assertTrue(key.startswith(digest))
+
+        keys = {key, service.result_cache_key(digest, None, 'gallery-2'),
+                service.result_cache_key(digest, {'tile_size': 1280, 'overlap': 0.25}, 'gallery-1')}
+        service.model_version = 'model-b'
+        keys.add(service.result_cache_key(digest, None, 'gallery-1'))
+        service.quality_gate = FaceQualityGate(min_size=40)
+        keys.add(service.result_cache_key(digest, None, 'gallery-1'))
+        service.quality_gate = FaceQualityGate(enabled=False)
+        keys.add(service.result_cache_key(digest, None, 'gallery-1'))
+        self.assertEqual(len(keys), 6)
+
+
+class IoUTrackerTestCase(TestCase):
+    def test_faces_keep_their_track_across_frames(self):
+        tracker = IoUTracker(iou_threshold=0.3, max_age=2, min_hits=2)
+        first = tracker.update(0, [[100, 100, 160, 160], [400, 100, 460, 160]])
+        for frame_index in range(1, 4):
+            shift = 4 * frame_index
+            # Listed in the opposite order: association is by overlap, not position in the list
+            ids = tracker.update(frame_index, [[400 + shift, 100, 460 + shift, 160], [100 + shift, 100, 160 + shift, 160]])
+            self.assertEqual(ids, first[::-1])
+        self.assertEqual(len(tracker.active), 2)
+        self.assertEqual({track.hits for track in tracker.confirmed_tracks()}, {4})
+
+    def test_unmatched_tracks_expire_after_max_age(self):
+        tracker = IoUTracker(iou_threshold=0.3, max_age=2, min_hits=2)
+        kept, dropped = tracker.update(0, [[100, 100, 160, 160], [400, 100, 460, 160]])
+        for frame_index in range(1, 4):
+            self.assertEqual(tracker.update(frame_index, [[100, 100, 160, 160]]), [kept])
+        self.assertEqual([track.track_id for track in tracker.active], [kept])
+        self.assertEqual([track.track_id for track in tracker.finished], [dropped])
+        # A face seen in a single frame is never confirmed
+        self.assertEqual([track.track_id for track in tracker.confirmed_tracks()], [kept])
+
+        self.assertNotIn(dropped, tracker.update(4, [[400, 100, 460, 160]]))
+
+
+class FaceQualityGateTestCase(TestCase):
+    def test_each_failing_face_lists_its_reasons(self):
+        gray = np.zeros((200, 400), dtype=np.uint8)
+        gray[:, :200] = np.random.default_rng(0).integers(0, 255, (200, 200), dtype=np.uint8)  # Sharp texture
+        boxes = np.array([
+            [10, 10, 90, 90],      # Sharp and large enough
+            [250, 10, 330, 90],    # Flat: blurry
+            [100, 10, 110, 20],    # Too small
+            [10, 100, 190, 150],   # Far wider than tall: a turned or cropped face
+            [100, 100, 180, 180],  # Low detector confidence
+        ])
+        confidences = np.array([0.9, 0.9, 0.9, 0.9, 0.1])
+        gate = FaceQualityGate()
+
+        keep, skipped = gate.evaluate(gray, boxes, confidences)
+        self.assertEqual(keep.tolist(), [True, False, False, False, False])
+        self.assertEqual([face['reasons'] for face in skipped],
+                         [['blurry'], ['too_small'], ['bad_aspect_ratio'], ['low_confidence']])
+        self.assertEqual(skipped[0]['coords'], [250, 10, 330, 90])
+
+        # Precomputed metrics give the same decision
+        reused = gate.evaluate(gray, boxes, confidences, metrics=gate.score(gray, boxes, confidences))
+        self.assertEqual(reused[0].tolist(), keep.tolist())
+        self.assertTrue(FaceQualityGate(enabled=False).evaluate(gray, boxes, confidences)[0].all())
+
+
+class TiledDetectionTestCase(TestCase):
+    def test_tiles_cover_the_image_with_the_last_flush_to_the_edge(self):
+        self.assertEqual(PredictionService._tile_origins(1000, 1280, 960), [0])
+        self.assertEqual(PredictionService._tile_origins(3000, 1280, 960), [0, 960, 1720])
+        self.assertEqual(PredictionService._tile_origins(2240, 1280, 960), [0, 960])
+
+    def test_merge_drops_overlapping_and_contained_boxes(self):
+        boxes = np.array([
+            [0, 0, 100, 100],      # Kept
+            [5, 5, 105, 105],      # Same face from a neighbouring tile: removed by NMS
+            [0, 0, 50, 90],        # Half a face cut at a tile edge: IoU 0.45, but inside the first box
+            [500, 500, 600, 600],  # Another face
+        ], dtype=np.float32)
+        confidences = np.array([0.9, 0.8, 0.7, 0.6], dtype=np.float32)
+        self.assertEqual(PredictionService._merge_detections(boxes, confidences, 0.5).tolist(), [0, 3])
+        # Containment is only checked against more confident boxes
+        confidences[2] = 0.95
+        self.assertEqual(sorted(PredictionService._merge_detections(boxes, confidences, 0.5).tolist()), [0, 2, 3])
+
+
+class GalleryStoreTestCase(TestCase):
+    def test_deltas_sync_and_survive_compaction(self):
+        store = GalleryStore('AIML', 2027, gallery_dir=temp_dir(self))
+        rng = np.random.default_rng(0)
+        first, second, third = rng.normal(size=(3, 256)).astype(np.float32)
+        store.put(71001, first)
+        store.put(71002, second)
+
+        gallery, state = store.load()
+        self.assertEqual(set(gallery), {71001, 71002})
+        np.testing.assert_array_equal(gallery[71001], first)
+
+        stale_state = state
+        store.remove(71001)
+        updated, state = store.sync(gallery, state)
+        self.assertEqual(set(updated), {71002})
+        self.assertIn(71001, gallery)  # Copy-on-write: the old dict is untouched
+
+        self.assertEqual(store.compact(), 3)
+        self.assertEqual(store.pending_count(), 0)
+        self.assertEqual(set(read_gallery_file(store.base_path)), {'71002'})
+        # A reader that had applied everything carries on from the checkpoint...
+        synced, state = store.sync(updated, state)
+        self.assertIs(synced, updated)
+        # ...one that had not must reload
+        self.assertIsNone(store.sync(gallery, stale_state)[0])
+
+        store.put(71003, third)
+        synced, state = store.sync(synced, state)
+        self.assertEqual(set(synced), {71002, 71003})
+        reloaded, _state = store.load()
+        self.assertEqual(set(reloaded), {71002, 71003})
+        np.testing.assert_array_equal(reloaded[71003], third)
+
+
+class GalleryMatrixTestCase(TestCase):
+    def test_identity_score_is_its_best_template(self):
+        rng = np.random.default_rng(0)
+        templates = {'a': rng.normal(size=(3, 256)), 'b': rng.normal(size=256), 'c': rng.normal(size=(2, 256))}
+        matrix = GalleryMatrix.from_gallery(templates)
+        self.assertEqual(matrix.counts.tolist(), [3, 1, 2])
+        self.assertEqual(matrix.starts.tolist(), [0, 3, 4])
+
+        queries = rng.normal(size=(4, 256)).astype(np.float32)
+        queries[0] = templates['a'][2]
+        queries[1] = templates['c'][1]
+        scores = matrix.scores(queries)
+
+        def normalize(vectors):
+            vectors = np.atleast_2d(vectors)
+            return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        expected = np.stack([(normalize(queries) @ normalize(templates[i]).T).max(axis=1) for i in 'abc'], axis=1)
+        np.testing.assert_allclose(scores, expected, atol=1e-5)
+        self.assertEqual(scores[:2].argmax(axis=1).tolist(), [0, 2])
+
+    def test_live_templates_are_capped_keeping_the_enrolled_one(self):
+        store = GalleryStore('AIML', 2027, gallery_dir=temp_dir(self))
+        enrolled, *live = np.eye(5, 256, dtype=np.float32)
+        store.put(71001, enrolled)
+        for template in live:
+            store.add_template(71001, template, max_templates=3)
+        store.add_template(71009, live[0], max_templates=3)  # Unknown identity: ignored
+
+        gallery, _state = store.load()
+        self.assertEqual(set(gallery), {71001})
+        np.testing.assert_array_equal(gallery[71001], np.stack([enrolled, live[2], live[3]]))
+
+    def test_live_templates_never_replace_enrolled_ones(self):
+        store = GalleryStore('AIML', 2027, gallery_dir=temp_dir(self))
+        templates = np.eye(8, 256, dtype=np.float32)
+        enrolled, live = templates[:3], templates[3:]
+        store.put(71001, enrolled)
+        store.add_template(71001, live[0], max_templates=3)  # Enrolled templates fill every slot
+        gallery, state = store.load()
+        np.testing.assert_array_equal(gallery[71001], enrolled)
+
+        store.add_template(71001, live[1], max_templates=4)
+        store.add_template(71001, live[2], max_templates=4)
+        gallery, state = store.sync(gallery, state)
+        np.testing.assert_array_equal(gallery[71001], np.concatenate([enrolled, live[2:3]]))
+
+        # The enrolled count survives compaction into the base file
+        store.compact()
+        store.add_template(71001, live[3], max_templates=4)
+        gallery, state = store.sync(gallery, state)
+        np.testing.assert_array_equal(gallery[71001], np.concatenate([enrolled, live[3:4]]))
+        store.compact()
+        store.add_template(71001, live[4], max_templates=4)
+        reloaded, _state = store.load()
+        np.testing.assert_array_equal(reloaded[71001], np.concatenate([enrolled, live[4:5]]))
+        self.assertEqual(set(read_gallery_file(store.base_path)), {'71001'})
+
+        # Re-enrolling makes every template enrolled again
+        store.put(71001, templates[:4])
+        store.add_template(71001, live[4], max_templates=4)
+        np.testing.assert_array_equal(store.load()[0][71001], templates[:4])
+
+
+class DecodePoolTestCase(TestCase):
+    @staticmethod
+    def _images(sizes):
+        """Base64 PNGs, each filled with its own position so results can be told apart"""
+        return [
+            base64.b64encode(cv2.imencode('.png', np.full((height, width, 3), i, dtype=np.uint8))[1].tobytes()).decode()
+            for i, (height, width) in enumerate(sizes)
+        ]
+
+    @staticmethod
+    def _blocks():
+        return {name for name in os.listdir('/dev/shm') if name.startswith('psm_')}
+
+    def test_results_keep_input_order_and_free_shared_memory(self):
+        pool = DecodePool(workers=2, prefetch=1)
+        self.addCleanup(pool.shutdown)
+        sizes = [(400, 300), (20, 10), (200, 150), (60, 80), (90, 30)]
+        images = self._images(sizes)
+        images[2] = base64.b64encode(b'not an image').decode()
+
+        names = []
+        for expected_index, result in enumerate(pool.imap(images)):
+            self.assertEqual(result.index, expected_index)
+            if expected_index == 2:
+                self.assertEqual(result.error, "Could not decode image")
+                continue
+            self.assertEqual(result.image.shape, (*sizes[expected_index], 3))
+            self.assertEqual(result.gray[0, 0], expected_index)
+            names.append(result._shm.name)
+            result.release()
+            self.assertIsNone(result.image)
+
+        self.assertEqual(len(names), 4)
+        for name in names:
+            with self.assertRaises(FileNotFoundError):
+                shared_memory.SharedMemory(name=name)
+
+    @skipUnless(os.path.isdir('/dev/shm'), "needs /dev/shm to list shared memory blocks")
+    def test_stopping_early_frees_decoded_images(self):
+        pool = DecodePool(workers=2, prefetch=2)
+        self.addCleanup(pool.shutdown)
+        before = self._blocks()
+        results = pool.imap(self._images([(100, 100)] * 6))
+        next(results).release()
+        results.close()
+        self.assertEqual(self._blocks() - before, set())
+
+
+class HalfPrecisionGalleryTestCase(TestCase):
+    def test_bfloat16_round_trip(self):
+        """bfloat16 keeps the float32 exponent and ~3 significant digits"""
+        values = np.array([1.0, -2.5, 153.0, 1e-3, 0.1], dtype=np.float32)
+        stored = to_gallery_dtype(values, 'bfloat16')
+        self.assertEqual(stored.dtype, np.uint16)
+        np.testing.assert_allclose(as_float32(stored), values, rtol=2 ** -8)
+
+    @skipUnless(GALLERY_FILES, "no gallery_AIML_*.pth files")
+    def test_half_precision_matches_float32(self):
+        """float16/bfloat16 galleries give the same decisions as float32 on the shipped galleries"""
+        rng = np.random.default_rng(0)
+        for path in GALLERY_FILES:
+            gallery = read_gallery_file(path)
+            enrolled = np.stack([as_float32(v).reshape(-1) for v in gallery.values()])
+            # Live captures: enrolled embeddings with noise as large as the embeddings themselves
+            queries = enrolled + rng.normal(0, enrolled.std(), enrolled.shape).astype(np.float32)
+
+            reference_matrix = GalleryMatrix.from_gallery(gallery)
+            reference = reference_matrix.scores(queries)
+            for dtype, tolerance in (('float16', 1e-3), ('bfloat16', 5e-3)):
+                matrix = GalleryMatrix.from_gallery(gallery, dtype=dtype)
+                matrix.BLOCK_ROWS = 16  # Exercise the blockwise upcast
+                scores = matrix.scores(queries)
+
+                self.assertEqual(scores.dtype, np.float32)
+                self.assertEqual(matrix.nbytes * 2, reference_matrix.nbytes)
+                np.testing.assert_allclose(scores, reference, atol=tolerance)
+                np.testing.assert_array_equal(scores.argmax(axis=1), reference.argmax(axis=1))
+                np.testing.assert_array_equal(scores > 0.45, reference > 0.45)
+
+
+class PredictionSessionTestCase(TestCase):
+    """A batch with one section, a subject and a time block; _session stores a prediction session"""
+
+    def setUp(self):
+        cache.clear()
+        dept = Department.objects.create(dept_id=1, dept_name='AIML')
+        self.batch = Batch.objects.create(dept=dept, batch_year=2027)
+        self.section = Section.objects.create(batch=self.batch, section_name='A')
+        self.subject = Subject.objects.create(subject_code='AI301', subject_name='Deep Learning', batch=self.batch)
+        TimeBlock.objects.create(batch_year=2027, block_number=1, start_time='09:00', end_time='09:50')
+        timeblocks.get_index()  # Built once per process, not per submission
+        self.dept = dept
+
+    def _session(self, session_id, students):
+        for i in range(students):
+            Student.objects.get_or_create(
+                student_regno=f'71{i:03d}',
+                defaults=dict(name=f'Student {i}', department=self.dept, batch=self.batch, section=self.section),
+            )
+        store_session_predictions(
+            session_id, self.subject, [{"section_names": ['A']}], 'AIML', 2027,
+            {f'71{i:03d}': {"confidence": 0.9} for i in range(0, students, 2)}, time_slot=1,
+        )
+        return [{"register_number": f'71{i:03d}', "is_present": i % 3 == 0} for i in range(students)]
+
+
+class SubmitAttendanceTestCase(PredictionSessionTestCase):
+    def _submit(self, session_id, attendance):
+        return self.client.post(
+            reverse('prediction_backend:submit_attendance'),
+            json.dumps({"session_id": session_id, "attendance": attendance}),
+            content_type='application/json',
+        )
+
+    def test_query_count_does_not_grow_with_class_size(self):
+        """Submissions and attendance rows are written with a fixed number of queries"""
+        query_counts = []
+        for session_id, students in (('small', 5), ('large', 60)):
+            attendance = self._session(session_id, students)
+            Attendance.objects.all().delete()
+            with CaptureQueriesContext(connection) as queries:
+                response = self._submit(session_id, attendance)
+            query_counts.append(len(queries))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["submissions_count"], students)
+            self.assertEqual(response.json()["attendance_records_created"], students)
+            self.assertEqual(AttendanceSubmission.objects.filter(session_id=session_id).count(), students)
+        self.assertEqual(query_counts[0], query_counts[1])
+
+        present = set(Attendance.objects.filter(is_present=True).values_list('student_id', flat=True))
+        self.assertEqual(present, {f'71{i:03d}' for i in range(60) if i % 3 == 0})
+        self.assertEqual(
+            list(SectionAttendanceRollup.objects.values_list('present', 'total')), [(len(present), 60)]
+        )
+
+    def test_duplicate_submission_is_rejected(self):
+        attendance = self._session('once', 4)
+        self.assertEqual(self._submit('once', attendance).status_code, 200)
+        self.assertEqual(self._submit('once', attendance).status_code, 409)
+        self.assertEqual(Attendance.objects.count(), 4)
+
+    def test_racing_submission_updates_the_rows_already_written(self):
+        """A submit that passed the duplicate check before another one committed upserts instead of failing"""
+        self._submit('first', self._session('first', 4))
+        attendance = [dict(row, is_present=True) for row in self._session('second', 4)]
+        with mock.patch('django.db.models.query.QuerySet.count', return_value=0):  # Both passed the check
+            response = self._submit('second', attendance)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["attendance_records_updated"], 4)
+        self.assertEqual(response.json()["attendance_records_created"], 0)
+        self.assertEqual(list(Attendance.objects.values_list('is_present', flat=True)), [True] * 4)
+
+
+class RematchSessionTestCase(PredictionSessionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.store = SessionFaceStore(temp_dir(self))
+        override = override_settings(PREDICTION_SESSION_EMBEDDINGS_DIR=self.store.base_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_save_and_load_round_trip(self):
+        embeddings = np.random.default_rng(0).normal(size=(3, 256)).astype(np.float32)
+        self.store.save('s1', embeddings, [[0, 0, 10, 10]] * 3, [0, 0, 1], {'threshold': 0.5})
+
+        loaded, meta = self.store.load('s1')
+        self.assertEqual(loaded.dtype, np.float32)
+        np.testing.assert_allclose(loaded, embeddings, rtol=1e-3, atol=1e-3)  # Stored as float16
+        self.assertEqual(meta['image_indices'], [0, 0, 1])
+        self.assertEqual(meta['threshold'], 0.5)
+        self.assertIsNone(self.store.load('missing'))
+        with self.assertRaises(ValueError):
+            self.store.load('../escape')
+
+    def test_rematch_rescores_stored_faces(self):
+        self._session('stored', 4)
+        templates = np.eye(5, 256, dtype=np.float32)
+        gallery = GalleryMatrix([f'71{i:03d}' for i in range(4)], list(templates[:4, None]))
+        # Two clear faces and one scoring 0.6 against 71000 (the rest of it is nobody in the gallery)
+        faces = np.stack([templates[1], templates[3], 0.6 * templates[0] + 0.8 * templates[4]])
+        self.store.save('stored', faces, [[0, 0, 10, 10]] * 3, [0, 0, 1], {
+            'dept_name': 'AIML', 'batch_year': 2027, 'subject_code': 'AI301', 'time_slot': 1,
+            'sections': 'AIML-A', 'threshold': 0.45,
+        })
+
+        url = reverse('prediction_backend:rematch_session', args=['stored'])
+        with mock.patch.object(prediction_service, '_prepare_gallery', return_value=(gallery, set(), set())):
+            strict = self.client.post(url, json.dumps({'threshold': 0.7}), content_type='application/json').json()
+            loose = self.client.post(url, json.dumps({'threshold': 0.5}), content_type='application/json').json()
+
+        self.assertEqual(self._present(strict), ['71001', '71003'])
+        self.assertEqual(self._present(loose), ['71000', '71001', '71003'])
+        self.assertEqual(loose['faces'], 3)
+        self.assertEqual(
+            {prediction['register_number']: prediction['prediction_id'] for prediction in loose['detected_students']},
+            dict(AttendancePrediction.objects.filter(session_id='stored').values_list('student_id', 'id')),
+        )
+        self.assertEqual(self.store.load('stored')[1]['threshold'], 0.5)
+        self.assertEqual(
+            set(AttendancePrediction.objects.filter(session_id='stored', predicted_present=True)
+                .values_list('student_id', flat=True)),
+            {'71000', '71001', '71003'},
+        )
+        self.assertEqual(self.client.post(reverse('prediction_backend:rematch_session', args=['unknown'])).status_code, 404)
+
+    @staticmethod
+    def _present(response):
+        return sorted(prediction['register_number'] for prediction in response['detected_students']
+                      if prediction['is_present'])
+
+
+class JanitorTestCase(PredictionSessionTestCase):
+    def test_purges_expired_predictions_in_chunks(self):
+        """Rows older than the retention are deleted chunk by chunk; newer ones are kept"""
+        self._session('old', 5)
+        self._session('new', 5)
+        old = timezone.now() - timedelta(days=40)
+        AttendancePrediction.objects.filter(session_id='old').update(predicted_at=old)
+        RecognitionSession.objects.filter(session_id='old').update(predicted_at=old)
+
+        janitor = Janitor(temp_hours=0, session_embedding_hours=0, prediction_days=30, chunk_size=2)
+        self.assertEqual(janitor.run(dry_run=True)['attendance_predictions'], 5)
+        report = janitor.run()
+        self.assertEqual(report['attendance_predictions'], 5)
+        self.assertEqual(report['recognition_sessions'], 1)
+        self.assertEqual(set(AttendancePrediction.objects.values_list('session_id', flat=True)), {'new'})
+        self.assertEqual(list(RecognitionSession.objects.values_list('session_id', flat=True)), ['new'])
+
+    def test_one_worker_runs_each_threaded_sweep(self):
+        """Schedulers in different workers share a lock file recording the last run"""
+        janitor = mock.Mock(**{'run.return_value': {'seconds': 0}})
+        workers = [JanitorScheduler(janitor, interval=3600) for _ in range(2)]
+        with mock.patch('tempfile.gettempdir', return_value=temp_dir(self)):
+            self.assertEqual(workers[0].run_once(), {'seconds': 0})
+            self.assertIsNone(workers[1].run_once())  # Ran moments ago in the other worker
+            self.assertEqual(janitor.run.call_count, 1)
+
+            lock_path = os.path.join(tempfile.gettempdir(), SCHEDULER_LOCK_FILE)
+            with open(lock_path, 'w') as lock_file:
+                lock_file.write(str(time.time() - 3600))
+            with open(lock_path) as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)  # Another worker is sweeping
+                self.assertIsNone(workers[1].run_once())
+            self.assertIsNotNone(workers[1].run_once())
+            self.assertEqual(janitor.run.call_count, 2)
@@ -0,0 +1,154 @@
+import itertools
+from typing import List, Optional
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between two sets of (x1, y1, x2, y2) boxes"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-6), 0.0).astype(np.float32)
+
+
+def crop_quality(sizes: np.ndarray, sharpness: np.ndarray, confidences: np.ndarray) -> np.ndarray:
+    """Score face crops for embedding from detector confidence, size and sharpness"""
+    return np.asarray(confidences) * np.asarray(sizes) * np.log1p(np.asarray(sharpness))
+
+
+class KalmanBoxTracker:
+    """Constant-velocity Kalman filter over a box's centre, width and height"""
+
+    def __init__(self, box):
+        # State: [cx, cy, w, h, vcx, vcy, vw, vh]
+        self.x = np.zeros(8, dtype=np.float64)
+        self.x[:4] = self._to_measurement(box)
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 1000.0, 1000.0, 1000.0, 1000.0])
+        self.F = np.eye(8)
+        self.F[:4, 4:] = np.eye(4)
+        self.H = np.eye(4, 8)
+        self.Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.01, 0.01])
+        self.R = np.diag([1.0, 1.0, 10.0, 10.0])
+
+    @staticmethod
+    def _to_measurement(box) -> np.ndarray:
+        x1, y1, x2, y2 = (float(v) for v in box)
+        return np.array([(x1 + x2) / 2.0, (y1 + y2) / 2.0, x2 - x1, y2 - y1])
+
+    def predict(self) -> np.ndarray:
+        self.x = self.F @ self.x
+        self.x[2:4] = np.maximum(self.x[2:4], 1.0)
+        self.P = self.F @ self.P @ self.F.T + self.Q
+        return self.box
+
+    def update(self, box):
+        z = self._to_measurement(box)
+        residual = z - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ residual
+        self.P = (np.eye(8) - K @ self.H) @ self.P
+
+    @property
+    def box(self) -> np.ndarray:
+        cx, cy, w, h = self.x[:4]
+        return np.array([cx - w / 2.0, cy - h / 2.0, cx + w / 2.0, cy + h / 2.0])
+
+
+class Track:
+    """A face followed across frames, holding its best crops for embedding"""
+
+    def __init__(self, track_id: int, box, max_crops: int):
+        self.track_id = track_id
+        self.kalman = KalmanBoxTracker(box)
+        self.last_box = np.asarray(box, dtype=np.float32)
+        self.hits = 1
+        self.time_since_update = 0
+        self.max_crops = max_crops
+        self.best_crops = []  # (quality, frame_index, box, gray_crop), best first
+
+    def add_crop(self, quality: float, frame_index: int, box, gray_crop: Optional[np.ndarray]):
+        if gray_crop is None:
+            return
+        if len(self.best_crops) >= self.max_crops and quality <= self.best_crops[-1][0]:
+            return
+        self.best_crops.append((quality, frame_index, np.asarray(box, dtype=np.int32), gray_crop.copy()))
+        self.best_crops.sort(key=lambda c: c[0], reverse=True)
+        del self.best_crops[self.max_crops:]
+
+
+class IoUTracker:
+    """Lightweight SORT-style tracker: Kalman prediction plus IoU assignment"""
+
+    def __init__(self, iou_threshold: float = 0.3, max_age: int = 3, min_hits: int = 2, max_crops: int = 2):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.max_crops = max_crops
+        self.active: List[Track] = []
+        self.finished: List[Track] = []
+        self._ids = itertools.count(1)
+
+    def update(self, frame_index: int, boxes: np.ndarray, qualities=None, crops=None) -> List[int]:
+        """Associate this frame's detections with tracks; returns the track id per box"""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        qualities = qualities if qualities is not None else [0.0] * len(boxes)
+        crops = crops if crops is not None else [None] * len(boxes)
+
+        predicted = np.array([track.kalman.predict() for track in self.active]).reshape(-1, 4)
+        ious = iou_matrix(predicted, boxes)
+
+        assigned_tracks = set()
+        assigned_boxes = {}
+        if ious.size:
+            rows, cols = linear_sum_assignment(-ious)
+            for row, col in zip(rows, cols):
+                if ious[row, col] >= self.iou_threshold:
+                    assigned_tracks.add(row)
+                    assigned_boxes[col] = row
+
+        track_ids = []
+        for box_index, box in enumerate(boxes):
+            if box_index in assigned_boxes:
+                track = self.active[assigned_boxes[box_index]]
+                track.kalman.update(box)
+                track.hits += 1
+                track.time_since_update = 0
+                track.last_box = box
+            else:
+                track = Track(next(self._ids), box, self.max_crops)
+                self.active.append(track)
+            track.add_crop(qualities[box_index], frame_index, box, crops[box_index])
+            track_ids.append(track.track_id)
+
+        # Age out tracks that were not matched in this frame
+        new_track_count = len(boxes) - len(assigned_boxes)
+        still_active = []
+        for index, track in enumerate(self.active):
+            is_new = index >= len(self.active) - new_track_count
+            if not is_new and index not in assigned_tracks:
+                track.time_since_update += 1
+            if track.time_since_update > self.max_age:
+                self.finished.append(track)
+            else:
+                still_active.append(track)
+        self.active = still_active
+
+        return track_ids
+
+    def confirmed_tracks(self) -> List[Track]:
+        """All tracks (finished or still active) seen in at least min_hits sampled frames"""
+        return [track for track in self.finished + self.active if track.hits >= self.min_hits]
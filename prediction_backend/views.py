@@ -5,55 +5,255 @@ import asyncio
 import base64
 import os
 import tempfile
-import shutil
+import cv2
+import numpy as np
 from typing import List, Dict
-from datetime import datetime, timedelta
+from datetime import datetime
 from asgiref.sync import sync_to_async
 
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
-from django.db import models
+from django.db import connection, models, transaction
+from django.conf import settings
 
+from core import rollups, rosters, timeblocks
 from core.models import Student, Subject, Section, Department, Batch, Attendance, Timetable
-from .models import AttendancePrediction, AttendanceSubmission, ProcessedImage
+from .models import AttendancePrediction, AttendanceSubmission, PackedPrediction, ProcessedImage, RecognitionSession
 from .services import prediction_service
+from .gallery import GalleryStore, embed_enrollment_images
+from .session_faces import SessionFaceStore
+from .decode import decode_base64_image, get_decode_pool
+from .janitor import TEMP_SESSION_PREFIX
 
 logger = logging.getLogger(__name__)
 
 
-def cleanup_old_temp_directories(hours_old=24):
-    """Clean up temp directories older than specified hours"""
-    try:
-        temp_dir = tempfile.gettempdir()
-        current_time = datetime.now()
-        
-        for item in os.listdir(temp_dir):
-            if item.startswith("attendance_session_"):
-                item_path = os.path.join(temp_dir, item)
-                if os.path.isdir(item_path):
-                    # Check if directory is older than specified hours
-                    creation_time = datetime.fromtimestamp(os.path.getctime(item_path))
-                    if current_time - creation_time > timedelta(hours=hours_old):
-                        logger.info(f"🗑️  Cleaning up old temp directory: {item_path}")
-                        shutil.rmtree(item_path, ignore_errors=True)
-        
-    except Exception as e:
-        logger.warning(f"⚠️  Error during temp directory cleanup: {e}")
-
-
 def get_session_temp_directory(session_id):
     """Get or create temp directory for a session"""
-    session_temp_dir = os.path.join(tempfile.gettempdir(), f"attendance_session_{session_id}")
+    session_temp_dir = os.path.join(tempfile.gettempdir(), f"{TEMP_SESSION_PREFIX}{session_id}")
     os.makedirs(session_temp_dir, exist_ok=True)
     return session_temp_dir
 
 
+def parse_sections(dept_name, batch_year, sections_str):
+    """Parse a sections string (format: "Department-Section,Department-Section") into sections data"""
+    sections_data = []
+    if sections_str:
+        logger.info(f"🔍 Parsing sections string: {sections_str}")
+        section_parts = sections_str.split(",")
+        for section_part in section_parts:
+            try:
+                if "-" in section_part:
+                    dept_section = section_part.strip()
+                    section_name = dept_section.split("-")[
+                        -1
+                    ]  # Get the last part as section name
+                    sections_data.append(
+                        {
+                            "department": dept_name,
+                            "batch_year": batch_year,
+                            "section_names": [section_name],
+                        }
+                    )
+                    logger.info(f"✅ Parsed section: {dept_name}-{section_name}")
+            except Exception as e:
+                logger.warning(f"⚠️  Error parsing section {section_part}: {e}")
+
+    # If no sections parsed, use all sections for the department/batch
+    if not sections_data:
+        logger.info("📂 No specific sections parsed, using all sections for department/batch")
+        sections_data.append(
+            {"department": dept_name, "batch_year": batch_year, "section_names": []}
+        )
+
+    logger.info(f"📋 Final sections data: {sections_data}")
+    return sections_data
+
+
+def get_session_objects(dept_name, batch_year, subject_code, sections_data):
+    """Look up the subject and storage section for a session.
+
+    Returns (subject, section, error_response); error_response is set when a lookup fails.
+    """
+    try:
+        logger.info(f"🔍 Looking up database objects...")
+        department = Department.objects.get(dept_name=dept_name)
+        logger.info(f"✅ Found department: {department}")
+
+        batch = Batch.objects.get(dept=department, batch_year=batch_year)
+        logger.info(f"✅ Found batch: {batch}")
+
+        subject = Subject.objects.get(subject_code=subject_code, batch=batch)
+        logger.info(f"✅ Found subject: {subject}")
+
+        # Get the first section for database storage (we'll process all specified sections)
+        if sections_data and sections_data[0]["section_names"]:
+            section_name = sections_data[0]["section_names"][0]
+            section = Section.objects.get(batch=batch, section_name=section_name)
+            logger.info(f"✅ Found section: {section}")
+        else:
+            section = Section.objects.filter(batch=batch).first()
+            logger.info(f"✅ Using first available section: {section}")
+
+        if not section:
+            logger.warning("❌ No section found")
+            return None, None, JsonResponse({"error": "Section not found"}, status=404)
+
+    except (
+        Department.DoesNotExist,
+        Batch.DoesNotExist,
+        Subject.DoesNotExist,
+        Section.DoesNotExist,
+    ) as e:
+        logger.error(f"❌ Database object not found: {str(e)}")
+        return None, None, JsonResponse(
+            {"error": f"Database object not found: {str(e)}"}, status=404
+        )
+
+    return subject, section, None
+
+
+def store_session_predictions(session_id, subject, sections_data, dept_name, batch_year,
+                              all_detected_students, time_slot, detection_method="camera", section=None):
+    """Store a prediction for every student in the session's sections.
+
+    The session is one RecognitionSession row with the predictions packed into a blob;
+    the legacy per-student attendance_predictions rows are written with one bulk_create
+    (PREDICTION_LEGACY_PREDICTION_ROWS). Re-storing a session replaces it.
+    Returns (predictions, detected_reg_numbers) where predictions is the response payload.
+    """
+    # Get all students from the specified sections (cached rosters of (regno, name, section_id))
+    logger.info("👥 Fetching all students from specified sections...")
+    section_names = [name for section_info in sections_data for name in section_info["section_names"]]
+    if not section_names:
+        logger.info("📂 No specific sections, getting all students in batch")
+    all_students = rosters.get_rosters(dept_name, batch_year, section_names)
+    section_lookup = rosters.section_names(dept_name, batch_year)
+    detected_reg_numbers = set(all_detected_students.keys())
+
+    logger.info(f"📊 Total students in sections: {len(all_students)}")
+    logger.info(f"🎯 Students detected: {len(detected_reg_numbers)}")
+
+    packed = []
+    for regno, _name, section_id in all_students:
+        is_present = regno in detected_reg_numbers
+        confidence = float(all_detected_students[regno].get("confidence", 0.0)) if is_present else 0.0
+        packed.append((regno, section_id, is_present, confidence))
+
+    logger.info("💾 Storing session predictions...")
+    time_slot_json = json.dumps({"time_slot": time_slot}) if time_slot else ""
+    if section is None and all_students:
+        section = Section(pk=all_students[0][2])
+    prediction_ids = {}
+    with transaction.atomic():
+        if section is not None:
+            RecognitionSession.objects.update_or_create(
+                session_id=session_id,
+                defaults={
+                    "subject": subject,
+                    "section": section,
+                    "detection_method": detection_method,
+                    "time_slot_info": time_slot_json,
+                    "student_count": len(packed),
+                    "predictions_blob": RecognitionSession.pack(packed),
+                },
+            )
+        if getattr(settings, "PREDICTION_LEGACY_PREDICTION_ROWS", True):
+            AttendancePrediction.objects.filter(session_id=session_id).delete()
+            AttendancePrediction.objects.bulk_create([
+                AttendancePrediction(
+                    session_id=session_id,
+                    student_id=regno,
+                    subject=subject,
+                    section_id=section_id,  # Use student's actual section
+                    predicted_present=is_present,
+                    confidence_score=confidence,
+                    detection_method=detection_method,
+                    time_slot_info=time_slot_json,
+                )
+                for regno, section_id, is_present, confidence in packed
+            ])
+            # bulk_create leaves the ids unset on MySQL, so read them back in one query
+            prediction_ids = dict(
+                AttendancePrediction.objects.filter(session_id=session_id).values_list("student_id", "id")
+            )
+
+    predictions = [
+        {
+            "register_number": regno,
+            "name": name,
+            "confidence": confidence,
+            "is_present": is_present,
+            "prediction_id": prediction_ids.get(regno),
+            "section": section_lookup.get(section_id, ""),
+            "department": dept_name,
+        }
+        for (regno, name, section_id), (_regno, _section_id, is_present, confidence) in zip(all_students, packed)
+    ]
+
+    # Sort by register number
+    predictions.sort(key=lambda x: x["register_number"])
+
+    return predictions, detected_reg_numbers
+
+
+def load_session_predictions(session_id):
+    """Read a session's predictions, from its RecognitionSession row or the legacy per-student rows.
+
+    Returns (subject, section, time_slot, predicted_at, {regno: PackedPrediction}) or None.
+    """
+    session = (
+        RecognitionSession.objects.select_related("subject__batch__dept", "section__batch__dept")
+        .filter(session_id=session_id)
+        .first()
+    )
+    if session is not None:
+        predictions = {p.regno: p for p in session.predictions}
+        return session.subject, session.section, session.time_slot, session.predicted_at, predictions
+
+    rows = list(
+        AttendancePrediction.objects.filter(session_id=session_id)
+        .select_related("subject__batch__dept", "section__batch__dept")
+        .order_by("id")
+    )
+    if not rows:
+        return None
+    try:
+        time_slot = json.loads(rows[0].time_slot_info).get("time_slot") if rows[0].time_slot_info else None
+    except (ValueError, AttributeError):
+        time_slot = None
+    predictions = {
+        row.student_id: PackedPrediction(row.student_id, row.section_id, row.predicted_present, row.confidence_score)
+        for row in rows
+    }
+    return rows[0].subject, rows[0].section, time_slot, rows[0].predicted_at, predictions
+
+
+def save_session_faces(session_store, session_id, session_faces, meta):
+    """Persist the detected faces of a session so it can be re-matched later"""
+    try:
+        boxes = [np.asarray(b).reshape(-1, 4) for _i, b, _e in session_faces]
+        embeddings = [np.asarray(e).reshape(-1, 256) for _i, _b, e in session_faces]
+        image_indices = [np.full(len(b), i) for (i, _b, _e), b in zip(session_faces, boxes)]
+        session_store.save(
+            session_id,
+            np.concatenate(embeddings) if embeddings else np.zeros((0, 256)),
+            np.concatenate(boxes) if boxes else np.zeros((0, 4)),
+            np.concatenate(image_indices) if image_indices else np.zeros(0),
+            meta,
+        )
+        logger.info(f"💾 Saved {sum(len(b) for b in boxes)} face embeddings for session {session_id}")
+    except Exception as e:
+        logger.warning(f"⚠️  Could not save face embeddings for session {session_id}: {e}")
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def process_images(request):
@@ -89,105 +289,47 @@ def process_images(request):
         sections_str = data.get("sections", "")
         time_slot = data.get("time_slot")  # Extract time slot information
         threshold = float(data.get("threshold", 0.45))
+        room = data.get("room")  # Selects a tiled-detection profile for large rooms
         
-        logger.info(f"📊 Session parameters: dept={dept_name}, batch={batch_year}, subject={subject_code}, sections={sections_str}, time_slot={time_slot}, threshold={threshold}")
+        logger.info(f"📊 Session parameters: dept={dept_name}, batch={batch_year}, subject={subject_code}, sections={sections_str}, time_slot={time_slot}, threshold={threshold}, room={room}")
 
         if not all([dept_name, batch_year, subject_code]):
             logger.warning("❌ Missing required parameters")
             return JsonResponse({"error": "Missing required parameters"}, status=400)
 
-        # Parse sections (format: "Department-Section,Department-Section")
-        sections_data = []
-        if sections_str:
-            logger.info(f"🔍 Parsing sections string: {sections_str}")
-            section_parts = sections_str.split(",")
-            for section_part in section_parts:
-                try:
-                    if "-" in section_part:
-                        dept_section = section_part.strip()
-                        section_name = dept_section.split("-")[
-                            -1
-                        ]  # Get the last part as section name
-                        sections_data.append(
-                            {
-                                "department": dept_name,
-                                "batch_year": batch_year,
-                                "section_names": [section_name],
-                            }
-                        )
-                        logger.info(f"✅ Parsed section: {dept_name}-{section_name}")
-                except Exception as e:
-                    logger.warning(f"⚠️  Error parsing section {section_part}: {e}")
-
-        # If no sections parsed, use all sections for the department/batch
-        if not sections_data:
-            logger.info("📂 No specific sections parsed, using all sections for department/batch")
-            sections_data.append(
-                {"department": dept_name, "batch_year": batch_year, "section_names": []}
-            )
-        
-        logger.info(f"📋 Final sections data: {sections_data}")
+        sections_data = parse_sections(dept_name, batch_year, sections_str)
 
         # Get subject and section objects for database operations
-        try:
-            logger.info(f"🔍 Looking up database objects...")
-            department = Department.objects.get(dept_name=dept_name)
-            logger.info(f"✅ Found department: {department}")
-            
-            batch = Batch.objects.get(dept=department, batch_year=batch_year)
-            logger.info(f"✅ Found batch: {batch}")
-            
-            subject = Subject.objects.get(subject_code=subject_code, batch=batch)
-            logger.info(f"✅ Found subject: {subject}")
-
-            # Get the first section for database storage (we'll process all specified sections)
-            if sections_data and sections_data[0]["section_names"]:
-                section_name = sections_data[0]["section_names"][0]
-                section = Section.objects.get(batch=batch, section_name=section_name)
-                logger.info(f"✅ Found section: {section}")
-            else:
-                section = Section.objects.filter(batch=batch).first()
-                logger.info(f"✅ Using first available section: {section}")
-
-            if not section:
-                logger.warning("❌ No section found")
-                return JsonResponse({"error": "Section not found"}, status=404)
-
-        except (
-            Department.DoesNotExist,
-            Batch.DoesNotExist,
-            Subject.DoesNotExist,
-            Section.DoesNotExist,
-        ) as e:
-            logger.error(f"❌ Database object not found: {str(e)}")
-            return JsonResponse(
-                {"error": f"Database object not found: {str(e)}"}, status=404
-            )
+        subject, section, error_response = get_session_objects(dept_name, batch_year, subject_code, sections_data)
+        if error_response:
+            return error_response
 
         # Initialize prediction service
         logger.info("🔧 Initializing prediction service...")
         prediction_service.initialize()
         logger.info("✅ Prediction service initialized")
 
-        # Create temp directory for this session and cleanup old ones
-        cleanup_old_temp_directories(hours_old=24)
+        # Create temp directory for this session (old ones are swept by the janitor)
+        session_store = SessionFaceStore.from_settings()
         session_temp_dir = get_session_temp_directory(session_id)
         logger.info(f"📁 Created temp directory: {session_temp_dir}")
 
         # Process all images synchronously (avoid async issues)
         all_detected_students = {}  # Use dict to avoid duplicates
         processed_images = []
+        quality_reports = []  # Faces skipped by the quality gate, per image
+        session_faces = []  # (image index, boxes, embeddings) kept for re-matching
         
         logger.info(f"🖼️  Starting to process {len(images_data)} images...")
 
-        for i, image_data in enumerate(images_data):
+        # The decode pool decodes the next images in worker processes while this one is in YOLO/LightCNN
+        for decoded in get_decode_pool().imap(images_data):
+            i = decoded.index
             logger.info(f"🔄 Processing image {i+1}/{len(images_data)}")
             try:
-                # Decode base64 image
-                if image_data.startswith("data:image"):
-                    image_data = image_data.split(",")[1]
-                image_bytes = base64.b64decode(image_data)
-                logger.info(f"✅ Decoded image {i+1} ({len(image_bytes)} bytes)")
+                if decoded.error:
+                    raise ValueError(decoded.error)
+                logger.info(f"✅ Decoded image {i+1} ({decoded.encoded_size} bytes)")
 
                 # Save original image to temp folder
                 # original_image_path = os.path.join(session_temp_dir, f"original_image_{i+1}.jpg")
@@ -200,10 +342,19 @@ def process_images(request):
                 
                 try:
                     # Instead of using async, let's call a synchronous version
-                    processed_image_b64, detected_students = prediction_service.process_image_sync(
-                        image_bytes, threshold, sections_data
+                    result = prediction_service.process_image_detailed(
+                        None, threshold, sections_data, room=room, decoded=decoded
                     )
-                    logger.info(f"✅ Image {i+1} processed, detected {len(detected_students)} students")
+                    processed_image_b64, detected_students = result["image"], result["students"]
+                    quality_reports.append({
+                        "image_index": i,
+                        "faces_detected": result["faces_detected"],
+                        "faces_skipped": result["faces_skipped"],
+                        "skip_reasons": result["skip_reasons"],
+                        "skipped_faces": result["skipped_faces"],
+                    })
+                    session_faces.append((i, result["boxes"], result["embeddings"]))
+                    logger.info(f"✅ Image {i+1} processed, detected {len(detected_students)} students ({result['faces_skipped']} faces skipped)")
                 except Exception as e:
                     logger.error(f"❌ Error in sync processing for image {i+1}: {e}")
                     # Fallback: try the old method but with better error handling
@@ -211,6 +362,8 @@ def process_images(request):
                         import concurrent.futures
                         import threading
 
+                        image_bytes = decode_base64_image(images_data[i])
+
                         def run_in_isolated_thread():
                             # Create completely new thread with new event loop
                             loop = asyncio.new_event_loop()
@@ -271,81 +424,27 @@ def process_images(request):
             except Exception as e:
                 logger.error(f"❌ Error processing image {i+1}: {e}")
                 continue
+            finally:
+                decoded.release()
         
         logger.info(f"🎯 Image processing complete. Detected {len(all_detected_students)} unique students")
 
-        # Get all students from the specified sections
-        logger.info("👥 Fetching all students from specified sections...")
-        all_students_query = Student.objects.none()
-        for section_info in sections_data:
-            for section_name in section_info["section_names"]:
-                try:
-                    section_students = Student.objects.filter(
-                        section__section_name=section_name,
-                        section__batch__batch_year=batch_year,
-                        section__batch__dept__dept_name=dept_name,
-                    )
-                    all_students_query = all_students_query.union(section_students)
-                    logger.info(f"✅ Added students from section {section_name}")
-                except Exception as e:
-                    logger.error(
-                        f"❌ Error getting students for section {section_name}: {e}"
-                    )
-
-        # If no specific sections, get all students in the batch
-        if not any(section_info["section_names"] for section_info in sections_data):
-            logger.info("📂 No specific sections, getting all students in batch")
-            all_students_query = Student.objects.filter(
-                section__batch__batch_year=batch_year,
-                section__batch__dept__dept_name=dept_name,
-            )
-
-        all_students = list(all_students_query.distinct())
-        detected_reg_numbers = set(all_detected_students.keys())
-        
-        logger.info(f"📊 Total students in sections: {len(all_students)}")
-        logger.info(f"🎯 Students detected: {len(detected_reg_numbers)}")
-
-        # Create predictions for all students
-        logger.info("💾 Creating prediction records in database...")
-        predictions = []
-        for student in all_students:
-            is_present = student.student_regno in detected_reg_numbers
-            confidence = (
-                all_detected_students.get(student.student_regno, {}).get(
-                    "confidence", 0.0
-                )
-                if is_present
-                else 0.0
-            )
-
-            # Create prediction in database
-            time_slot_json = json.dumps({"time_slot": time_slot}) if time_slot else ""
-            prediction = AttendancePrediction.objects.create(
-                session_id=session_id,
-                student=student,
-                subject=subject,
-                section=student.section,  # Use student's actual section
-                predicted_present=is_present,
-                confidence_score=confidence,
-                detection_method="camera",
-                time_slot_info=time_slot_json,
-            )
-
-            predictions.append(
-                {
-                    "register_number": student.student_regno,
-                    "name": student.name,
-                    "confidence": float(confidence),  # Convert numpy.float32 to Python float
-                    "is_present": is_present,
-                    "prediction_id": prediction.id,
-                    "section": student.section.section_name,
-                    "department": student.section.batch.dept.dept_name,
-                }
-            )
+        predictions, detected_reg_numbers = store_session_predictions(
+            session_id, subject, sections_data, dept_name, batch_year, all_detected_students, time_slot,
+            section=section,
+        )
 
-        # Sort by register number
-        predictions.sort(key=lambda x: x["register_number"])
+        if session_store is not None:
+            save_session_faces(session_store, session_id, session_faces, {
+                "dept_name": dept_name,
+                "batch_year": batch_year,
+                "subject_code": subject_code,
+                "sections": sections_str,
+                "time_slot": time_slot,
+                "threshold": threshold,
+                "room": room,
+                "detection_method": "camera",
+            })
         
         processing_time = (datetime.now() - start_time).total_seconds()
         logger.info(f"⏱️  Total processing time: {processing_time:.2f} seconds")
@@ -358,6 +457,7 @@ def process_images(request):
             "total_detected": len(detected_reg_numbers),
             "total_students": len(predictions),
             "images_processed": len(processed_images),
+            "quality_reports": quality_reports,
             "processing_time": processing_time,
             "temp_directory": session_temp_dir,
             "message": f"Processed {len(processed_images)} images, detected {len(detected_reg_numbers)} students out of {len(predictions)} total students. Files saved to {session_temp_dir}",
@@ -374,6 +474,258 @@ def process_images(request):
         return JsonResponse({"error": f"Internal server error: {str(e)}"}, status=500)
 
 
+@csrf_exempt
+@require_http_methods(["POST"])
+def process_video(request):
+    """API endpoint to process a short video clip or burst of frames and predict student attendance.
+
+    Faces are tracked across frames so each person is embedded once or twice instead of per frame.
+    Accepts a multipart "video" file, or "frames_data" (list of base64 images) for a burst.
+    """
+    start_time = datetime.now()
+    logger.info(f"🎬 Starting video processing request at {start_time}")
+
+    try:
+        session_id = str(uuid.uuid4())
+        logger.info(f"📋 Generated session ID: {session_id}")
+
+        data = (
+            json.loads(request.body)
+            if request.content_type == "application/json"
+            else request.POST
+        )
+
+        video_file = request.FILES.get("video")
+        frames_data = data.get("frames_data", [])
+        if not video_file and not frames_data:
+            logger.warning("❌ No video or frame data provided in request")
+            return JsonResponse({"error": "No video or frame data provided"}, status=400)
+
+        dept_name = data.get("dept_name")
+        batch_year = int(data.get("batch_year")) if data.get("batch_year") else None
+        subject_code = data.get("subject_code")
+        sections_str = data.get("sections", "")
+        time_slot = data.get("time_slot")
+        threshold = float(data.get("threshold", 0.45))
+        room = data.get("room")  # Selects a tiled-detection profile for large rooms
+
+        logger.info(f"📊 Session parameters: dept={dept_name}, batch={batch_year}, subject={subject_code}, sections={sections_str}, time_slot={time_slot}, threshold={threshold}, room={room}")
+
+        if not all([dept_name, batch_year, subject_code]):
+            logger.warning("❌ Missing required parameters")
+            return JsonResponse({"error": "Missing required parameters"}, status=400)
+
+        sections_data = parse_sections(dept_name, batch_year, sections_str)
+
+        subject, section, error_response = get_session_objects(dept_name, batch_year, subject_code, sections_data)
+        if error_response:
+            return error_response
+
+        prediction_service.initialize()
+
+        session_temp_dir = get_session_temp_directory(session_id)
+
+        if video_file:
+            # OpenCV needs a real file to decode from
+            video_path = os.path.join(session_temp_dir, f"capture{os.path.splitext(video_file.name)[1] or '.mp4'}")
+            with open(video_path, "wb") as f:
+                for chunk in video_file.chunks():
+                    f.write(chunk)
+            logger.info(f"💾 Saved uploaded video to: {video_path} ({video_file.size} bytes)")
+            frames = prediction_service.iter_video_frames(
+                video_path,
+                sample_fps=float(getattr(settings, "PREDICTION_VIDEO_SAMPLE_FPS", 4)),
+                max_frames=int(getattr(settings, "PREDICTION_VIDEO_MAX_FRAMES", 240)),
+            )
+            detection_method = "video"
+        else:
+            frames_bytes = []
+            for frame_data in frames_data:
+                if frame_data.startswith("data:image"):
+                    frame_data = frame_data.split(",")[1]
+                frames_bytes.append(base64.b64decode(frame_data))
+            logger.info(f"📸 Received burst of {len(frames_bytes)} frames")
+            frames = prediction_service.iter_burst_frames(frames_bytes)
+            detection_method = "burst"
+
+        processed_image_b64, detected_students, video_stats = prediction_service.process_video_sync(
+            frames, threshold, sections_data, room=room
+        )
+        all_detected_students = {
+            student_data["register_number"]: student_data for student_data in detected_students
+        }
+        logger.info(f"🎯 Video processing complete. Detected {len(all_detected_students)} unique students")
+
+        predictions, detected_reg_numbers = store_session_predictions(
+            session_id, subject, sections_data, dept_name, batch_year, all_detected_students, time_slot,
+            detection_method=detection_method, section=section,
+        )
+
+        processing_time = (datetime.now() - start_time).total_seconds()
+        logger.info(f"⏱️  Total processing time: {processing_time:.2f} seconds")
+
+        processed_images = [processed_image_b64] if processed_image_b64 else []
+        return JsonResponse({
+            "success": True,
+            "session_id": session_id,
+            "processed_images": processed_images,
+            "detected_students": predictions,
+            "total_detected": len(detected_reg_numbers),
+            "total_students": len(predictions),
+            "images_processed": video_stats.get("frames_sampled", 0),
+            "video_stats": video_stats,
+            "processing_time": processing_time,
+            "temp_directory": session_temp_dir,
+            "message": f"Processed {video_stats.get('frames_sampled', 0)} frames ({video_stats.get('tracks', 0)} tracked faces), detected {len(detected_reg_numbers)} students out of {len(predictions)} total students.",
+        })
+
+    except ValueError as e:
+        logger.error(f"❌ Invalid video input: {e}")
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        processing_time = (datetime.now() - start_time).total_seconds()
+        logger.error(f"❌ Error in process_video after {processing_time:.2f}s: {e}")
+        logger.exception("Full exception details:")
+        return JsonResponse({"error": f"Internal server error: {str(e)}"}, status=500)
+
+
+@csrf_exempt
+@staff_member_required
+@require_http_methods(["POST"])
+def update_gallery(request):
+    """Add, replace or remove one identity in a gallery via its delta log (staff only).
+
+    Running workers pick the change up on their next request without reloading the gallery.
+    """
+    try:
+        data = (
+            json.loads(request.body)
+            if request.content_type == "application/json"
+            else request.POST
+        )
+        action = data.get("action")
+        dept_name = data.get("dept_name")
+        batch_year = data.get("batch_year")
+        student_regno = data.get("student_regno")
+
+        if action not in ("add", "replace", "remove"):
+            return JsonResponse({"error": "action must be add, replace or remove"}, status=400)
+        if not all([dept_name, batch_year, student_regno]):
+            return JsonResponse({"error": "Missing required parameters"}, status=400)
+
+        store = GalleryStore(dept_name, batch_year)
+        gallery, _state = store.load(key_func=str)
+        exists = str(student_regno) in gallery
+        if action == "add" and exists:
+            return JsonResponse({"error": f"{student_regno} is already in the gallery; use replace"}, status=409)
+        if action in ("replace", "remove") and not exists:
+            return JsonResponse({"error": f"{student_regno} is not in the gallery"}, status=404)
+
+        photos_used = 0
+        if action == "remove":
+            pending = store.remove(student_regno)
+        else:
+            images = []
+            for image_data in data.get("images_data", []):
+                if image_data.startswith("data:image"):
+                    image_data = image_data.split(",")[1]
+                images.append(cv2.imdecode(np.frombuffer(base64.b64decode(image_data), np.uint8), cv2.IMREAD_COLOR))
+            for upload in request.FILES.getlist("photos"):
+                images.append(cv2.imdecode(np.frombuffer(upload.read(), np.uint8), cv2.IMREAD_COLOR))
+            if not images:
+                return JsonResponse({"error": "No enrollment photos provided"}, status=400)
+
+            prediction_service.initialize()
+            if not prediction_service.face_model or not prediction_service.yolo_model:
+                return JsonResponse({"error": "Face models are not available"}, status=503)
+            template, photos_used = embed_enrollment_images(prediction_service, images)
+            if template is None:
+                return JsonResponse({"error": "No usable face found in the photos"}, status=400)
+            pending = store.put(student_regno, template)
+
+        logger.info(f"🗂️  Gallery {dept_name}_{batch_year}: {action} {student_regno} by {request.user} ({pending} pending deltas)")
+        return JsonResponse({
+            "success": True,
+            "action": action,
+            "student_regno": str(student_regno),
+            "photos_used": photos_used,
+            "pending_deltas": pending,
+        })
+
+    except Exception as e:
+        logger.error(f"❌ Error updating gallery: {e}")
+        logger.exception("Full exception details:")
+        return JsonResponse({"error": f"Internal server error: {str(e)}"}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def rematch_session(request, session_id):
+    """Re-score a session's stored face embeddings at a new threshold or section scope.
+
+    Replaces the session's predictions without running detection or embedding again.
+    """
+    start_time = datetime.now()
+    try:
+        data = (
+            json.loads(request.body or b"{}")
+            if request.content_type == "application/json"
+            else request.POST
+        )
+
+        session_store = SessionFaceStore.from_settings()
+        stored = session_store.load(session_id) if session_store is not None else None
+        if stored is None:
+            return JsonResponse({"error": "No stored face embeddings for this session"}, status=404)
+        embeddings, meta = stored
+
+        if AttendanceSubmission.objects.filter(session_id=session_id).exists():
+            return JsonResponse({"error": "Attendance for this session has already been submitted"}, status=409)
+
+        dept_name = meta["dept_name"]
+        batch_year = int(meta["batch_year"])
+        threshold = float(data.get("threshold", meta.get("threshold", 0.45)))
+        sections_str = data.get("sections", meta.get("sections", ""))
+        sections_data = parse_sections(dept_name, batch_year, sections_str)
+
+        subject, section, error_response = get_session_objects(dept_name, batch_year, meta["subject_code"], sections_data)
+        if error_response:
+            return error_response
+
+        all_detected_students = prediction_service.rematch_embeddings(embeddings, threshold, sections_data)
+
+        predictions, detected_reg_numbers = store_session_predictions(
+            session_id, subject, sections_data, dept_name, batch_year, all_detected_students,
+            meta.get("time_slot"), meta.get("detection_method", "camera"), section=section,
+        )
+
+        # Later rematches start from the latest scope unless the request overrides it
+        boxes = meta.pop("boxes")
+        image_indices = meta.pop("image_indices")
+        meta.update({"threshold": threshold, "sections": sections_str})
+        session_store.save(session_id, embeddings, boxes, image_indices, meta)
+
+        processing_time = (datetime.now() - start_time).total_seconds()
+        logger.info(f"🔁 Rematched session {session_id} in {processing_time * 1000:.1f}ms")
+        return JsonResponse({
+            "success": True,
+            "session_id": session_id,
+            "threshold": threshold,
+            "faces": len(embeddings),
+            "detected_students": predictions,
+            "total_detected": len(detected_reg_numbers),
+            "total_students": len(predictions),
+            "processing_time": processing_time,
+        })
+
+    except (ValueError, KeyError) as e:
+        return JsonResponse({"error": f"Invalid rematch request: {e}"}, status=400)
+    except Exception as e:
+        logger.error(f"❌ Error in rematch_session: {e}")
+        logger.exception("Full exception details:")
+        return JsonResponse({"error": f"Internal server error: {str(e)}"}, status=500)
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def submit_attendance(request):
@@ -397,77 +749,41 @@ def submit_attendance(request):
             )
 
         # Get original predictions
-        predictions = AttendancePrediction.objects.filter(session_id=session_id)
-        predictions_dict = {p.student.student_regno: p for p in predictions}
-        
-        logger.info(f"🔍 Found {len(predictions)} predictions for session")
-
-        if not predictions:
+        session = load_session_predictions(session_id)
+        if session is None:
             logger.warning("❌ No predictions found for session")
             return JsonResponse(
                 {"error": "No predictions found for this session"}, status=404
             )
-
-        # Get the first prediction to extract session info for timetable
-        first_prediction = predictions.first()
-        session_subject = first_prediction.subject
-        session_section = first_prediction.section
+        session_subject, session_section, time_slot_from_session, _predicted_at, predictions_dict = session
+        
+        logger.info(f"🔍 Found {len(predictions_dict)} predictions for session")
         
         logger.info(f"📚 Session info: {session_subject} for {session_section}")
 
         # Create or get timetable entry for today with time block validation
         from django.utils import timezone
-        from core.models import TimeBlock
-        from datetime import datetime, time as datetime_time
         
-        today = timezone.now().date()
-        current_time = timezone.now().time()
+        now = timezone.localtime()
+        today = now.date()
+        current_time = now.time()
         
         # Get the current time block for the batch
-        batch = session_section.batch
-        batch_year = batch.batch_year
+        batch_year = session_section.batch.batch_year
+        index = timeblocks.get_index()
         
-        # Try to get time block from submission data first (for camera-based attendance)
+        # Time slot info comes from the session (set when the images were processed)
         current_time_block = None
-        time_slot_from_session = None
-        
-        # Check if we have time slot info from the session (stored in prediction data if available)
-        session_predictions = AttendancePrediction.objects.filter(session_id=session_id).first()
-        if session_predictions and hasattr(session_predictions, 'time_slot_info'):
-            try:
-                import json as json_module
-                time_slot_from_session = json_module.loads(session_predictions.time_slot_info).get('time_slot')
-            except:
-                time_slot_from_session = None
-        
-        # Find appropriate time block
-        time_blocks = TimeBlock.objects.filter(
-            models.Q(batch_year=batch_year) | models.Q(batch_year=0)
-        ).order_by('batch_year', 'block_number')
-        
-        # If we have time slot number from session, use it
         if time_slot_from_session:
             try:
-                current_time_block = time_blocks.filter(block_number=int(time_slot_from_session)).first()
+                current_time_block = index.by_number(batch_year, int(time_slot_from_session))
                 logger.info(f"🎯 Using time block from session: Block {time_slot_from_session}")
             except (ValueError, TypeError):
                 logger.warning(f"⚠️  Invalid time slot from session: {time_slot_from_session}")
         
-        # Otherwise, find the most appropriate time block based on current time
+        # Otherwise the running block, else the one that just ended, else the next one
         if not current_time_block:
-            for block in time_blocks:
-                # Check if current time falls within this block (with some tolerance)
-                if block.start_time <= current_time <= block.end_time:
-                    current_time_block = block
-                    break
-                elif block.batch_year == batch_year:  # Exact batch match gets priority
-                    current_time_block = block
-            
-            # If no specific block found, use the first available block for the batch
-            if not current_time_block:
-                current_time_block = time_blocks.filter(batch_year=batch_year).first()
-                if not current_time_block:
-                    current_time_block = time_blocks.filter(batch_year=0).first()
+            current_time_block = index.resolve(batch_year, current_time)
         
         if current_time_block:
             block_start = current_time_block.start_time
@@ -479,103 +795,103 @@ def submit_attendance(request):
             block_end = current_time
             logger.warning("⚠️  No time blocks found, using current time")
         
-        # Check for existing timetable entry for this section, subject, date, and time block
-        existing_timetables = Timetable.objects.filter(
-            section=session_section,
-            subject=session_subject,
-            date=today,
-            start_time=block_start,
-            end_time=block_end
-        )
-        
-        if existing_timetables.exists():
-            timetable_entry = existing_timetables.first()
-            logger.info(f"📅 Found existing timetable entry: {timetable_entry}")
-            
-            # Check if attendance has already been submitted for this timetable
-            existing_attendance = Attendance.objects.filter(timetable=timetable_entry)
-            if existing_attendance.exists():
-                logger.warning(f"⚠️  Attendance already exists for this time block! Found {existing_attendance.count()} records")
-                
-                # Return an error to prevent duplicate submissions
-                time_block_desc = f"Block {current_time_block.block_number} ({block_start}-{block_end})" if current_time_block else f"{block_start}-{block_end}"
-                return JsonResponse({
-                    "error": f"Attendance has already been submitted for {session_subject} - {session_section} at {time_block_desc} on {today}. "
-                            f"Found {existing_attendance.count()} existing attendance records. "
-                            f"Please contact administrator if you need to update attendance.",
-                    "error_type": "duplicate_submission",
-                    "existing_count": existing_attendance.count(),
-                    "timetable_id": timetable_entry.timetable_id,
-                    "time_block": time_block_desc
-                }, status=409)  # 409 Conflict status
-        else:
-            # Create new timetable entry
-            timetable_entry = Timetable.objects.create(
+        with transaction.atomic():
+            # Check for existing timetable entry for this section, subject, date, and time block
+            timetable_entry = Timetable.objects.filter(
                 section=session_section,
                 subject=session_subject,
                 date=today,
                 start_time=block_start,
-                end_time=block_end,
-            )
-            logger.info(f"✅ Created new timetable entry: {timetable_entry}")
-        
-        created = not existing_timetables.exists()
-        
-        if created:
-            logger.info(f"✅ Created new timetable entry: {timetable_entry}")
-        else:
-            logger.info(f"📅 Using existing timetable entry: {timetable_entry}")
-
-        submissions = []
-        attendance_records_created = 0
-        attendance_records_updated = 0
-        
-        for attendance in attendance_data:
-            reg_number = attendance.get("register_number")
-            final_present = attendance.get("is_present", False)
-
-            if reg_number in predictions_dict:
-                prediction = predictions_dict[reg_number]
-                original_prediction = prediction.predicted_present
-                was_edited = original_prediction != final_present
-
-                # Create AttendanceSubmission record (for tracking purposes)
-                submission = AttendanceSubmission.objects.create(
+                end_time=block_end
+            ).select_related("section__batch__dept", "subject__batch__dept").first()
+            
+            if timetable_entry is not None:
+                logger.info(f"📅 Found existing timetable entry: {timetable_entry}")
+                
+                # Check if attendance has already been submitted for this timetable
+                existing_count = Attendance.objects.filter(timetable=timetable_entry).count()
+                if existing_count:
+                    logger.warning(f"⚠️  Attendance already exists for this time block! Found {existing_count} records")
+                    
+                    # Return an error to prevent duplicate submissions
+                    time_block_desc = f"Block {current_time_block.block_number} ({block_start}-{block_end})" if current_time_block else f"{block_start}-{block_end}"
+                    return JsonResponse({
+                        "error": f"Attendance has already been submitted for {session_subject} - {session_section} at {time_block_desc} on {today}. "
+                                f"Found {existing_count} existing attendance records. "
+                                f"Please contact administrator if you need to update attendance.",
+                        "error_type": "duplicate_submission",
+                        "existing_count": existing_count,
+                        "timetable_id": timetable_entry.timetable_id,
+                        "time_block": time_block_desc
+                    }, status=409)  # 409 Conflict status
+            else:
+                # Create new timetable entry
+                timetable_entry = Timetable.objects.create(
+                    section=session_section,
+                    subject=session_subject,
+                    date=today,
+                    start_time=block_start,
+                    end_time=block_end,
+                )
+                logger.info(f"✅ Created new timetable entry: {timetable_entry}")
+
+            # Only students that were part of the session are recorded (last entry wins)
+            final_presence = {}
+            for attendance in attendance_data:
+                reg_number = attendance.get("register_number")
+                if reg_number in predictions_dict:
+                    final_presence[reg_number] = bool(attendance.get("is_present", False))
+
+            # AttendanceSubmission records (for tracking purposes) in one insert
+            submission_objects = AttendanceSubmission.objects.bulk_create([
+                AttendanceSubmission(
                     session_id=session_id,
-                    student=prediction.student,
-                    subject=prediction.subject,
-                    section=prediction.section,
+                    student_id=reg_number,
+                    subject=session_subject,
+                    section_id=predictions_dict[reg_number].section_id,
                     final_present=final_present,
-                    was_edited=was_edited,
-                    original_prediction=original_prediction,
+                    was_edited=predictions_dict[reg_number].present != final_present,
+                    original_prediction=predictions_dict[reg_number].present,
                     submitted_by=submitted_by,
                 )
+                for reg_number, final_present in final_presence.items()
+            ])
 
-                # Create or update core Attendance record
-                attendance_record, attendance_created = Attendance.objects.update_or_create(
-                    student=prediction.student,
-                    timetable=timetable_entry,
-                    defaults={
-                        'is_present': final_present,
-                    }
-                )
-                
-                if attendance_created:
-                    attendance_records_created += 1
-                    logger.info(f"✅ Created attendance record for {reg_number}: {'Present' if final_present else 'Absent'}")
-                else:
-                    attendance_records_updated += 1
-                    logger.info(f"🔄 Updated attendance record for {reg_number}: {'Present' if final_present else 'Absent'}")
-
-                submissions.append(
-                    {
-                        "register_number": reg_number,
-                        "final_present": final_present,
-                        "was_edited": was_edited,
-                        "submission_id": submission.id,
-                        "attendance_record_id": attendance_record.attendance_id,
-                    }
-                )
+            # Core Attendance records: one upsert on (student, timetable)
+            existing_students = set(
+                Attendance.objects.filter(timetable=timetable_entry, student_id__in=list(final_presence))
+                .values_list("student_id", flat=True)
+            )
+            Attendance.objects.bulk_create(
+                [
+                    Attendance(
+                        student_id=reg_number, timetable=timetable_entry, is_present=final_present,
+                        date=timetable_entry.date, section_id=timetable_entry.section_id,
+                    )
+                    for reg_number, final_present in final_presence.items()
+                ],
+                update_conflicts=True,
+                update_fields=["is_present", "updated_at"],
+                # MySQL upserts on any unique key and takes no conflict target
+                unique_fields=(
+                    ["student", "timetable"] if connection.features.supports_update_conflicts_with_target else None
+                ),
+            )
+            attendance_records_updated = len(existing_students)
+            attendance_records_created = len(final_presence) - attendance_records_updated
+
+            # bulk_create sends no signals: refresh the report rollups of this class day here
+            rollups.refresh([(session_subject.pk, session_section.pk, today)])
+
+        # Primary keys are left out: bulk_create does not set them on MySQL
+        submissions = [
+            {
+                "register_number": submission.student_id,
+                "final_present": submission.final_present,
+                "was_edited": submission.was_edited,
+            }
+            for submission in submission_objects
+        ]
 
         logger.info(f"💾 Attendance submission complete:")
         logger.info(f"   - Submissions: {len(submissions)}")
@@ -606,9 +922,13 @@ def submit_attendance(request):
 def get_session_data(request, session_id):
     """Get prediction and submission data for a session"""
     try:
-        predictions = AttendancePrediction.objects.filter(
-            session_id=session_id
-        ).select_related("student", "subject", "section")
+        session = load_session_predictions(session_id)
+        predictions = list(session[4].values()) if session else []
+        predicted_at = session[3].isoformat() if session else None
+        names = dict(
+            Student.objects.filter(student_regno__in=[p.regno for p in predictions])
+            .values_list("student_regno", "name")
+        )
 
         submissions = AttendanceSubmission.objects.filter(
             session_id=session_id
@@ -620,11 +940,11 @@ def get_session_data(request, session_id):
             "session_id": session_id,
             "predictions": [
                 {
-                    "register_number": p.student.student_regno,
-                    "name": p.student.name,
-                    "predicted_present": p.predicted_present,
-                    "confidence_score": float(p.confidence_score),  # Convert to Python float
-                    "predicted_at": p.predicted_at.isoformat(),
+                    "register_number": p.regno,
+                    "name": names.get(p.regno, ""),
+                    "predicted_present": p.present,
+                    "confidence_score": float(p.confidence),  # Convert to Python float
+                    "predicted_at": predicted_at,
                 }
                 for p in predictions
             ],
@@ -702,14 +1022,14 @@ def list_all_temp_directories(request):
         directories = []
         
         for item in os.listdir(temp_dir):
-            if item.startswith("attendance_session_"):
+            if item.startswith(TEMP_SESSION_PREFIX):
                 item_path = os.path.join(temp_dir, item)
                 if os.path.isdir(item_path):
                     stat = os.stat(item_path)
                     file_count = len([f for f in os.listdir(item_path) if os.path.isfile(os.path.join(item_path, f))])
                     
                     directories.append({
-                        "session_id": item.replace("attendance_session_", ""),
+                        "session_id": item[len(TEMP_SESSION_PREFIX):],
                         "directory": item_path,
                         "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
                         "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
@@ -728,6 +1048,20 @@ def list_all_temp_directories(request):
         return JsonResponse({"error": f"Internal server error: {str(e)}"}, status=500)
 
 
+@csrf_exempt
+@require_http_methods(["GET"])
+def prefetch_stats(request):
+    """Debug endpoint with gallery/roster cache hit rates and prefetch scheduler status"""
+    from . import janitor
+    from .prefetch import get_scheduler
+    scheduler = get_scheduler()
+    janitor_scheduler = janitor.get_scheduler()
+    return JsonResponse({
+        "cache": prediction_service.cache_stats(),
+        "scheduler": scheduler.status() if scheduler else {"running": False},
+        "janitor": janitor_scheduler.status() if janitor_scheduler else {"running": False},
+    })
+
 @csrf_exempt
 @require_http_methods(["GET"])
 def check_attendance_records(request):
@@ -738,7 +1072,7 @@ def check_attendance_records(request):
         
         # Get today's attendance records
         attendance_records = Attendance.objects.filter(
-            timetable__date=today
+            date=today
         ).select_related('student', 'timetable__subject', 'timetable__section')
         
         records_data = []
@@ -821,9 +1155,9 @@ def debug_session_info(request, session_id):
             
             attendance_records = Attendance.objects.filter(
                 student__in=[s.student for s in submissions],
-                timetable__date=today,
+                date=today,
                 timetable__subject=first_submission.subject,
-                timetable__section=first_submission.section,
+                section=first_submission.section,
             )
             attendance_data = [{
                 "attendance_id": a.attendance_id,